@@ -0,0 +1,71 @@
+"""Benchmark: relevance-ranked chunk selection vs head/tail truncation on large synthetic logs.
+
+Run from src/agent: python benchmarks/bench_log_select.py [--sizes 1,10,50] [--budget 24000]
+
+Each synthetic log (size in MB) is mostly routine build output with repeated warnings and
+one failure (an error line plus a stack trace) buried at a random depth in the middle.
+Reports the selection time and whether each strategy kept the failure in its output.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from lib.llm_utils import truncate_logs_smart  # noqa: E402
+from lib.log_select import _score, select_log_chunks  # noqa: E402
+
+NOISE = [
+    "2024-05-01T12:00:{s:02d}Z [pkg-{p}] compiling src/module_{m}.ts",
+    "2024-05-01T12:00:{s:02d}Z [pkg-{p}] warning: 'foo' is deprecated, use 'bar' instead",
+    "2024-05-01T12:00:{s:02d}Z [pkg-{p}] PASS tests/test_{m}.spec.ts ({m}ms)",
+    "2024-05-01T12:00:{s:02d}Z [pkg-{p}] npm WARN optional dependency skipped: fsevents@{m}",
+    "2024-05-01T12:00:{s:02d}Z [pkg-{p}] bundled {m} modules in {s}ms",
+]
+FAILURE = (
+    "2024-05-01T12:00:00Z [pkg-payments] FAIL tests/ledger.spec.ts\n"
+    "TypeError: Cannot read properties of undefined (reading 'amountCents')\n"
+    "    at computeBalance (src/ledger.ts:118:27)\n"
+    "    at Object.<anonymous> (tests/ledger.spec.ts:42:5)\n"
+    "##[error]Process completed with exit code 1.\n"
+)
+MARKER = "amountCents"
+
+
+def synth(mb: int, rng: random.Random) -> str:
+    target = mb * 1024 * 1024
+    lines, size = [], 0
+    while size < target:
+        line = rng.choice(NOISE).format(s=rng.randrange(60), p=rng.randrange(40), m=rng.randrange(1000))
+        lines.append(line)
+        size += len(line) + 1
+    lines.insert(rng.randrange(len(lines) // 4, 3 * len(lines) // 4), FAILURE.rstrip("\n"))
+    lines.append("Build finished.")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,10,50")
+    parser.add_argument("--budget", type=int, default=24000)
+    args = parser.parse_args()
+    rng = random.Random(7)
+    for mb in (int(s) for s in args.sizes.split(",")):
+        logs = synth(mb, rng)
+        start = time.perf_counter()
+        selected = select_log_chunks(logs, args.budget)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        select_log_chunks(logs, int(args.budget * 0.9))  # fit_text retries reuse the cached scores
+        warm = time.perf_counter() - start
+        head_tail = truncate_logs_smart(logs, args.budget)
+        print(f"{mb:3d}MB  select={cold:.2f}s  reselect={warm * 1000:.1f}ms  windows={len(_score(logs)[1])}  "
+              f"failure kept: select={MARKER in selected} head/tail={MARKER in head_tail}  "
+              f"out={len(selected)} chars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: segment-log file queue vs. the old one-JSON-file-per-job directory queue.
+
+Run from src/agent: python benchmarks/bench_queue.py [--sizes 1000,10000,100000]
+
+The directory queue globs, stats and sorts the whole backlog on every dequeue, so it is
+timed over a fixed sample of dequeues at each backlog size instead of draining it.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib import blob_store, queue
+
+SAMPLE_DEQUEUES = 200
+
+
+class DirectoryQueue:
+    """The previous file backend, kept here only as a baseline."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def enqueue(self, provider: str, run_id: str, logs: str | None = None) -> str:
+        job = {"id": str(uuid.uuid4()), "provider": provider, "run_id": run_id, "logs": logs, "ts": time.time()}
+        with open(self.root / f"{job['id']}.json", "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        return job["id"]
+
+    def dequeue(self) -> dict | None:
+        jobs = sorted(self.root.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        if not jobs:
+            return None
+        with open(jobs[0], "r", encoding="utf-8") as f:
+            job = json.load(f)
+        jobs[0].unlink()
+        return job
+
+
+def _time(fn, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench(size: int, logs: str) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        old = DirectoryQueue(Path(tmp) / "dir")
+        queue.QUEUE_DIR = Path(tmp) / "seg"
+        blob_store.BLOB_DIR = Path(tmp) / "blobs"
+        sample = min(SAMPLE_DEQUEUES, size)
+        return {
+            "size": size,
+            "dir_enqueue_us": _time(lambda i: old.enqueue("local", str(i), logs), size),
+            "dir_dequeue_us": _time(lambda i: old.dequeue(), sample),
+            "seg_enqueue_us": _time(lambda i: queue.enqueue("local", str(i), logs), size),
+            "seg_dequeue_us": _time(lambda i: queue.dequeue(), sample),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--log-bytes", type=int, default=512, help="Inline log payload per job")
+    args = parser.parse_args()
+    os.environ.pop("REDIS_URL", None)
+    logs = "x" * args.log_bytes
+    print(f"{'jobs':>8} {'dir enq us':>11} {'dir deq us':>11} {'seg enq us':>11} {'seg deq us':>11}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        r = bench(size, logs)
+        print(f"{r['size']:>8} {r['dir_enqueue_us']:>11.1f} {r['dir_dequeue_us']:>11.1f} "
+              f"{r['seg_enqueue_us']:>11.1f} {r['seg_dequeue_us']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark: near-duplicate lookup latency in the SimHash index.
+
+Run from src/agent: python benchmarks/bench_simindex.py [--entries 100000] [--lookups 2000]
+
+Fills a fresh index with random 64-bit hashes (the worst case for bucket balance is
+clustered data; random hashes give the expected load), then measures nearest() for
+hashes a few bits away from indexed ones (hits) and for random hashes (misses), plus
+the time to reload the persisted index in a new process.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+from lib.simindex import HASH_BITS, SimIndex  # noqa: E402
+
+
+def _flip(h: int, bits: int) -> int:
+    for bit in random.sample(range(HASH_BITS), bits):
+        h ^= 1 << bit
+    return h
+
+
+def _measure(index: SimIndex, queries: list[int]) -> list[float]:
+    out = []
+    for q in queries:
+        start = time.perf_counter()
+        index.nearest(q)
+        out.append((time.perf_counter() - start) * 1e6)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "simindex.txt"
+        hashes = [random.getrandbits(HASH_BITS) for _ in range(args.entries)]
+        with open(path, "w") as f:
+            f.writelines(f"{i:064x} {h:016x}\n" for i, h in enumerate(hashes))
+        index = SimIndex(path)
+        start = time.perf_counter()
+        index.nearest(0)
+        print(f"load {args.entries} entries: {time.perf_counter() - start:.2f}s")
+        hits = [_flip(random.choice(hashes), random.randint(0, index.max_distance)) for _ in range(args.lookups)]
+        misses = [random.getrandbits(HASH_BITS) for _ in range(args.lookups)]
+        for name, queries in (("hit", hits), ("miss", misses)):
+            us = sorted(_measure(index, queries))
+            print(f"{name:5s} p50={statistics.median(us):.1f}us p99={us[int(len(us) * 0.99)]:.1f}us")
+        start = time.perf_counter()
+        index.add("new", random.getrandbits(HASH_BITS))
+        print(f"insert: {(time.perf_counter() - start) * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark: enqueue-to-start latency with sleep polling vs. event-driven wakeup.
+
+Run from src/agent: python benchmarks/bench_wakeup.py [--jobs 20] [--poll 2]
+
+A consumer process claims jobs from a fresh file queue, either sleeping --poll seconds
+whenever it finds the queue empty (the old worker loop) or blocking in wait_for_jobs().
+The producer enqueues jobs at random intervals; latency is claim time minus enqueue time.
+With REDIS_URL set the Redis backend is measured instead.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+
+def _consume(mode: str, n: int, poll: float, out) -> None:
+    from lib import queue
+    latencies = []
+    queue.wait_for_jobs(0)  # arm the watcher before the producer starts
+    out.put("ready")
+    while len(latencies) < n:
+        jobs = queue.claim(n)
+        if not jobs:
+            if mode == "poll":
+                time.sleep(poll)
+            else:
+                queue.wait_for_jobs(poll)
+            continue
+        now = time.time()
+        for job in jobs:
+            latencies.append(now - job["ts"])
+            queue.ack(job["id"])
+    out.put(latencies)
+
+
+def bench(mode: str, n: int, poll: float) -> list[float]:
+    from lib import queue
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    consumer = ctx.Process(target=_consume, args=(mode, n, poll, out))
+    consumer.start()
+    out.get()
+    for i in range(n):
+        time.sleep(random.uniform(0.05, 0.5))
+        queue.enqueue("local", f"bench-{i}")
+    latencies = out.get()
+    consumer.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--poll", type=float, default=2.0, help="Idle sleep / max wait seconds")
+    args = parser.parse_args()
+    print(f"{'mode':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for mode in ("poll", "event"):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["QUEUE_DIR"] = os.path.join(tmp, "queue")
+            os.environ["BLOB_DIR"] = os.path.join(tmp, "blobs")
+            from lib import queue
+            queue.QUEUE_DIR = queue.Path(os.environ["QUEUE_DIR"])
+            lat = sorted(x * 1000 for x in bench(mode, args.jobs, args.poll))
+            p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+            print(f"{mode:>6} {statistics.median(lat):>9.1f} {p95:>9.1f} {lat[-1]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ import os
 import sys
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from lib.metrics import render_prometheus
+
+# Loopback by default; containers that expose the port set HEALTH_HOST=0.0.0.0.
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
 
 
 class HealthHandler(http.server.BaseHTTPRequestHandler):
@@ -22,8 +26,8 @@ class HealthHandler(http.server.BaseHTTPRequestHandler):
             self.send_response(200)
             self.send_header("Content-Type", "text/plain; version=0.0.4")
             self.end_headers()
-            # Placeholder Prometheus metrics
-            self.wfile.write(b"# HELP heal_agent_healthy Agent health\n# TYPE heal_agent_healthy gauge\nheal_agent_healthy 1\n")
+            body = "# HELP heal_agent_healthy Agent health\n# TYPE heal_agent_healthy gauge\nheal_agent_healthy 1\n"
+            self.wfile.write((body + render_prometheus()).encode())
         else:
             self.send_response(404)
             self.end_headers()
@@ -32,9 +36,17 @@ class HealthHandler(http.server.BaseHTTPRequestHandler):
         pass
 
 
+def serve_in_background(port: int, host: str = HEALTH_HOST) -> http.server.HTTPServer:
+    """Serve health/metrics from a daemon thread (used by the long-lived worker)."""
+    import threading
+    httpd = http.server.ThreadingHTTPServer((host, port), HealthHandler)
+    threading.Thread(target=httpd.serve_forever, name="health-server", daemon=True).start()
+    return httpd
+
+
 def main():
     port = int(os.getenv("HEALTH_PORT", "8080"))
-    with http.server.HTTPServer(("0.0.0.0", port), HealthHandler) as httpd:
+    with http.server.HTTPServer((HEALTH_HOST, port), HealthHandler) as httpd:
         httpd.serve_forever()
 
 
@@ -2,6 +2,11 @@
 import os
 import json
 
+from .deadline import stage_timeout
+
+# Failure alerts still go out after the heal deadline, but only get this long.
+MIN_ALERT_TIMEOUT = 1.0
+
 SLACK_WEBHOOK = os.getenv("SLACK_WEBHOOK_URL")
 PAGERDUTY_KEY = os.getenv("PAGERDUTY_ROUTING_KEY")
 
@@ -17,7 +22,7 @@ def send_slack(message: str, level: str = "error") -> bool:
         }).encode()
         req = urllib.request.Request(SLACK_WEBHOOK, data=payload, method="POST")
         req.add_header("Content-Type", "application/json")
-        urllib.request.urlopen(req, timeout=5)
+        urllib.request.urlopen(req, timeout=stage_timeout(5, "alert", minimum=MIN_ALERT_TIMEOUT))
         return True
     except Exception:
         return False
@@ -35,7 +40,7 @@ def send_pagerduty(summary: str, severity: str = "error") -> bool:
         }).encode()
         req = urllib.request.Request("https://events.pagerduty.com/v2/enqueue", data=payload, method="POST")
         req.add_header("Content-Type", "application/json")
-        urllib.request.urlopen(req, timeout=5)
+        urllib.request.urlopen(req, timeout=stage_timeout(5, "alert", minimum=MIN_ALERT_TIMEOUT))
         return True
     except Exception:
         return False
@@ -0,0 +1,84 @@
+"""Content-addressed, gzip-compressed blob store for large payloads (build logs); Redis or a local directory."""
+import gzip
+import hashlib
+import io
+import os
+import time
+from pathlib import Path
+from typing import IO
+
+from .redis_client import get_redis
+
+BLOB_DIR = Path(os.getenv("BLOB_DIR", "logs/blobs"))
+BLOB_TTL_SECONDS = int(os.getenv("BLOB_TTL_SECONDS", str(7 * 86400)))
+REDIS_BLOB_PREFIX = "heal:blob:"
+REF_PREFIX = "sha256:"
+
+
+def _digest(ref: str) -> str:
+    if not ref.startswith(REF_PREFIX):
+        raise ValueError(f"Not a blob reference: {ref[:80]}")
+    digest = ref[len(REF_PREFIX):]
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise ValueError(f"Malformed blob digest: {digest[:80]}")
+    return digest
+
+
+def _path(digest: str) -> Path:
+    return BLOB_DIR / digest[:2] / f"{digest}.gz"
+
+
+def put_blob(data: str) -> str:
+    """Store data and return its reference. Storing the same content twice is a no-op."""
+    raw = data.encode("utf-8", errors="replace")
+    digest = hashlib.sha256(raw).hexdigest()
+    r = get_redis()
+    if r:
+        key = REDIS_BLOB_PREFIX + digest
+        if not r.set(key, gzip.compress(raw), nx=True, ex=BLOB_TTL_SECONDS):
+            r.expire(key, BLOB_TTL_SECONDS)
+        return REF_PREFIX + digest
+    path = _path(digest)
+    if path.exists():
+        os.utime(path)  # refresh age for prune_blobs()
+        return REF_PREFIX + digest
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with gzip.open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    return REF_PREFIX + digest
+
+
+def open_blob(ref: str) -> IO[str]:
+    """Open a blob for streaming text reads. Raises FileNotFoundError if it is gone."""
+    digest = _digest(ref)
+    r = get_redis()
+    if r:
+        compressed = r.get(REDIS_BLOB_PREFIX + digest)
+        if compressed is None:
+            raise FileNotFoundError(f"Blob not found: {ref}")
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=io.BytesIO(compressed)), encoding="utf-8", errors="replace")
+    return gzip.open(_path(digest), "rt", encoding="utf-8", errors="replace")
+
+
+def get_blob(ref: str) -> str:
+    """Read a whole blob."""
+    with open_blob(ref) as f:
+        return f.read()
+
+
+def prune_blobs(max_age_seconds: int = BLOB_TTL_SECONDS) -> int:
+    """Delete local blobs not written or re-put within max_age_seconds. Redis blobs expire on their own."""
+    if not BLOB_DIR.exists():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in BLOB_DIR.glob("*/*.gz"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -1,37 +1,217 @@
-"""Cache for log analysis results by content hash."""
+"""Two-tier (in-process LRU + JSON files) caches for log analyses and generated code fixes."""
 import hashlib
 import json
 import os
+import time
+from collections import OrderedDict
 from pathlib import Path
+from threading import Lock
+
+from .fingerprint import failure_fingerprint
 
 CACHE_DIR = Path(os.getenv("ANALYSIS_CACHE_DIR", "logs/cache"))
+FIX_CACHE_DIR = Path(os.getenv("FIX_CACHE_DIR", "logs/fix_cache"))
+CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 86400)))
+MEMORY_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "1024"))
+DISK_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+DISK_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+WARM_LOAD = os.getenv("ANALYSIS_CACHE_WARM", "").lower() in ("1", "true", "yes")
 
 
 def _log_hash(logs: str) -> str:
     return hashlib.sha256(logs.encode("utf-8", errors="replace")).hexdigest()
 
 
-def get_cached_analysis(logs: str) -> dict | None:
-    """Return cached analysis if exists, else None."""
-    if os.getenv("CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
-        return None
-    key = _log_hash(logs)
-    path = CACHE_DIR / f"{key}.json"
-    if path.exists():
+def cache_key(logs: str) -> str:
+    """Analysis cache key: reruns of the same failure share it despite timestamps, IDs etc."""
+    return failure_fingerprint(logs)
+
+
+def fix_cache_key(file_content: str, suggestion: str, filename: str, model: str) -> str:
+    """Fix cache key: same file bytes, same suggested fix, same target and model."""
+    parts = (_log_hash(file_content), _log_hash(suggestion), filename, model)
+    return hashlib.sha256("\0".join(parts).encode("utf-8", errors="replace")).hexdigest()
+
+
+def _disabled() -> bool:
+    return os.getenv("CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return dict(entry[1])
+
+    def set(self, key: str, value: dict, expires_at: float | None = None) -> None:
+        with self._lock:
+            self._data[key] = (expires_at or time.time() + self.ttl_seconds, dict(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """In-process LRU in front of a directory of <key>.json files with TTL and size bounds."""
+
+    def __init__(self, directory: Path, ttl_seconds: float = CACHE_TTL_SECONDS,
+                 memory_entries: int = MEMORY_MAX_ENTRIES, max_entries: int = DISK_MAX_ENTRIES,
+                 max_bytes: int = DISK_MAX_BYTES, warm: bool = WARM_LOAD):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(memory_entries, ttl_seconds)
+        self._warm_pending = warm
+        self._index: dict[str, tuple[float, int]] | None = None  # key -> (mtime, size)
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, key: str) -> dict | None:
+        if self._warm_pending:
+            self.warm()
+        hit = self.memory.get(key)
+        if hit is not None:
+            return hit
+        path = self.directory / f"{key}.json"
         try:
+            mtime = path.stat().st_mtime
+            if mtime + self.ttl_seconds <= time.time():
+                self._remove(key, path)
+                return None
             with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
+                data = json.load(f)
+        except (OSError, ValueError):
             return None
-    return None
+        self.memory.set(key, data, expires_at=mtime + self.ttl_seconds)
+        return data
+
+    def set(self, key: str, value: dict) -> None:
+        self.memory.set(key, value)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{key}.json"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._index is None:
+                self._scan()
+            else:
+                old = self._index.get(key)
+                size = path.stat().st_size
+                self._bytes += size - (old[1] if old else 0)
+                self._index[key] = (time.time(), size)
+            if len(self._index) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict()
+
+    def warm(self) -> int:
+        """Load the newest unexpired disk entries into memory. Returns how many were loaded."""
+        self._warm_pending = False
+        with self._lock:
+            self._scan()
+            newest = sorted(self._index.items(), key=lambda kv: kv[1][0], reverse=True)
+        loaded = 0
+        cutoff = time.time() - self.ttl_seconds
+        for key, (mtime, _) in newest[:self.memory.max_entries]:
+            if mtime <= cutoff:
+                break
+            try:
+                with open(self.directory / f"{key}.json", "r", encoding="utf-8") as f:
+                    self.memory.set(key, json.load(f), expires_at=mtime + self.ttl_seconds)
+                loaded += 1
+            except (OSError, ValueError):
+                pass
+        return loaded
+
+    def _scan(self) -> None:
+        """Rebuild the disk index (other processes may share the directory). Caller holds lock."""
+        self._index, self._bytes = {}, 0
+        if not self.directory.exists():
+            return
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                self._index[entry.name[:-5]] = (st.st_mtime, st.st_size)
+                self._bytes += st.st_size
+
+    def _evict(self) -> None:
+        """Drop expired entries, then oldest first down to 90% of the budgets. Caller holds lock."""
+        self._scan()
+        cutoff = time.time() - self.ttl_seconds
+        target_entries, target_bytes = int(self.max_entries * 0.9), int(self.max_bytes * 0.9)
+        for key, (mtime, size) in sorted(self._index.items(), key=lambda kv: kv[1][0]):
+            if mtime > cutoff and len(self._index) <= target_entries and self._bytes <= target_bytes:
+                break
+            (self.directory / f"{key}.json").unlink(missing_ok=True)
+            del self._index[key]
+            self._bytes -= size
+
+    def _remove(self, key: str, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        with self._lock:
+            if self._index is not None and key in self._index:
+                self._bytes -= self._index.pop(key)[1]
+
+
+_analysis_cache = TieredCache(CACHE_DIR)
+_fix_cache = TieredCache(FIX_CACHE_DIR)
+
+
+def get_cached_analysis(logs: str) -> dict | None:
+    """Return cached analysis if exists, else None."""
+    return get_cached_analysis_by_key(cache_key(logs))
+
+
+def get_cached_analysis_by_key(key: str) -> dict | None:
+    """Cached analysis for a cache_key() value (e.g. a near-duplicate's fingerprint)."""
+    if _disabled():
+        return None
+    return _analysis_cache.get(key)
 
 
 def set_cached_analysis(logs: str, analysis: dict) -> None:
     """Cache analysis result."""
-    if os.getenv("CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+    if _disabled():
+        return
+    _analysis_cache.set(cache_key(logs), analysis)
+
+
+def get_cached_fix(key: str) -> dict | None:
+    """Return {"fix": ..., "valid": bool, "reason": str} for a fix_cache_key, else None."""
+    if _disabled():
+        return None
+    return _fix_cache.get(key)
+
+
+def set_cached_fix(key: str, fix: dict, valid: bool, reason: str = "") -> None:
+    """Cache a generated fix together with its output validation result."""
+    if _disabled():
         return
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    key = _log_hash(logs)
-    path = CACHE_DIR / f"{key}.json"
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(analysis, f)
+    _fix_cache.set(key, {"fix": fix, "valid": valid, "reason": reason})
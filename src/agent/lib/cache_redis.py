@@ -1,22 +1,31 @@
-"""Redis-backed cache for analysis. Falls back to file cache when REDIS_URL unset."""
+"""Redis-backed cache for analysis. Falls back to file cache when REDIS_URL unset.
+
+The in-process LRU tier from lib.cache sits in front of Redis too.
+"""
 import json
 import os
 
-from .cache import get_cached_analysis as _file_get, set_cached_analysis as _file_set, _log_hash
+from .cache import get_cached_analysis as _file_get, set_cached_analysis as _file_set, cache_key, _analysis_cache
+from .redis_client import get_redis
 
 
 def get_cached_analysis(logs: str) -> dict | None:
     if os.getenv("CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
         return None
     try:
-        import redis
-        url = os.getenv("REDIS_URL")
-        if url:
-            r = redis.from_url(url)
-            key = f"heal:analysis:{_log_hash(logs)}"
-            raw = r.get(key)
-            return json.loads(raw) if raw else None
-    except (ImportError, Exception):
+        r = get_redis()
+        if r:
+            key = cache_key(logs)
+            hit = _analysis_cache.memory.get(key)
+            if hit is not None:
+                return hit
+            raw = r.get(f"heal:analysis:{key}")
+            if not raw:
+                return None
+            data = json.loads(raw)
+            _analysis_cache.memory.set(key, data)
+            return data
+    except Exception:
         pass
     return _file_get(logs)
 
@@ -25,13 +34,12 @@ def set_cached_analysis(logs: str, analysis: dict, ttl: int = 86400) -> None:
     if os.getenv("CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
         return
     try:
-        import redis
-        url = os.getenv("REDIS_URL")
-        if url:
-            r = redis.from_url(url)
-            key = f"heal:analysis:{_log_hash(logs)}"
-            r.setex(key, ttl, json.dumps(analysis))
+        r = get_redis()
+        if r:
+            key = cache_key(logs)
+            r.setex(f"heal:analysis:{key}", ttl, json.dumps(analysis))
+            _analysis_cache.memory.set(key, analysis)
             return
-    except (ImportError, Exception):
+    except Exception:
         pass
     _file_set(logs, analysis)
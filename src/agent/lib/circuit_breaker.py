@@ -1,54 +1,299 @@
-"""Circuit breaker for LLM calls."""
+"""Per-model circuit breakers for LLM calls over a sliding window, optionally shared through Redis."""
+import asyncio
 import os
 import time
 from threading import Lock
 
-FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5"))
+from .deadline import DeadlineExceeded
+from .logger import debug, info, warn
+from .metrics import set_gauge
+from .rate_limit import RateLimitTimeout
+from .redis_client import get_redis
+
+WINDOW_SECONDS = float(os.getenv("CIRCUIT_BREAKER_WINDOW", "60"))
+MIN_CALLS = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5")))
+FAILURE_RATE = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", "0.5"))
+SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", "30"))
+SLOW_CALL_RATE = float(os.getenv("CIRCUIT_BREAKER_SLOW_CALL_RATE", "0.8"))
 RESET_TIMEOUT = float(os.getenv("CIRCUIT_BREAKER_TIMEOUT", "60"))
+HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_BREAKER_HALF_OPEN_PROBES", "2"))
+SHARED = os.getenv("CIRCUIT_BREAKER_SHARED", "1").lower() in ("1", "true", "yes")
+BUCKETS = 10
+KEY_PREFIX = "heal:circuit"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_GAUGE = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """The model's circuit is open (or its half-open probe slots are taken)."""
+
+
+def _new_state() -> dict:
+    return {"state": CLOSED, "since": 0.0, "probes": 0, "probe_ok": 0, "buckets": {}}
+
+
+def _encode(st: dict) -> dict[str, str]:
+    out = {"state": st["state"], "since": repr(st["since"]), "probes": str(st["probes"]),
+           "probe_ok": str(st["probe_ok"])}
+    for b, (calls, failures, slow) in st["buckets"].items():
+        out[f"b:{b}"] = f"{calls},{failures},{slow}"
+    return out
+
+
+def _decode(raw: dict) -> dict:
+    st = _new_state()
+    for k, v in raw.items():
+        k, v = (k.decode(), v.decode()) if isinstance(k, bytes) else (k, v)
+        if k.startswith("b:"):
+            st["buckets"][int(k[2:])] = [int(x) for x in v.split(",")]
+        elif k == "state":
+            st["state"] = v
+        elif k == "since":
+            st["since"] = float(v)
+        else:
+            st[k] = int(v)
+    return st
+
+
+def _is_model_outcome(error: BaseException | None) -> bool:
+    """False for calls ended by the heal budget, local quota or cancellation rather than by the model."""
+    return error is None or (isinstance(error, Exception)
+                             and not isinstance(error, (DeadlineExceeded, RateLimitTimeout)))
 
 
 class CircuitBreaker:
-    def __init__(self, threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
-        self.threshold = threshold
+    def __init__(self, name: str = "llm", window: float = WINDOW_SECONDS, min_calls: int = MIN_CALLS,
+                 failure_rate: float = FAILURE_RATE, slow_call_seconds: float = SLOW_CALL_SECONDS,
+                 slow_call_rate: float = SLOW_CALL_RATE, reset_timeout: float = RESET_TIMEOUT,
+                 half_open_probes: int = HALF_OPEN_PROBES):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
         self.reset_timeout = reset_timeout
-        self.failures = 0
-        self.last_failure_time: float | None = None
+        self.half_open_probes = half_open_probes
+        self._state = _new_state()
         self._lock = Lock()
+        self._seen = (CLOSED, 0.0)  # (state, since) as of the last _update(), for seen_open
+
+    # --- state machine (pure functions of the state dict; run locally or inside a Redis transaction)
+
+    def _bucket(self, now: float) -> int:
+        return int(now // (self.window / BUCKETS))
+
+    def _prune(self, st: dict, now: float) -> None:
+        oldest = self._bucket(now) - BUCKETS + 1
+        for b in [b for b in st["buckets"] if b < oldest]:
+            del st["buckets"][b]
+
+    def _move(self, st: dict, state: str, now: float) -> str:
+        st.update(state=state, since=now, probes=0, probe_ok=0)
+        if state != OPEN:
+            st["buckets"] = {}  # a fresh window after recovering or entering half-open
+        return state
+
+    def _tick(self, st: dict, now: float) -> str | None:
+        """Time-driven transitions: open -> half-open, and re-arming a stuck half-open."""
+        self._prune(st, now)
+        if st["state"] == OPEN and now - st["since"] >= self.reset_timeout:
+            return self._move(st, HALF_OPEN, now)
+        if st["state"] == HALF_OPEN and st["probes"] and now - st["since"] >= self.reset_timeout:
+            # Probes that never reported back (process died): free their slots.
+            st.update(since=now, probes=0)
+        return None
+
+    def _admit(self, st: dict, now: float) -> tuple[str, str | None]:
+        moved = self._tick(st, now)
+        if st["state"] == CLOSED:
+            return "allow", moved
+        if st["state"] == HALF_OPEN and st["probes"] + st["probe_ok"] < self.half_open_probes:
+            st["probes"] += 1
+            return "probe", moved
+        return "reject", moved
+
+    def _record(self, st: dict, now: float, ok: bool, slow: bool, probe: bool) -> str | None:
+        moved = self._tick(st, now)
+        if probe and st["state"] == HALF_OPEN:
+            st["probes"] = max(0, st["probes"] - 1)
+            if not ok or slow:
+                return self._move(st, OPEN, now)
+            st["probe_ok"] += 1
+            return self._move(st, CLOSED, now) if st["probe_ok"] >= self.half_open_probes else moved
+        if st["state"] != CLOSED:
+            return moved  # late result of a call admitted before the circuit opened
+        counts = st["buckets"].setdefault(self._bucket(now), [0, 0, 0])
+        counts[0] += 1
+        counts[1] += 0 if ok else 1
+        counts[2] += 1 if slow else 0
+        calls, failures, slow_calls = (sum(c[i] for c in st["buckets"].values()) for i in range(3))
+        if calls >= self.min_calls and (failures / calls >= self.failure_rate
+                                        or slow_calls / calls >= self.slow_call_rate):
+            return self._move(st, OPEN, now)
+        return moved
+
+    # --- storage
+
+    def _update(self, fn):
+        """Apply fn(state, now) -> (result, transition) to the shared or local state."""
+        def _observed(st, now):
+            out = fn(st, now)
+            self._seen = (st["state"], st["since"])
+            return out
+
+        r = get_redis() if SHARED else None
+        if r is not None:
+            try:
+                result, moved = self._update_shared(r, _observed)
+                self._report(moved)
+                return result
+            except Exception as e:
+                debug("Shared circuit state unavailable, using local state", circuit=self.name, error=str(e))
+        with self._lock:
+            result, moved = _observed(self._state, time.time())
+        self._report(moved)
+        return result
+
+    def _update_shared(self, r, fn):
+        from redis.exceptions import WatchError
+
+        key = f"{KEY_PREFIX}:{self.name}"
+        with r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    st = _decode(pipe.hgetall(key))
+                    before = _encode(st)
+                    out = fn(st, time.time())
+                    after = _encode(st)
+                    if after == before:
+                        pipe.unwatch()
+                        return out
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.hset(key, mapping=after)
+                    pipe.expire(key, int(max(self.window, self.reset_timeout) * 10))
+                    pipe.execute()
+                    return out
+                except WatchError:
+                    continue  # another replica updated the breaker; retry on fresh state
+
+    def _report(self, moved: str | None) -> None:
+        if moved is None:
+            return
+        if moved == OPEN:
+            warn("Circuit breaker opened", circuit=self.name)
+        else:
+            info("Circuit breaker state changed", circuit=self.name, state=moved)
+        set_gauge("heal_llm_circuit_state", _STATE_GAUGE[moved], "LLM circuit state (0 closed, 1 open, 2 half-open)",
+                  {"model": self.name})
+
+    # --- public API
+
+    @property
+    def state(self) -> str:
+        def _read(st, now):
+            moved = self._tick(st, now)
+            return st["state"], moved
+        return self._update(_read)
 
     @property
     def is_open(self) -> bool:
-        with self._lock:
-            if self.failures < self.threshold:
-                return False
-            if self.last_failure_time and (time.time() - self.last_failure_time) >= self.reset_timeout:
-                self.failures = 0
-                return False
-            return True
+        return self.state == OPEN
+
+    @property
+    def seen_open(self) -> bool:
+        """is_open as of this process's last look at the state, without any I/O."""
+        state, since = self._seen
+        return state == OPEN and time.time() - since < self.reset_timeout
+
+    @property
+    def failures(self) -> int:
+        """Failed calls in the current window."""
+        def _count(st, now):
+            self._prune(st, now)
+            return sum(c[1] for c in st["buckets"].values()), None
+        return self._update(_count)
+
+    def allow(self) -> str:
+        """Admit one call: "allow", or "probe" in half-open. Raises CircuitOpenError."""
+        decision = self._update(self._admit)
+        if decision == "reject":
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is OPEN. LLM calls temporarily disabled.")
+        return decision
+
+    def record(self, ok: bool, seconds: float = 0.0, probe: bool = False) -> None:
+        slow = seconds >= self.slow_call_seconds
+        self._update(lambda st, now: (None, self._record(st, now, ok, slow, probe)))
+
+    def release_probe(self) -> None:
+        """Give back a probe slot without an outcome (the call was cancelled)."""
+        def _release(st, now):
+            if st["state"] == HALF_OPEN:
+                st["probes"] = max(0, st["probes"] - 1)
+            return None, None
+        self._update(_release)
 
     def record_success(self) -> None:
-        with self._lock:
-            self.failures = 0
+        self.record(True)
 
     def record_failure(self) -> None:
-        with self._lock:
-            self.failures += 1
-            self.last_failure_time = time.time()
+        self.record(False)
+
+    def _finish(self, probe: bool, seconds: float, error: BaseException | None) -> None:
+        """Record a finished call; one that says nothing about the model only gives back its probe slot."""
+        if _is_model_outcome(error):
+            self.record(error is None, seconds, probe)
+        elif probe:
+            self.release_probe()
 
     def execute(self, fn):
-        """Run fn; if circuit is open, raise. On failure, record and re-raise."""
-        if self.is_open:
-            raise RuntimeError("Circuit breaker is OPEN. LLM calls temporarily disabled.")
+        """Run fn if the circuit admits it; record the outcome and latency. Raises CircuitOpenError."""
+        probe = self.allow() == "probe"
+        start = time.monotonic()
         try:
             result = fn()
-            self.record_success()
-            return result
+        except BaseException as e:
+            self._finish(probe, time.monotonic() - start, e)
+            raise
+        self._finish(probe, time.monotonic() - start, None)
+        return result
+
+    async def execute_async(self, fn):
+        """execute() for a coroutine function; state updates (Redis transactions) run off the event loop."""
+        probe = await asyncio.to_thread(self.allow) == "probe"
+        start = time.monotonic()
+        try:
+            result = await fn()
         except Exception as e:
-            self.record_failure()
-            raise e
+            await asyncio.to_thread(self._finish, probe, time.monotonic() - start, e)
+            raise
+        except BaseException:
+            if probe:
+                # A cancelled call (lost hedge race) is no outcome; don't make the canceller wait either.
+                asyncio.get_running_loop().run_in_executor(None, self.release_probe)
+            raise
+        await asyncio.to_thread(self._finish, probe, time.monotonic() - start, None)
+        return result
+
+
+_circuits: dict[str, CircuitBreaker] = {}
+_circuits_lock = Lock()
 
 
-_llm_circuit = CircuitBreaker()
+def get_llm_circuit(model: str = "llm") -> CircuitBreaker:
+    """The breaker for model (created on first use)."""
+    with _circuits_lock:
+        cb = _circuits.get(model)
+        if cb is None:
+            cb = _circuits[model] = CircuitBreaker(model)
+        return cb
 
 
-def get_llm_circuit() -> CircuitBreaker:
-    return _llm_circuit
+def any_circuit_open() -> bool:
+    """True if any model's breaker was open when last seen (no I/O, safe on the event loop)."""
+    with _circuits_lock:
+        circuits = list(_circuits.values())
+    return any(cb.seen_open for cb in circuits)
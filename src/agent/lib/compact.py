@@ -0,0 +1,105 @@
+"""Log compaction: strip ANSI codes, timestamps, progress bars and repeated lines before prompting."""
+import os
+import re
+from typing import Iterable, Iterator
+
+from .logger import info
+from .metrics import set_gauge
+
+ENABLED = os.getenv("LOG_COMPACT", "1").lower() in ("1", "true", "yes")
+MIN_RUN = 3  # shorter runs are left alone; the marker would save nothing
+
+_ANSI = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07")
+_TS_PREFIX = re.compile(
+    r"^\[?(?:\d{4}-\d{2}-\d{2}[T ])?\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?\]?\s+"
+)
+_PERCENT = re.compile(r"\b\d{1,3}(?:\.\d+)?\s?%")
+_RATE = re.compile(r"\b\d+(?:\.\d+)?\s?[kKMG]?i?B/s\b")
+_ASCII_BAR = re.compile(r"\[[=#>\-. ]{5,}\]")
+_BLOCK_BAR = re.compile(r"[█▏▎▍▌▋▊▉░▒▓]{3,}")
+_WARNING = re.compile(r"\bwarn(?:ing)?\b|deprecat", re.IGNORECASE)
+_FAILURE = re.compile(r"error|fail|exception|fatal|panic|traceback|assert")  # matched on lowercased lines
+_DIGITS = re.compile(r"\d+")
+
+
+def _clean(line: str) -> str:
+    if "\r" in line:
+        line = line.rstrip("\r").rsplit("\r", 1)[-1]  # what the terminal finally showed
+    if "\x1b" in line:
+        line = _ANSI.sub("", line)
+    if line[:1].isdigit() or line[:1] == "[":
+        line = _TS_PREFIX.sub("", line, count=1)
+    return line.rstrip()
+
+
+def _is_progress(line: str) -> bool:
+    # Substring checks first so the regexes only run on lines that could match.
+    return bool(
+        ("%" in line and _PERCENT.search(line))
+        or ("B/s" in line and _RATE.search(line))
+        or ("[" in line and ("==" in line or "##" in line or "--" in line) and _ASCII_BAR.search(line))
+        or (not line.isascii() and _BLOCK_BAR.search(line))
+    )
+
+
+def _flush(first: str, last: str, count: int, exact: bool, progress: bool) -> Iterator[str]:
+    if not first:
+        yield ""  # blank runs collapse to one blank line
+    elif progress:
+        yield last
+    elif count < MIN_RUN:
+        yield first
+        if count == 2:
+            yield last
+    elif exact:
+        yield first
+        yield f"[previous line repeated {count - 1} times]"
+    else:
+        yield first
+        yield f"[... {count - 2} similar lines ...]"
+        yield last
+
+
+def compact_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yield the compacted form of lines (without line endings)."""
+    first = last = shape = None
+    count, exact, progress = 0, True, False
+    seen_warnings: set[str] = set()
+    dropped_warnings = 0
+    for raw in lines:
+        line = _clean(raw)
+        if line == last:
+            count += 1
+            continue
+        low = line.lower()
+        if ("warn" in low or "deprecat" in low) and _WARNING.search(line):
+            if line in seen_warnings:
+                dropped_warnings += 1
+                continue
+            seen_warnings.add(line)
+        is_progress = _is_progress(line)
+        line_shape = _DIGITS.sub("0", line) if line else ""
+        # A failure line ("test_x FAILED [ 40%]") is never merged away, whatever it looks like.
+        failure = (line_shape == shape or is_progress) and _FAILURE.search(low) is not None
+        if first is not None and line and not failure and (line_shape == shape or (is_progress and progress)):
+            last, count, exact = line, count + 1, False
+            continue
+        if first is not None:
+            yield from _flush(first, last, count, exact, progress)
+        first = last = line
+        shape, count, exact, progress = line_shape, 1, True, is_progress and not failure
+    if first is not None:
+        yield from _flush(first, last, count, exact, progress)
+    if dropped_warnings:
+        yield f"[{dropped_warnings} repeated warning lines removed]"
+
+
+def compact_logs(logs: str) -> str:
+    """Compact logs (see module docstring) and report the compression ratio."""
+    if not ENABLED or not logs:
+        return logs
+    out = "\n".join(compact_lines(logs.split("\n")))
+    ratio = len(out) / len(logs)
+    info("Log compaction", before_chars=len(logs), after_chars=len(out), ratio=round(ratio, 3))
+    set_gauge("heal_log_compaction_ratio", ratio, "Compacted/original size of the last analysed log")
+    return out
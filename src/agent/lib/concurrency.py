@@ -0,0 +1,102 @@
+"""Adaptive heal-job concurrency limit: AIMD on LLM latency, errors, throttling and open circuits."""
+import os
+import time
+from collections import deque
+from threading import Condition
+
+from .circuit_breaker import any_circuit_open
+from .metrics import set_gauge
+
+LATENCY_TOLERANCE = float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
+BACKOFF_RATIO = float(os.getenv("CONCURRENCY_BACKOFF", "0.7"))
+BASELINE_WINDOW = int(os.getenv("CONCURRENCY_BASELINE_WINDOW", "50"))
+EWMA_ALPHA = 0.2
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 16):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.backlog = 0
+        self.latency_ewma: float | None = None
+        self._samples: deque[float] = deque(maxlen=BASELINE_WINDOW)
+        self._cond = Condition()
+
+    def available(self) -> int:
+        with self._cond:
+            return max(0, int(self.limit) - self.in_flight)
+
+    def acquire(self, timeout: float | None = None) -> bool:
+        """Take a slot, waiting up to timeout for one to free up (or the limit to grow)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            self._export()
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._export()
+            self._cond.notify_all()
+
+    def set_backlog(self, depth: int) -> None:
+        with self._cond:
+            self.backlog = depth
+
+    def record(self, latency_s: float, ok: bool = True, throttled: bool = False) -> None:
+        """Feed one LLM call outcome into the limit."""
+        with self._cond:
+            if not ok or throttled or any_circuit_open():
+                self._set_limit(self.limit * BACKOFF_RATIO)
+                return
+            self._samples.append(latency_s)
+            self.latency_ewma = latency_s if self.latency_ewma is None else (
+                EWMA_ALPHA * latency_s + (1 - EWMA_ALPHA) * self.latency_ewma
+            )
+            baseline = min(self._samples)
+            gradient = min(1.0, LATENCY_TOLERANCE * baseline / self.latency_ewma) if self.latency_ewma else 1.0
+            if gradient < 1.0:
+                self._set_limit(self.limit * max(0.5, gradient))
+            elif self.backlog > 0 and self.in_flight >= int(self.limit):
+                # Only grow while saturated with work waiting.
+                self._set_limit(self.limit + 1)
+
+    def _set_limit(self, value: float) -> None:
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), value))
+        self._export()
+        self._cond.notify_all()
+
+    def _export(self) -> None:
+        set_gauge("heal_worker_concurrency_limit", int(self.limit), "Current adaptive heal job concurrency limit")
+        set_gauge("heal_worker_in_flight", self.in_flight, "Heal jobs currently running")
+        if self.latency_ewma is not None:
+            set_gauge("heal_llm_latency_ewma_seconds", self.latency_ewma, "Smoothed LLM call latency")
+
+
+_limiter = AdaptiveLimiter()
+
+
+def get_limiter() -> AdaptiveLimiter:
+    return _limiter
+
+
+def configure_limiter(initial: int, min_limit: int, max_limit: int) -> AdaptiveLimiter:
+    """Replace the process-wide limiter (the worker calls this once at startup)."""
+    global _limiter
+    _limiter = AdaptiveLimiter(initial, min_limit, max_limit)
+    _limiter._export()
+    return _limiter
+
+
+def record_llm_call(latency_s: float, error: Exception | None = None) -> None:
+    """Report an LLM call to the process-wide limiter. Cheap no-op outside the worker."""
+    throttled = error is not None and any(s in str(error).lower() for s in ("429", "rate limit", "quota"))
+    _limiter.record(latency_s, ok=error is None, throttled=throttled)
@@ -15,7 +15,8 @@ class AgentConfig(BaseModel):
         default="src/dashboard/public/status.json",
         description="Path to dashboard status JSON",
     )
-    log_max_chars: int = Field(default=16000, ge=1000, le=100000, description="Max log chars for LLM")
+    log_max_chars: int = Field(default=0, ge=0, le=100000,
+                               description="Hard cap on log chars for LLM on top of the token budget (0 = none)")
     confidence_threshold: float = Field(default=0.8, ge=0.0, le=1.0)
     primary_model: str = Field(default="gemini-2.0-flash", description="Primary LLM model")
     fallback_model: str = Field(default="gemini-1.5-flash", description="Fallback LLM model")
@@ -30,6 +31,13 @@ class AgentConfig(BaseModel):
             raise ValueError("GOOGLE_API_KEY cannot be empty")
         return v.strip()
 
+    @field_validator("log_max_chars")
+    @classmethod
+    def validate_log_max_chars(cls, v: int) -> int:
+        if 0 < v < 1000:
+            raise ValueError("LOG_MAX_CHARS must be 0 (no cap) or at least 1000")
+        return v
+
 
 def _load_env(key: str, default: Optional[str] = None) -> str:
     val = os.getenv(key, default or "")
@@ -46,7 +54,7 @@ def load_config() -> AgentConfig:
         google_api_key=key,
         project_root=_load_env("PROJECT_ROOT") or "src",
         dashboard_status_file=_load_env("DASHBOARD_STATUS_FILE") or "src/dashboard/public/status.json",
-        log_max_chars=int(_load_env("LOG_MAX_CHARS") or "16000"),
+        log_max_chars=int(_load_env("LOG_MAX_CHARS") or "0"),
         confidence_threshold=float(_load_env("CONFIDENCE_THRESHOLD") or "0.8"),
         primary_model=_load_env("LLM_PRIMARY_MODEL") or "gemini-2.0-flash",
         fallback_model=_load_env("LLM_FALLBACK_MODEL") or "gemini-1.5-flash",
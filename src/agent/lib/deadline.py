@@ -0,0 +1,64 @@
+"""End-to-end deadline for a heal run, carried in a contextvar; stages take their timeouts from what is left."""
+import os
+import time
+from contextvars import ContextVar
+
+HEAL_TIMEOUT_SECONDS = float(os.getenv("HEAL_TIMEOUT_SECONDS", "300"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """The heal run's time budget is used up."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.total = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+deadline_var: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+def start_deadline(seconds: float = HEAL_TIMEOUT_SECONDS) -> Deadline:
+    """Set a deadline seconds from now for the current context (kept if an outer one is sooner)."""
+    outer = deadline_var.get()
+    if outer is not None and outer.remaining() <= seconds:
+        return outer
+    deadline = Deadline(seconds)
+    deadline_var.set(deadline)
+    return deadline
+
+
+def remaining() -> float | None:
+    """Seconds left in the current deadline, or None without one."""
+    deadline = deadline_var.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def stage_timeout(cap: float | None, stage: str, minimum: float = 0.0) -> float | None:
+    """
+    Timeout for one stage: cap, shortened to the remaining budget (None = no limit).
+    Raises DeadlineExceeded if the budget is gone, unless minimum > 0 guarantees the stage
+    that much time anyway (failure notifications should still go out).
+    """
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0 and minimum <= 0:
+        raise DeadlineExceeded(f"Heal deadline exceeded before {stage}")
+    timeout = left if cap is None else min(cap, left)
+    return max(timeout, minimum)
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    deadline = deadline_var.get()
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded(f"Heal deadline exceeded before {stage}")
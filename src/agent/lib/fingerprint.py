@@ -0,0 +1,88 @@
+"""Failure fingerprints: a hash of the failure-relevant log lines with run noise (timestamps, IDs, paths) removed."""
+import hashlib
+import re
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+CONTEXT_LINES = 2
+MAX_FAILURE_LINES = 200
+FALLBACK_TAIL_LINES = 50
+
+_ANSI = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07")
+
+# Order matters: more specific patterns first.
+_VOLATILE = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<TS>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<TIME>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<UUID>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<ADDR>"),
+    (re.compile(r"\b(?=[0-9a-f]*[a-f])(?=[0-9a-f]*\d)[0-9a-f]{7,64}\b"), "<HEX>"),
+    (re.compile(r"(?:/private)?/(?:tmp|var/tmp|var/folders)/\S*"), "<TMP>"),
+    (re.compile(r"[A-Za-z]:\\Users\\[^\\\s]+\\AppData\\Local\\Temp\\\S*"), "<TMP>"),
+    (re.compile(r"/home/runner/work/[^/\s]+/[^/\s]+|/var/lib/jenkins/workspace/[^/\s]+|/builds/[^/\s]+/[^/\s]+"), "<WORKSPACE>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b(?:ip|runner|fv-az|worker|agent|host|node|pod)-[\w-]*\d[\w-]*\b", re.I), "<HOST>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\s?(?:ms|s|sec|secs|seconds|m|min|mins|minutes)\b"), "<DUR>"),
+    (re.compile(r"\b\d{5,}\b"), "<N>"),
+]
+
+_FAILURE_MARKERS = re.compile(
+    r"error|fail|exception|traceback|fatal|panic|npm ERR!|❌|assert|denied|not found|cannot|undefined|exit code",
+    re.IGNORECASE,
+)
+
+
+def normalize_line(line: str) -> str:
+    line = _ANSI.sub("", line)
+    for pattern, repl in _VOLATILE:
+        line = pattern.sub(repl, line)
+    return " ".join(line.split())
+
+
+def normalize_log(logs: str) -> str:
+    """Canonical failure-relevant text of logs (volatile tokens replaced)."""
+    lines = [normalize_line(line) for line in logs.splitlines()]
+    lines = [line for line in lines if line]
+    keep: set[int] = set()
+    for i, line in enumerate(lines):
+        if _FAILURE_MARKERS.search(line):
+            keep.update(range(max(0, i - CONTEXT_LINES), min(len(lines), i + CONTEXT_LINES + 1)))
+    selected = [lines[i] for i in sorted(keep)] if keep else lines[-FALLBACK_TAIL_LINES:]
+    # Collapse consecutive duplicates (the same error repeated per retry/shard).
+    out: list[str] = []
+    for line in selected:
+        if not out or out[-1] != line:
+            out.append(line)
+    return "\n".join(out[:MAX_FAILURE_LINES])
+
+
+def memoize_by_digest(maxsize: int):
+    """lru_cache for a function of one large string, keyed on its digest so the string is not kept alive."""
+    def decorator(fn):
+        cache: OrderedDict[bytes, object] = OrderedDict()
+        lock = Lock()
+
+        @wraps(fn)
+        def wrapper(text: str):
+            key = hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            value = fn(text)
+            with lock:
+                cache[key] = value
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return value
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+@memoize_by_digest(maxsize=8)
+def failure_fingerprint(logs: str) -> str:
+    """SHA-256 of normalize_log(logs). Memoized: a heal run asks several times for the same logs."""
+    return hashlib.sha256(normalize_log(logs).encode("utf-8", errors="replace")).hexdigest()
@@ -0,0 +1,84 @@
+"""Block until a file in a directory is written: inotify on Linux, polling elsewhere."""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        _libc = None
+
+HAS_INOTIFY = _libc is not None
+
+
+class DirWatcher:
+    """
+    Wait for writes to specific file names inside one directory. Without inotify,
+    wait() simply sleeps for the timeout and reports False so callers fall back to polling.
+    """
+
+    def __init__(self, directory: Path, names: set[str]):
+        self.directory = Path(directory)
+        self.names = {n.encode() for n in names}
+        self._fd: int | None = None
+        if HAS_INOTIFY:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+                if _libc.inotify_add_watch(fd, str(self.directory).encode(), mask) >= 0:
+                    self._fd = fd
+                else:
+                    os.close(fd)
+
+    @property
+    def native(self) -> bool:
+        return self._fd is not None
+
+    def wait(self, timeout: float) -> bool:
+        """Return True as soon as a watched name is written, False on timeout."""
+        if self._fd is None:
+            time.sleep(timeout)
+            return False
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if ready and self._drain():
+                return True
+
+    def _drain(self) -> bool:
+        """Read pending events; True if any concerned a watched name."""
+        hit = False
+        while True:
+            try:
+                buf = os.read(self._fd, 4096)
+            except BlockingIOError:
+                return hit
+            pos = 0
+            while pos + _EVENT_HEADER.size <= len(buf):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buf, pos)
+                name = buf[pos + _EVENT_HEADER.size:pos + _EVENT_HEADER.size + length].rstrip(b"\0")
+                hit = hit or name in self.names
+                pos += _EVENT_HEADER.size + length
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,94 @@
+"""Hedged LLM requests: if the primary model is slow, race the fallback and keep the first answer."""
+import asyncio
+import os
+from collections import deque
+from threading import Lock
+from typing import Awaitable, Callable, TypeVar
+
+from .logger import info
+from .metrics import set_counter
+
+T = TypeVar("T")
+
+ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1").lower() in ("1", "true", "yes")
+HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+DEFAULT_HEDGE_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "20"))
+MIN_SAMPLES = 20
+
+_latencies: dict[str, deque] = {}
+_stats: dict[str, dict[str, int]] = {}
+_lock = Lock()
+
+
+def record_latency(model: str, seconds: float) -> None:
+    """Feed a successful call's latency into model's p95."""
+    with _lock:
+        _latencies.setdefault(model, deque(maxlen=200)).append(seconds)
+
+
+def hedge_delay(model: str) -> float:
+    """Seconds to wait on model before hedging."""
+    if HEDGE_AFTER_SECONDS > 0:
+        return HEDGE_AFTER_SECONDS
+    with _lock:
+        samples = sorted(_latencies.get(model, ()))
+    if len(samples) < MIN_SAMPLES:
+        return DEFAULT_HEDGE_SECONDS
+    return samples[int(len(samples) * 0.95) - 1]
+
+
+def hedge_stats(model: str) -> dict[str, int]:
+    with _lock:
+        return dict(_stats.get(model, {"calls": 0, "hedged": 0, "wins": 0}))
+
+
+def _count(model: str, field: str) -> None:
+    with _lock:
+        stats = _stats.setdefault(model, {"calls": 0, "hedged": 0, "wins": 0})
+        stats[field] += 1
+        snapshot = dict(stats)
+    labels = {"model": model}
+    set_counter("heal_llm_hedge_calls_total", snapshot["calls"], "Hedged-call groups led by the model", labels)
+    set_counter("heal_llm_hedged_total", snapshot["hedged"], "Times the model was slow enough to hedge", labels)
+    set_counter("heal_llm_hedge_wins_total", snapshot["wins"], "Hedged races won by the model", labels)
+
+
+async def hedged(primary: Callable[[], Awaitable[T]], fallback: Callable[[], Awaitable[T]],
+                 primary_model: str, fallback_model: str) -> T:
+    """
+    Run primary(); if it has not finished within hedge_delay(primary_model), also start
+    fallback() and return whichever succeeds first, cancelling the other. If primary fails
+    before the deadline, fallback runs alone. Raises the last error if both fail.
+    """
+    _count(primary_model, "calls")
+    first = asyncio.ensure_future(primary())
+    delay = hedge_delay(primary_model) if ENABLED else None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+    except asyncio.CancelledError:
+        first.cancel()
+        raise
+    if done:
+        if first.exception() is None:
+            return first.result()
+        info("Primary model failed, trying fallback", error=str(first.exception()))
+        return await fallback()
+
+    info("Primary model slow, hedging with fallback", model=primary_model, after_s=round(delay, 2))
+    _count(primary_model, "hedged")
+    second = asyncio.ensure_future(fallback())
+    owners = {first: primary_model, second: fallback_model}
+    pending = {first, second}
+    last_error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    _count(owners[task], "wins")
+                    return task.result()
+                last_error = task.exception()
+        raise last_error  # type: ignore[misc]
+    finally:
+        for task in pending:
+            task.cancel()
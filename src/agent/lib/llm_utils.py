@@ -1,7 +1,13 @@
 """LLM robustness: retries, fallback, rate limiting, log summarization."""
+import asyncio
+import random
 import re
 import time
-from typing import Callable, TypeVar
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, TypeVar
+
+from .deadline import DeadlineExceeded, check_deadline, remaining
+from .rate_limit import RateLimitTimeout
 
 T = TypeVar("T")
 
@@ -14,11 +20,13 @@ def truncate_logs_smart(logs: str, max_chars: int = 16000) -> str:
     if len(logs) <= max_chars:
         return logs
 
-    header_chars = max_chars // 4
-    tail_chars = max_chars - header_chars - 200
-    header = logs[:header_chars]
-    tail = logs[-tail_chars:]
     sep = "\n... [TRUNCATED - middle portion omitted] ...\n"
+    if max_chars <= len(sep):
+        return logs[-max_chars:] if max_chars > 0 else ""
+    header_chars = min(max_chars // 4, max_chars - len(sep))
+    tail_chars = max(0, max_chars - header_chars - 200)
+    header = logs[:header_chars]
+    tail = logs[-tail_chars:] if tail_chars else ""
     return header + sep + tail
 
 
@@ -37,20 +45,87 @@ def extract_error_region(logs: str, window: int = 2000) -> str:
     return logs[-window:] if len(logs) > window else logs
 
 
+def _retry_after(error: BaseException) -> float | None:
+    """Seconds the server asked us to wait (Retry-After header or retry_after attribute), if any."""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        value = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _backoff(attempt: int, delay: float, backoff: float, error: BaseException) -> float | None:
+    """
+    Sleep before the next attempt: exponential with equal jitter, at least the server's
+    Retry-After. None if that would run past the heal deadline (fail now instead).
+    """
+    base = delay * (backoff ** attempt)
+    sleep = base / 2 + random.uniform(0, base / 2)
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        sleep = max(sleep, retry_after)
+    left = remaining()
+    if left is not None and sleep >= left:
+        return None
+    return sleep
+
+
+def _next_sleep(attempt: int, max_retries: int, delay: float, backoff: float, error: Exception) -> float | None:
+    """Sleep before retrying after error, or None to give up. Re-raises errors a retry cannot fix."""
+    if isinstance(error, (DeadlineExceeded, RateLimitTimeout)):
+        raise error  # retrying cannot make more time or quota
+    if attempt >= max_retries - 1:
+        return None
+    return _backoff(attempt, delay, backoff, error)
+
+
 def with_retry(
     fn: Callable[[], T],
     max_retries: int = 3,
     delay: float = 1.0,
     backoff: float = 2.0,
 ) -> T:
-    """Execute fn with exponential backoff retry."""
+    """Execute fn with jittered exponential backoff retry, within the heal deadline."""
     last_error = None
     for attempt in range(max_retries):
+        check_deadline("retry")
         try:
             return fn()
         except Exception as e:
             last_error = e
-            if attempt < max_retries - 1:
-                sleep_time = delay * (backoff ** attempt)
-                time.sleep(sleep_time)
+            sleep_time = _next_sleep(attempt, max_retries, delay, backoff, e)
+            if sleep_time is None:
+                break
+            time.sleep(sleep_time)
+    raise last_error  # type: ignore
+
+
+async def with_retry_async(
+    fn: Callable[[], Awaitable[T]],
+    max_retries: int = 3,
+    delay: float = 1.0,
+    backoff: float = 2.0,
+) -> T:
+    """Async with_retry(): backoff sleeps yield to the event loop."""
+    last_error = None
+    for attempt in range(max_retries):
+        check_deadline("retry")
+        try:
+            return await fn()
+        except Exception as e:
+            last_error = e
+            sleep_time = _next_sleep(attempt, max_retries, delay, backoff, e)
+            if sleep_time is None:
+                break
+            await asyncio.sleep(sleep_time)
     raise last_error  # type: ignore
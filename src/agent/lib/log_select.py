@@ -0,0 +1,143 @@
+"""Relevance-ranked log reduction: keep the log windows most likely to explain the failure."""
+import math
+import os
+import re
+from collections import Counter
+
+from .fingerprint import memoize_by_digest
+
+WINDOW_CHARS = int(os.getenv("LOG_WINDOW_CHARS", "1500"))
+GAP_RESERVE = 48  # upper bound on one omission marker
+
+STEP_WEIGHT = 8.0
+TRACE_WEIGHT = 4.0
+FRAME_WEIGHT = 1.0
+ERROR_WEIGHT = 3.0
+BEFORE_CONTEXT = 0.5  # share of a window's score given to the window before it
+AFTER_CONTEXT = 0.3
+HEAD_BONUS = 1.0
+TAIL_BONUS = 2.0
+
+_SIGNALS = re.compile(
+    r"(?P<step>##\[error\]|exit(?:ed with)? (?:code|status) [1-9]\d*|process completed with exit code [1-9]"
+    r"|build failed|make(?:\[\d+\])?: \*\*\*|npm err!|^FAILED\b|\bFAILED \S+::|error\[E\d+\])"
+    r"|(?P<trace>traceback \(most recent call last\)|exception in thread|^panic:|^goroutine \d+ \[|^Caused by:"
+    r"|^thread '.*' panicked)"
+    r"|(?P<frame>^\s+at \S+[(:]|^\s+File \".+\", line \d+)"
+    r"|(?P<error>\b\w*(?:error|exception)\b|\b(?:fatal|panic|failed|failure)\b|❌)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Every _SIGNALS alternative contains one of these (lowercase) literals.
+_PREFILTER = ("error", "exception", "fatal", "panic", "fail", "❌", "exit", "make", "npm err", "traceback",
+              "goroutine", "caused by", " at ", "\tat ", "file \"")
+_WEIGHTS = {"step": STEP_WEIGHT, "trace": TRACE_WEIGHT, "frame": FRAME_WEIGHT, "error": ERROR_WEIGHT}
+_DIGITS = re.compile(r"\d+")
+
+
+def _windows(logs: str) -> list[int]:
+    """Window start offsets (plus len(logs)), each window ending on a newline where possible."""
+    bounds, pos, n = [0], 0, len(logs)
+    while pos + WINDOW_CHARS < n:
+        nxt = logs.find("\n", pos + WINDOW_CHARS, pos + 4 * WINDOW_CHARS)
+        pos = nxt + 1 if nxt != -1 else pos + WINDOW_CHARS  # very long lines are cut
+        bounds.append(pos)
+    bounds.append(n)
+    return bounds
+
+
+def _candidate_lines(logs: str) -> list[int]:
+    """Sorted start offsets of lines containing a _PREFILTER literal (the only lines _SIGNALS can match)."""
+    low = logs.lower()
+    if len(low) != len(logs):  # lowercasing changed offsets (rare Unicode): scan everything
+        return [0] + [m.end() for m in re.finditer("\n", logs)]
+    starts = set()
+    for literal in _PREFILTER:
+        pos = low.find(literal)
+        while pos != -1:
+            starts.add(low.rfind("\n", 0, pos) + 1)
+            end = low.find("\n", pos)
+            if end == -1:
+                break
+            pos = low.find(literal, end)
+    return sorted(starts)
+
+
+@memoize_by_digest(maxsize=4)
+def _score(logs: str) -> tuple[list[int], list[float]]:
+    """(window bounds, relevance score per window) for logs."""
+    bounds = _windows(logs)
+    count = len(bounds) - 1
+    hits: list[tuple[float, int, str]] = []  # (weight, window, normalized line)
+    window = 0
+    for start in _candidate_lines(logs):
+        end = logs.find("\n", start)
+        end = len(logs) if end == -1 else end
+        weight = max((_WEIGHTS[m.lastgroup] for m in _SIGNALS.finditer(logs, start, end)), default=0.0)
+        if not weight:
+            continue
+        while bounds[window + 1] <= start:
+            window += 1
+        hits.append((weight, window, _DIGITS.sub("0", logs[start:end].strip())[:200]))
+
+    # Rarity: a line printed k times contributes weight / sqrt(k) each time, so a family of
+    # repeats adds up to sqrt(k) * weight in total instead of k * weight.
+    repeats = Counter(key for _, _, key in hits)
+    raw = [0.0] * count
+    for weight, win, key in hits:
+        raw[win] += weight / math.sqrt(repeats[key])
+
+    scores = []
+    for i in range(count):
+        s = raw[i]
+        if i + 1 < count:
+            s = max(s, raw[i + 1] * BEFORE_CONTEXT)
+        if i > 0:
+            s = max(s, raw[i - 1] * AFTER_CONTEXT)
+        s += i / count * 0.5  # later windows win ties
+        if i == 0:
+            s += HEAD_BONUS
+        if i == count - 1:
+            s += TAIL_BONUS
+        scores.append(s)
+    return bounds, scores
+
+
+def _omitted(logs: str, start: int, end: int) -> str:
+    return f"\n... [{logs.count(chr(10), start, end)} lines omitted] ...\n"
+
+
+def select_log_chunks(logs: str, max_chars: int = 16000) -> str:
+    """
+    Reduce logs to at most max_chars by keeping the highest-scoring windows (in log order).
+    Drop-in replacement for truncate_logs_smart().
+    """
+    if len(logs) <= max_chars:
+        return logs
+    if max_chars <= GAP_RESERVE * 2:
+        return logs[-max_chars:] if max_chars > 0 else ""
+    bounds, scores = _score(logs)
+    budget = max_chars - GAP_RESERVE
+    chosen = []
+    for i in sorted(range(len(scores)), key=scores.__getitem__, reverse=True):
+        cost = bounds[i + 1] - bounds[i] + GAP_RESERVE
+        if cost <= budget:
+            chosen.append(i)
+            budget -= cost
+            if budget < GAP_RESERVE * 2:
+                break
+    if not chosen:
+        # Budget smaller than any window: keep the end of the best one.
+        best = max(range(len(scores)), key=scores.__getitem__)
+        end = bounds[best + 1]
+        return logs[max(bounds[best], end - max_chars + GAP_RESERVE):end]
+
+    chosen.sort()
+    parts, cursor = [], 0
+    for i in chosen:
+        if bounds[i] > cursor:
+            parts.append(_omitted(logs, cursor, bounds[i]))
+        parts.append(logs[bounds[i]:bounds[i + 1]])
+        cursor = bounds[i + 1]
+    if cursor < len(logs):
+        parts.append(_omitted(logs, cursor, len(logs)))
+    return "".join(parts)
@@ -0,0 +1,48 @@
+"""In-process gauges and counters rendered in Prometheus text format by health_server's /metrics."""
+from threading import Lock
+
+_Series = dict[tuple[tuple[str, str], ...], float]
+
+_metrics: dict[str, tuple[str, str, _Series]] = {}  # name -> (type, help, label set -> value)
+_lock = Lock()
+
+
+def _set(kind: str, name: str, value: float, help_text: str, labels: dict[str, str] | None) -> None:
+    key = tuple(sorted((labels or {}).items()))
+    with _lock:
+        _, prev_help, series = _metrics.get(name, (kind, "", {}))
+        series[key] = float(value)
+        _metrics[name] = (kind, help_text or prev_help, series)
+
+
+def set_gauge(name: str, value: float, help_text: str = "", labels: dict[str, str] | None = None) -> None:
+    _set("gauge", name, value, help_text, labels)
+
+
+def set_counter(name: str, value: float, help_text: str = "", labels: dict[str, str] | None = None) -> None:
+    """Publish the current value of a cumulative count (name should end in _total)."""
+    _set("counter", name, value, help_text, labels)
+
+
+def get_gauge(name: str, labels: dict[str, str] | None = None) -> float | None:
+    with _lock:
+        entry = _metrics.get(name)
+        return entry[2].get(tuple(sorted((labels or {}).items()))) if entry else None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus() -> str:
+    with _lock:
+        items = sorted((name, (kind, help_text, dict(series))) for name, (kind, help_text, series) in _metrics.items())
+    lines = []
+    for name, (kind, help_text, series) in items:
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            lines.append(f"{name}{{{labels}}} {value:g}" if labels else f"{name} {value:g}")
+    return "\n".join(lines) + "\n" if lines else ""
@@ -0,0 +1,84 @@
+"""Apply LLM search/replace edits to file content, matching exactly, then ignoring whitespace, then fuzzily."""
+import os
+from difflib import SequenceMatcher
+
+FUZZ_THRESHOLD = float(os.getenv("PATCH_FUZZ_THRESHOLD", "0.9"))
+
+
+class PatchError(ValueError):
+    """An edit could not be applied unambiguously."""
+
+
+def _norm(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _splice(lines: list[str], start: int, count: int, search_lines: list[str], replace: str) -> str:
+    """Replace lines[start:start+count], re-indenting replace if the match was found at a different indent."""
+    found = next((lines[start + k] for k, s in enumerate(search_lines) if s.strip()), lines[start])
+    wanted = next((s for s in search_lines if s.strip()), "")
+    have, had = _indent(found), _indent(wanted)
+    out = []
+    for line in replace.splitlines(keepends=True):
+        if have != had and line.startswith(had) and line.strip():
+            line = have + line[len(had):]
+        out.append(line)
+    block_end_newline = lines[start + count - 1].endswith("\n")
+    if out and block_end_newline and not out[-1].endswith("\n"):
+        out[-1] += "\n"
+    return "".join(lines[:start] + out + lines[start + count:])
+
+
+def _apply_one(content: str, search: str, replace: str, fuzz: float) -> str:
+    if not search.strip():
+        raise PatchError("Empty search block")
+    exact = content.count(search)
+    if exact == 1:
+        return content.replace(search, replace, 1)
+    if exact > 1:
+        raise PatchError(f"Search block matches {exact} places")
+
+    lines = content.splitlines(keepends=True)
+    target = search.strip("\n").splitlines()
+    n = len(target)
+    if n > len(lines):
+        raise PatchError("Search block longer than file")
+    wanted = [_norm(x) for x in target]
+    normalized = [_norm(x) for x in lines]
+    matches = [i for i in range(len(lines) - n + 1) if normalized[i:i + n] == wanted]
+    if len(matches) > 1:
+        raise PatchError(f"Search block matches {len(matches)} places (ignoring whitespace)")
+    if matches:
+        return _splice(lines, matches[0], n, target, replace)
+
+    wanted_text = "\n".join(wanted)
+    scored = []
+    for i in range(len(lines) - n + 1):
+        sm = SequenceMatcher(None, wanted_text, "\n".join(normalized[i:i + n]), autojunk=False)
+        if sm.real_quick_ratio() >= fuzz and sm.quick_ratio() >= fuzz:
+            ratio = sm.ratio()
+            if ratio >= fuzz:
+                scored.append((ratio, i))
+    if not scored:
+        raise PatchError(f"Search block not found: {target[0][:80]!r}")
+    best_ratio, best = max(scored)
+    # Windows overlapping the best one always score close to it; only distant ones are rivals.
+    if any(r >= best_ratio - 0.02 and abs(i - best) >= n for r, i in scored):
+        raise PatchError("Search block fuzzily matches several places")
+    return _splice(lines, best, n, target, replace)
+
+
+def apply_edits(content: str, edits: list[tuple[str, str]], fuzz: float = FUZZ_THRESHOLD) -> str:
+    """Apply edits in order and return the new content. Raises PatchError."""
+    if not edits:
+        raise PatchError("No edits")
+    original = content
+    for search, replace in edits:
+        content = _apply_one(content, search, replace, fuzz)
+    if content == original:
+        raise PatchError("Edits do not change the file")
+    return content
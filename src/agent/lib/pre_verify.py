@@ -3,6 +3,8 @@ import os
 import subprocess
 from pathlib import Path
 
+from .deadline import stage_timeout
+
 
 def run_pre_verify(file_path: str, project_root: Path | None = None) -> tuple[bool, str]:
     """
@@ -22,7 +24,7 @@ def run_pre_verify(file_path: str, project_root: Path | None = None) -> tuple[bo
                 capture_output=True,
                 text=True,
                 cwd=root,
-                timeout=30,
+                timeout=stage_timeout(30, "pre-verify"),
             )
             if r.returncode != 0:
                 return False, r.stderr or r.stdout or "Check failed"
@@ -37,10 +39,12 @@ def run_pre_verify(file_path: str, project_root: Path | None = None) -> tuple[bo
                 capture_output=True,
                 text=True,
                 cwd=root,
-                timeout=10,
+                timeout=stage_timeout(10, "pre-verify"),
             )
             if r.returncode != 0:
                 return False, r.stderr or "Syntax error"
         except FileNotFoundError:
             pass
+        except subprocess.TimeoutExpired:
+            return False, "Verification timeout"
     return True, "OK"
@@ -5,6 +5,8 @@ import os
 import requests
 from typing import Optional
 
+from .deadline import stage_timeout
+
 # Optional imports for providers that need extra deps
 try:
     import boto3
@@ -84,7 +86,8 @@ class GitHubActionsProvider(CIProvider):
                 "Accept": "application/vnd.github+json",
                 "X-GitHub-Api-Version": "2022-11-28",
             }
-            resp = requests.get(url, headers=headers, timeout=30)
+            timeout = stage_timeout(30, "log fetch")
+            resp = requests.get(url, headers=headers, timeout=timeout)
             if resp.status_code == 200:
                 return resp.text
             return f"Error: GitHub API returned {resp.status_code}. build_logs.txt not found."
@@ -120,7 +123,8 @@ class JenkinsProvider(CIProvider):
 
         try:
             auth = (self.user, self.token) if self.user and self.token else None
-            resp = requests.get(console_url, auth=auth, timeout=60)
+            timeout = stage_timeout(60, "log fetch")
+            resp = requests.get(console_url, auth=auth, timeout=timeout)
             resp.raise_for_status()
             return resp.text
         except requests.RequestException as e:
@@ -222,7 +226,8 @@ class AzureDevOpsProvider(CIProvider):
         try:
             # Get timeline (jobs/steps) for the run
             url = f"{base}/build/builds/{run_id}/timeline?api-version=7.1"
-            r = requests.get(url, headers=headers, timeout=30)
+            timeout = stage_timeout(30, "log fetch")
+            r = requests.get(url, headers=headers, timeout=timeout)
             r.raise_for_status()
             timeline = r.json()
             records = timeline.get("records", [])
@@ -233,13 +238,15 @@ class AzureDevOpsProvider(CIProvider):
 
             # Try to get build logs if available
             url2 = f"{base}/build/builds/{run_id}/logs?api-version=7.1"
-            r2 = requests.get(url2, headers=headers, timeout=30)
+            timeout = stage_timeout(30, "log fetch")
+            r2 = requests.get(url2, headers=headers, timeout=timeout)
             if r2.status_code == 200:
                 logs_meta = r2.json()
                 for log in logs_meta.get("value", [])[:5]:
                     log_id = log.get("id")
                     log_url = f"{base}/build/builds/{run_id}/logs/{log_id}?api-version=7.1"
-                    r3 = requests.get(log_url, headers=headers, timeout=30)
+                    timeout = stage_timeout(30, "log fetch")
+                    r3 = requests.get(log_url, headers=headers, timeout=timeout)
                     if r3.status_code == 200:
                         log_content = r3.text
                         log_lines.append(f"\n--- Log {log.get('type', '')} ---\n{log_content}")
@@ -280,7 +287,8 @@ class GitLabProvider(CIProvider):
         url = f"{self.base}/api/v4/projects/{project_id}/jobs/{job_id}/trace"
         headers = {"PRIVATE-TOKEN": self.token}
         try:
-            r = requests.get(url, headers=headers, timeout=60)
+            timeout = stage_timeout(60, "log fetch")
+            r = requests.get(url, headers=headers, timeout=timeout)
             r.raise_for_status()
             return r.text
         except requests.RequestException as e:
@@ -4,6 +4,8 @@ import base64
 import os
 from abc import ABC, abstractmethod
 
+from .deadline import stage_timeout
+
 try:
     import httpx
     HAS_HTTPX = True
@@ -24,9 +26,8 @@ async def fetch_logs_async(provider_name: str, run_id: str) -> str:
     """Async fetch logs. Falls back to sync provider if httpx unavailable."""
     if not HAS_HTTPX:
         import lib.providers as prov
-        loop = asyncio.get_event_loop()
         p = prov.get_provider(provider_name)
-        return await loop.run_in_executor(None, p.fetch_logs, run_id)
+        return await asyncio.to_thread(p.fetch_logs, run_id)  # to_thread carries the heal deadline
 
     if provider_name == "github":
         repo = os.getenv("GITHUB_REPOSITORY", "user/repo")
@@ -42,7 +43,7 @@ async def fetch_logs_async(provider_name: str, run_id: str) -> str:
             "Authorization": f"Bearer {os.getenv('GITHUB_TOKEN', '')}",
             "Accept": "application/vnd.github+json",
         }
-        r = await client.get(url, headers=headers)
+        r = await client.get(url, headers=headers, timeout=stage_timeout(60.0, "log fetch"))
         return r.text if r.status_code == 200 else f"Error: {r.status_code}"
     elif provider_name == "local":
         import lib.providers as prov
@@ -50,6 +51,5 @@ async def fetch_logs_async(provider_name: str, run_id: str) -> str:
         return p.fetch_logs(run_id)
     else:
         import lib.providers as prov
-        loop = asyncio.get_event_loop()
         p = prov.get_provider(provider_name)
-        return await loop.run_in_executor(None, p.fetch_logs, run_id)
+        return await asyncio.to_thread(p.fetch_logs, run_id)  # to_thread carries the heal deadline
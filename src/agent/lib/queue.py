@@ -1,54 +1,550 @@
-"""Job queue for heal runs. Uses Redis if REDIS_URL set, else file-based."""
+"""Job queue for heal runs: priority-ordered, with leases and wakeups. Uses Redis if REDIS_URL set, else file-based."""
 import json
+import mmap
 import os
+import threading
 import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
 
+from .blob_store import put_blob
+from .fswatch import DirWatcher
+from .logger import error, info
+from .redis_client import get_redis
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
 QUEUE_DIR = Path(os.getenv("QUEUE_DIR", "logs/queue"))
+SEGMENT_MAX_BYTES = int(os.getenv("QUEUE_SEGMENT_MAX_BYTES", str(4 * 1024 * 1024)))
+REDIS_QUEUE_KEY = "heal:queue:pq"
+REDIS_LEGACY_KEY = "heal:queue"  # FIFO list used before priorities; drained into REDIS_QUEUE_KEY
+REDIS_INFLIGHT_KEY = "heal:queue:inflight"  # zset job_id -> lease deadline
+REDIS_LEASED_KEY = "heal:queue:leased"  # hash job_id -> "<score> <queue member>"
+REDIS_WAKE_KEY = "heal:queue:wake"
+REDIS_DEAD_KEY = "heal:queue:dead"  # list of jobs nacked MAX_ATTEMPTS times
+WAKE_FILE = ".wake"
+DEAD_FILE = "dead.jsonl"
+LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "900"))
+MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+PRIORITY_DEFAULT = 0
+PRIORITY_PROTECTED_BRANCH = int(os.getenv("QUEUE_PROTECTED_PRIORITY", "10"))
+PROTECTED_BRANCHES = {
+    b.strip() for b in os.getenv("QUEUE_PROTECTED_BRANCHES", "main,master").split(",") if b.strip()
+}
 
+_file_lock = threading.Lock()
+_legacy_files_drained: set[Path] = set()
+_tallies: dict[Path, tuple[int, int, int]] = {}  # segment -> (start, end, records in [start, end))
+_tallies_lock = threading.Lock()
 
-def _get_redis():
-    try:
-        import redis
-        url = os.getenv("REDIS_URL")
-        if url:
-            return redis.from_url(url)
-    except ImportError:
-        pass
-    return None
+
+def priority_for_branch(branch: str | None) -> int:
+    """Failures on protected branches (main/master by default) jump ahead of PR noise."""
+    if branch and branch.removeprefix("refs/heads/") in PROTECTED_BRANCHES:
+        return PRIORITY_PROTECTED_BRANCH
+    return PRIORITY_DEFAULT
+
+
+def _redis_member(job: dict) -> str:
+    # Members sharing a score sort lexicographically, so a fixed-width ts prefix keeps FIFO order.
+    # The fixed-width id after it lets the Lua scripts below find the job id without JSON parsing.
+    return f"{job['ts']:017.6f}:{job['id']}:{json.dumps(job)}"
+
+
+def _job_from_member(member: bytes | str) -> dict:
+    if isinstance(member, bytes):
+        member = member.decode("utf-8")
+    return json.loads(member.split(":", 2)[2])
+
+
+# Requeue expired leases (ARGV[1] = now). Shared prefix of the claim and reap scripts.
+_LUA_REAP = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+  local v = redis.call('HGET', KEYS[3], id)
+  if v then
+    local sp = string.find(v, ' ', 1, true)
+    redis.call('ZADD', KEYS[1], string.sub(v, 1, sp - 1), string.sub(v, sp + 1))
+    redis.call('HDEL', KEYS[3], id)
+  end
+  redis.call('ZREM', KEYS[2], id)
+end
+"""
+
+# Reap, then pop up to ARGV[2] jobs into the in-flight set with deadline ARGV[3].
+_LUA_CLAIM = _LUA_REAP + """
+local items = redis.call('ZPOPMIN', KEYS[1], ARGV[2])
+local out = {}
+for i = 1, #items, 2 do
+  local member = items[i]
+  local id = string.sub(member, 19, 54)
+  redis.call('ZADD', KEYS[2], ARGV[3], id)
+  redis.call('HSET', KEYS[3], id, items[i + 1] .. ' ' .. member)
+  table.insert(out, member)
+end
+return out
+"""
+
+# Requeue one leased job (ARGV[1] = job id) with its attempt count bumped, or move it to the
+# dead-letter list KEYS[4] once that reaches ARGV[2]. Returns 0 if it was not in flight,
+# 1 if requeued, 2 if dead-lettered.
+_LUA_NACK = """
+local v = redis.call('HGET', KEYS[3], ARGV[1])
+if not v then return 0 end
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+local sp = string.find(v, ' ', 1, true)
+local member = string.sub(v, sp + 1)
+local job = cjson.decode(string.sub(member, 56))
+job.attempts = (tonumber(job.attempts) or 0) + 1
+if job.attempts >= tonumber(ARGV[2]) then
+  redis.call('LPUSH', KEYS[4], cjson.encode(job))
+  return 2
+end
+redis.call('ZADD', KEYS[1], string.sub(v, 1, sp - 1), string.sub(member, 1, 55) .. cjson.encode(job))
+return 1
+"""
+
+# Move every job from the legacy list (LPUSH'd, oldest at the tail) into the priority zset.
+_LUA_DRAIN_LEGACY = """
+local n = 0
+local raw = redis.call('RPOP', KEYS[1])
+while raw do
+  local job = cjson.decode(raw)
+  local member = string.format('%017.6f:%s:%s', tonumber(job.ts) or 0, job.id, raw)
+  redis.call('ZADD', KEYS[2], -(tonumber(job.priority) or 0), member)
+  n = n + 1
+  raw = redis.call('RPOP', KEYS[1])
+end
+return n
+"""
+
+_REDIS_KEYS = [REDIS_QUEUE_KEY, REDIS_INFLIGHT_KEY, REDIS_LEASED_KEY]
+_legacy_redis_drained = False
+
+
+def _drain_legacy_redis(r) -> None:
+    """Once per process, requeue jobs an older agent left in REDIS_LEGACY_KEY."""
+    global _legacy_redis_drained
+    if _legacy_redis_drained:
+        return
+    moved = int(r.eval(_LUA_DRAIN_LEGACY, 2, REDIS_LEGACY_KEY, REDIS_QUEUE_KEY))
+    _legacy_redis_drained = True
+    if moved:
+        info("Migrated legacy queued jobs", count=moved, source=REDIS_LEGACY_KEY)
 
 
 def enqueue(provider: str, run_id: str, logs: str | None = None, priority: int = 0) -> str:
-    """Add heal job. Returns job_id."""
-    job = {"id": str(uuid.uuid4()), "provider": provider, "run_id": run_id, "logs": logs, "priority": priority, "ts": time.time()}
-    r = _get_redis()
+    """
+    Add heal job. Higher priority is served first. Returns job_id.
+    Logs are stored in the blob store; the job only carries their reference (logs_ref).
+    """
+    logs_ref = put_blob(logs) if logs else None
+    job = {"id": str(uuid.uuid4()), "provider": provider, "run_id": run_id, "logs_ref": logs_ref, "priority": priority, "ts": time.time()}
+    r = get_redis()
     if r:
-        r.lpush("heal:queue", json.dumps(job))
+        pipe = r.pipeline(transaction=False)
+        pipe.zadd(REDIS_QUEUE_KEY, {_redis_member(job): -priority})
+        _push_wake(pipe)
+        pipe.execute()
         return job["id"]
-    QUEUE_DIR.mkdir(parents=True, exist_ok=True)
-    path = QUEUE_DIR / f"{job['id']}.json"
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(job, f)
+    with _locked():
+        _drain_legacy_files()
+        _append(int(priority), job)
+    _notify()
     return job["id"]
 
 
 def dequeue() -> dict | None:
-    """Get next job. Redis: BRPOP. File: oldest by mtime."""
-    r = _get_redis()
+    """Get next job. Redis: BZPOPMIN. File: next record of the highest non-empty priority log."""
+    r = get_redis()
     if r:
-        _, raw = r.brpop("heal:queue", timeout=1) or (None, None)
-        return json.loads(raw) if raw else None
+        _drain_legacy_redis(r)
+        popped = r.bzpopmin(REDIS_QUEUE_KEY, timeout=1)
+        if not popped:
+            return None
+        return _job_from_member(popped[1])
     if not QUEUE_DIR.exists():
         return None
-    jobs = sorted(QUEUE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime)
-    if not jobs:
+    with _locked():
+        _drain_legacy_files()
+        for log_dir in _priority_dirs():
+            raw = _pop(log_dir)
+            if raw is not None:
+                break
+        else:
+            return None
+    try:
+        return json.loads(raw)
+    except ValueError:
         return None
-    path = jobs[0]
+
+
+def claim(n: int = 1, lease_seconds: float = LEASE_SECONDS) -> list[dict]:
+    """
+    Atomically lease up to n jobs (highest priority first). Each must be ack()ed or
+    nack()ed before its lease expires, otherwise it is requeued. Expired leases are
+    reaped as part of every claim.
+    """
+    if n <= 0:
+        return []
+    now = time.time()
+    r = get_redis()
+    if r:
+        _drain_legacy_redis(r)
+        members = r.eval(_LUA_CLAIM, 3, *_REDIS_KEYS, now, n, now + lease_seconds)
+        return [_job_from_member(m) for m in members]
+    with _locked():
+        _drain_legacy_files()
+        inflight = _read_inflight()
+        _requeue_expired(inflight, now)
+        jobs = []
+        for log_dir in _priority_dirs():
+            while len(jobs) < n:
+                raw = _pop(log_dir)
+                if raw is None:
+                    break
+                try:
+                    jobs.append(json.loads(raw))
+                except ValueError:
+                    continue
+        for job in jobs:
+            inflight[job["id"]] = {"deadline": now + lease_seconds, "job": job}
+        _write_inflight(inflight)
+    return jobs
+
+
+def ack(job_id: str) -> bool:
+    """Mark a claimed job done. Returns False if it was not in flight (e.g. lease already expired)."""
+    r = get_redis()
+    if r:
+        pipe = r.pipeline()
+        pipe.zrem(REDIS_INFLIGHT_KEY, job_id)
+        pipe.hdel(REDIS_LEASED_KEY, job_id)
+        return bool(pipe.execute()[1])
+    with _locked():
+        inflight = _read_inflight()
+        if inflight.pop(job_id, None) is None:
+            return False
+        _write_inflight(inflight)
+    return True
+
+
+def nack(job_id: str) -> bool:
+    """
+    Give a claimed job back to the queue at its original priority. After MAX_ATTEMPTS nacks
+    it goes to the dead-letter list instead. Returns False if it was not in flight.
+    """
+    r = get_redis()
+    if r:
+        outcome = int(r.eval(_LUA_NACK, 4, *_REDIS_KEYS, REDIS_DEAD_KEY, job_id, MAX_ATTEMPTS))
+        if outcome == 1:
+            _push_wake(r)
+        elif outcome == 2:
+            error("Job dead-lettered", job_id=job_id, attempts=MAX_ATTEMPTS, dead_letter=REDIS_DEAD_KEY)
+        return outcome != 0
+    with _locked():
+        inflight = _read_inflight()
+        entry = inflight.pop(job_id, None)
+        if entry is None:
+            return False
+        job = entry["job"]
+        job["attempts"] = job.get("attempts", 0) + 1
+        dead = job["attempts"] >= MAX_ATTEMPTS
+        if dead:
+            with open(QUEUE_DIR / DEAD_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(job) + "\n")
+        else:
+            _append(int(job.get("priority", 0)), job)
+        _write_inflight(inflight)
+    if dead:
+        error("Job dead-lettered", job_id=job_id, attempts=job["attempts"], dead_letter=str(QUEUE_DIR / DEAD_FILE))
+    else:
+        _notify()
+    return True
+
+
+def reap_expired() -> int:
+    """Requeue jobs whose lease has expired. Returns how many were requeued."""
+    now = time.time()
+    r = get_redis()
+    if r:
+        return int(r.eval(_LUA_REAP + "\nreturn #expired", 3, *_REDIS_KEYS, now))
+    if not QUEUE_DIR.exists():
+        return 0
+    with _locked():
+        inflight = _read_inflight()
+        count = _requeue_expired(inflight, now)
+        if count:
+            _write_inflight(inflight)
+    return count
+
+
+def wait_for_jobs(timeout: float) -> bool:
+    """
+    Block until a job may be available or timeout elapses. Returns True on a wakeup;
+    callers should still treat an empty claim() afterwards as normal (another consumer won).
+    """
+    r = get_redis()
+    if r:
+        return r.blpop(REDIS_WAKE_KEY, timeout=timeout) is not None
+    return _get_watcher().wait(timeout)
+
+
+def _push_wake(r) -> None:
+    # One pending token is enough: a woken worker claims a full batch, and surplus tokens
+    # would only make idle workers spin through empty claims.
+    r.lpush(REDIS_WAKE_KEY, 1)
+    r.ltrim(REDIS_WAKE_KEY, 0, 0)
+
+
+_watcher: DirWatcher | None = None
+
+
+def _get_watcher() -> DirWatcher:
+    global _watcher
+    if _watcher is None or _watcher.directory != QUEUE_DIR:
+        if _watcher:
+            _watcher.close()
+        _watcher = DirWatcher(QUEUE_DIR, {WAKE_FILE})
+    return _watcher
+
+
+def _notify() -> None:
+    """Wake file-backend consumers blocked in wait_for_jobs()."""
+    try:
+        with open(QUEUE_DIR / WAKE_FILE, "w"):
+            pass
+    except OSError:
+        pass
+
+
+def queue_depth() -> int:
+    """Number of jobs waiting (not counting jobs already dequeued)."""
+    r = get_redis()
+    if r:
+        return int(r.zcard(REDIS_QUEUE_KEY))
+    if not QUEUE_DIR.exists():
+        return 0
+    total = 0
+    with _tallies_lock:
+        live = set()
+        for log_dir in _priority_dirs():
+            state = _read_state(log_dir)
+            for seq in _segments(log_dir):
+                if seq >= state["read_seg"]:
+                    seg = _segment_path(log_dir, seq)
+                    live.add(seg)
+                    total += _count_records(seg, state["read_off"] if seq == state["read_seg"] else 0)
+        for seg in _tallies.keys() - live:
+            del _tallies[seg]
+    return total
+
+
+def queue_age() -> float:
+    """Seconds the next job to be served has been waiting (0 when the queue is empty)."""
+    r = get_redis()
+    if r:
+        head = r.zrange(REDIS_QUEUE_KEY, 0, 0)
+        return max(0.0, time.time() - float(head[0][:17])) if head else 0.0
+    if not QUEUE_DIR.exists():
+        return 0.0
+    for log_dir in _priority_dirs():
+        state = _read_state(log_dir)
+        for seq in _segments(log_dir):
+            if seq < state["read_seg"]:
+                continue
+            offset = state["read_off"] if seq == state["read_seg"] else 0
+            record, _ = _read_record(_segment_path(log_dir, seq), offset)
+            if record is not None:
+                return max(0.0, time.time() - json.loads(record).get("ts", time.time()))
+    return 0.0
+
+
+# --- File backend: per-priority segment log ---
+#
+# QUEUE_DIR/p<priority>/<seq>.seg   newline-delimited JSON records, append-only
+# QUEUE_DIR/p<priority>/cursor.json {"read_seg", "read_off"}: the committed read position
+#
+# Writers append to the highest-numbered segment and never touch the cursor, so an enqueue
+# is a single append; only dequeues pay for the atomic cursor rewrite. Segments roll over at
+# SEGMENT_MAX_BYTES and are deleted once the cursor moves past them.
+
+
+def _priority_dirs() -> list[Path]:
+    """Priority log directories, highest priority first."""
+    return sorted(QUEUE_DIR.glob("p*/"), key=lambda p: -int(p.name[1:]))
+
+
+def _segments(log_dir: Path) -> list[int]:
+    """Sequence numbers of the segments in log_dir, ascending."""
+    try:
+        with os.scandir(log_dir) as it:
+            return sorted(int(e.name[:-4]) for e in it if e.name.endswith(".seg"))
+    except FileNotFoundError:
+        return []
+
+
+def _segment_path(log_dir: Path, seq: int) -> Path:
+    return log_dir / f"{seq:012d}.seg"
+
+
+def _read_state(log_dir: Path) -> dict:
+    try:
+        with open(log_dir / "cursor.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"read_seg": 0, "read_off": 0}
+
+
+def _commit_state(log_dir: Path, state: dict) -> None:
+    tmp = log_dir / "cursor.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"read_seg": state["read_seg"], "read_off": state["read_off"]}, f)
+    os.replace(tmp, log_dir / "cursor.json")
+
+
+def _append(priority: int, job: dict) -> None:
+    """Append job to the tail segment of its priority log. Caller holds lock."""
+    log_dir = QUEUE_DIR / f"p{priority}"
+    segments = _segments(log_dir)
+    if segments:
+        seq = segments[-1]
+    else:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        seq = _read_state(log_dir)["read_seg"]  # drained log: continue where the reader is
+    record = json.dumps(job).encode("utf-8") + b"\n"
+    f = open(_segment_path(log_dir, seq), "ab")
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            job = json.load(f)
+        if os.fstat(f.fileno()).st_size >= SEGMENT_MAX_BYTES:
+            f.close()
+            f = open(_segment_path(log_dir, seq + 1), "ab")
+        f.write(record)
+    finally:
+        f.close()
+
+
+def _pop(log_dir: Path) -> bytes | None:
+    """Read the record at the cursor and commit the advanced cursor. Caller holds lock."""
+    state = _read_state(log_dir)
+    while True:
+        seg = _segment_path(log_dir, state["read_seg"])
+        record, seg_size = _read_record(seg, state["read_off"])
+        if record is not None:
+            break
+        later = [s for s in _segments(log_dir) if s > state["read_seg"]]
+        if not later:
+            return None
+        # Sealed segment with nothing left to read (e.g. a crash left it behind).
+        seg.unlink(missing_ok=True)
+        state["read_seg"], state["read_off"] = later[0], 0
+    state["read_off"] += len(record) + 1
+    if state["read_off"] >= seg_size:
+        # Fully consumed: move on to the next segment, or to a fresh one (segment paths are never reused).
+        seg.unlink(missing_ok=True)
+        later = [s for s in _segments(log_dir) if s > state["read_seg"]]
+        state["read_seg"] = later[0] if later else state["read_seg"] + 1
+        state["read_off"] = 0
+    _commit_state(log_dir, state)
+    return record
+
+
+def _count_records(seg: Path, offset: int) -> int:
+    """Complete records in seg from offset on, reading only what changed since the last count (under _tallies_lock)."""
+    start, end, count = _tallies.get(seg, (offset, offset, 0))
+    try:
+        with open(seg, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if not start <= offset <= end <= size:  # first look, or the segment was recreated
+                start, end, count = offset, offset, 0
+            if offset > start:
+                f.seek(start)
+                count -= f.read(offset - start).count(b"\n")
+            if size > end:
+                f.seek(end)
+                count += f.read(size - end).count(b"\n")
+    except FileNotFoundError:
+        _tallies.pop(seg, None)
+        return 0
+    _tallies[seg] = (offset, size, count)
+    return count
+
+
+def _read_record(seg: Path, offset: int) -> tuple[bytes | None, int]:
+    """Memory-map seg and return (complete line starting at offset or None, segment size)."""
+    try:
+        with open(seg, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= offset:
+                return None, size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                end = m.find(b"\n", offset)
+                return (m[offset:end] if end != -1 else None), size
+    except FileNotFoundError:
+        return None, 0
+
+
+def _drain_legacy_files() -> None:
+    """Once per process, append one-file-per-job entries (QUEUE_DIR/<id>.json) to their logs. Caller holds lock."""
+    if QUEUE_DIR in _legacy_files_drained:
+        return
+    moved = 0
+    for path in sorted(QUEUE_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime):
+        if path.name == "inflight.json":
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _append(int(job.get("priority", 0)), job)
         path.unlink()
-        return job
-    except Exception:
-        return None
+        moved += 1
+    _legacy_files_drained.add(QUEUE_DIR)
+    if moved:
+        info("Migrated legacy queued jobs", count=moved, source=str(QUEUE_DIR))
+
+
+def _read_inflight() -> dict:
+    try:
+        with open(QUEUE_DIR / "inflight.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_inflight(inflight: dict) -> None:
+    tmp = QUEUE_DIR / "inflight.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(inflight, f)
+    os.replace(tmp, QUEUE_DIR / "inflight.json")
+
+
+def _requeue_expired(inflight: dict, now: float) -> int:
+    """Move expired leases from inflight back onto their priority log. Caller holds lock."""
+    expired = [job_id for job_id, entry in inflight.items() if entry["deadline"] <= now]
+    for job_id in expired:
+        job = inflight.pop(job_id)["job"]
+        _append(int(job.get("priority", 0)), job)
+    return len(expired)
+
+
+@contextmanager
+def _locked():
+    """Serialize queue updates across threads and, where flock exists, across processes."""
+    with _file_lock:
+        QUEUE_DIR.mkdir(parents=True, exist_ok=True)
+        if not HAS_FCNTL:
+            yield
+            return
+        with open(QUEUE_DIR / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -1,40 +1,140 @@
-"""Quorum: require multiple LLM runs to agree before applying fix."""
+"""Quorum: require multiple concurrent LLM runs to agree (see QUORUM_AGREEMENT) before applying a fix."""
+import asyncio
 import os
-from typing import Callable, TypeVar
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Awaitable, Callable, TypeVar
+
+from .logger import info
+from .metrics import set_counter, set_gauge
 
 T = TypeVar("T")
 
 QUORUM_SIZE = int(os.getenv("QUORUM_SIZE", "2"))
+AGREEMENT = [c.strip() for c in os.getenv("QUORUM_AGREEMENT", "file_path").split(",") if c.strip()]
+CONFIDENCE_TOLERANCE = float(os.getenv("QUORUM_CONFIDENCE_TOLERANCE", "0.15"))
+TEXT_SIMILARITY = float(os.getenv("QUORUM_TEXT_SIMILARITY", "0.5"))
+QUORUM_REPOS = {r.strip() for r in os.getenv("QUORUM_REPOS", "").split(",") if r.strip()}
 
+_WORD = re.compile(r"\w+")
+_stats = {"quorums": 0, "agreed": 0, "disagreed": 0, "incomplete": 0, "runs": 0, "cancelled": 0}
+_stats_lock = Lock()
 
-def run_with_quorum(fn: Callable[[], T], n: int = QUORUM_SIZE) -> T | None:
+
+def quorum_required(repo: str | None) -> bool:
+    """Quorum is on for repos listed in QUORUM_REPOS (high-risk) or everywhere with FEATURE_QUORUM."""
+    from .feature_flags import QUORUM
+    return QUORUM() or (repo or "") in QUORUM_REPOS
+
+
+def _words(text: str) -> set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+def agree(a, b, criteria: list[str] | None = None) -> bool:
+    """True if results a and b agree on every criterion."""
+    for criterion in criteria or AGREEMENT:
+        if criterion == "file_path":
+            if getattr(a, "file_path", str(a)) != getattr(b, "file_path", str(b)):
+                return False
+        elif criterion == "confidence":
+            if abs(getattr(a, "confidence_score", 0.0) - getattr(b, "confidence_score", 0.0)) > CONFIDENCE_TOLERANCE:
+                return False
+        elif criterion == "root_cause":
+            wa, wb = _words(getattr(a, "root_cause", "")), _words(getattr(b, "root_cause", ""))
+            if not wa or not wb or len(wa & wb) / len(wa | wb) < TEXT_SIMILARITY:
+                return False
+        else:
+            raise ValueError(f"Unknown quorum agreement criterion: {criterion}")
+    return True
+
+
+def quorum_stats() -> dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(outcome: str, latencies: list[float], cancelled: int, elapsed: float) -> None:
+    with _stats_lock:
+        _stats["quorums"] += 1
+        _stats[outcome] += 1
+        _stats["runs"] += len(latencies)
+        _stats["cancelled"] += cancelled
+        snapshot = dict(_stats)
+    info("Quorum finished", outcome=outcome, elapsed_s=round(elapsed, 3),
+         run_latencies_s=[round(x, 3) for x in latencies], cancelled=cancelled)
+    set_counter("heal_quorum_total", snapshot["quorums"], "Quorum analyses run")
+    for name in ("agreed", "disagreed", "incomplete"):
+        set_counter("heal_quorum_outcomes_total", snapshot[name],
+                    "Quorums by outcome (incomplete: fewer than two successful runs)", {"outcome": name})
+    set_counter("heal_quorum_cancelled_runs_total", snapshot["cancelled"], "Quorum runs cancelled after early agreement")
+    set_gauge("heal_quorum_last_seconds", elapsed, "Latency of the last quorum")
+
+
+def _settle(results: list, new) -> tuple[bool, object | None]:
+    """Add new to results; (True, agreed result) once two agree."""
+    for earlier in results:
+        if agree(earlier, new):
+            return True, earlier
+    results.append(new)
+    return False, None
+
+
+def _outcome(results: list, error: BaseException | None):
+    """No agreement: a lone successful run stands; if none succeeded, re-raise the last error."""
+    if not results and error is not None:
+        raise error
+    return results[0] if len(results) == 1 else None
+
+
+async def run_with_quorum_async(fn: Callable[[], Awaitable[T]], n: int = QUORUM_SIZE) -> T | None:
     """
-    Run fn() n times. Return result if at least 2 runs agree (same file_path + similar confidence).
-    Otherwise return None (no quorum).
+    Run fn() n times concurrently and return the first result another run agrees with,
+    cancelling the rest. None if the runs disagree; the result itself if only one succeeded;
+    the last error if none did.
     """
     if n < 2:
-        return fn()
+        return await fn()
+    start = time.monotonic()
+
+    async def _timed():
+        t0 = time.monotonic()
+        result = await fn()
+        return result, time.monotonic() - t0
 
+    pending = {asyncio.ensure_future(_timed()) for _ in range(n)}
     results: list[T] = []
-    for _ in range(n):
-        try:
-            r = fn()
-            results.append(r)
-        except Exception:
-            pass
-
-    if len(results) < 2:
-        return results[0] if results else None
-
-    # Check agreement: same file_path
-    paths = [getattr(r, "file_path", str(r)) for r in results]
-    from collections import Counter
-    counts = Counter(paths)
-    most_common = counts.most_common(1)[0]
-    if most_common[1] < 2:
-        return None
-    agreed_path = most_common[0]
-    for r in results:
-        if getattr(r, "file_path", "") == agreed_path:
-            return r
-    return results[0]
+    latencies: list[float] = []
+    error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                result, latency = task.result()
+                latencies.append(latency)
+                agreed, winner = _settle(results, result)
+                if agreed:
+                    _record("agreed", latencies, len(pending), time.monotonic() - start)
+                    return winner
+    finally:
+        for task in pending:
+            task.cancel()
+    _record("disagreed" if len(results) > 1 else "incomplete", latencies, 0, time.monotonic() - start)
+    return _outcome(results, error)
+
+
+def run_with_quorum(fn: Callable[[], T], n: int = QUORUM_SIZE) -> T | None:
+    """
+    run_with_quorum_async() for synchronous fn, one thread per run. Runs still going when
+    two agree are abandoned (threads cannot be cancelled) and their results discarded.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(n, 1))
+    try:
+        return asyncio.run(run_with_quorum_async(lambda: asyncio.get_running_loop().run_in_executor(pool, fn), n))
+    finally:
+        pool.shutdown(wait=False)
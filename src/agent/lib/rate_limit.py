@@ -0,0 +1,153 @@
+"""Per-model requests/min and tokens/min token buckets for LLM calls, shared through Redis when available."""
+import asyncio
+import os
+import time
+from threading import Lock
+
+from .deadline import stage_timeout
+from .logger import debug
+from .redis_client import get_redis
+
+RATE_LIMIT_DELAY = float(os.getenv("RATE_LIMIT_DELAY", "1.0"))
+DEFAULT_RPM = float(os.getenv("LLM_RPM_LIMIT", str(60.0 / max(RATE_LIMIT_DELAY, 0.001))))
+DEFAULT_TPM = float(os.getenv("LLM_TPM_LIMIT", "1000000"))
+MAX_WAIT_SECONDS = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "60"))
+DISABLED = os.getenv("LLM_RATE_LIMIT_DISABLED", "").lower() in ("1", "true", "yes")
+KEY_PREFIX = "heal:ratelimit"
+
+
+class RateLimitTimeout(TimeoutError):
+    """Quota would not free up before the caller's deadline."""
+
+
+def _parse_limits(spec: str) -> dict[str, tuple[float, float]]:
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, _, quota = item.partition("=")
+        rpm, _, tpm = quota.partition(":")
+        limits[model.strip()] = (float(rpm or DEFAULT_RPM), float(tpm or DEFAULT_TPM))
+    return limits
+
+
+MODEL_LIMITS = _parse_limits(os.getenv("LLM_RATE_LIMITS", ""))
+
+
+def limits_for(model: str) -> tuple[float, float]:
+    """(requests per minute, tokens per minute) for model."""
+    return MODEL_LIMITS.get(model, (DEFAULT_RPM, DEFAULT_TPM))
+
+
+# KEYS: rpm bucket, tpm bucket. ARGV: rpm cap, rpm refill/s, tpm cap, tpm refill/s, tokens.
+# Takes from both buckets only if both can pay; otherwise returns seconds until they can.
+_LUA_TAKE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local function level(key, cap, rate)
+  local v = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(v[1]) or cap
+  local ts = tonumber(v[2]) or now
+  return math.min(cap, tokens + math.max(0, now - ts) * rate)
+end
+local rcap, rrate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tcap, trate = tonumber(ARGV[3]), tonumber(ARGV[4])
+local need = math.min(tonumber(ARGV[5]), tcap)
+local r, k = level(KEYS[1], rcap, rrate), level(KEYS[2], tcap, trate)
+local wait = 0
+if r < 1 then wait = math.max(wait, (1 - r) / rrate) end
+if k < need then wait = math.max(wait, (need - k) / trate) end
+if wait > 0 then return tostring(wait) end
+redis.call('HSET', KEYS[1], 'tokens', r - 1, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', k - need, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('EXPIRE', KEYS[2], 120)
+return '0'
+"""
+
+
+class _LocalBuckets:
+    def __init__(self):
+        self._state: dict[str, tuple[float, float]] = {}  # key -> (tokens, ts)
+        self._lock = Lock()
+
+    def _level(self, key: str, cap: float, rate: float, now: float) -> float:
+        tokens, ts = self._state.get(key, (cap, now))
+        return min(cap, tokens + max(0.0, now - ts) * rate)
+
+    def take(self, model: str, tokens: int) -> float:
+        rpm, tpm = limits_for(model)
+        need = min(float(tokens), tpm)
+        with self._lock:
+            now = time.monotonic()
+            r = self._level(f"{model}:rpm", rpm, rpm / 60, now)
+            k = self._level(f"{model}:tpm", tpm, tpm / 60, now)
+            wait = 0.0
+            if r < 1:
+                wait = max(wait, (1 - r) / (rpm / 60))
+            if k < need:
+                wait = max(wait, (need - k) / (tpm / 60))
+            if wait > 0:
+                return wait
+            self._state[f"{model}:rpm"] = (r - 1, now)
+            self._state[f"{model}:tpm"] = (k - need, now)
+            return 0.0
+
+
+_local = _LocalBuckets()
+
+
+def _take(model: str, tokens: int) -> float:
+    """Try to take quota for one call; return 0 on success, else seconds to wait."""
+    r = get_redis()
+    if r:
+        try:
+            rpm, tpm = limits_for(model)
+            keys = [f"{KEY_PREFIX}:{model}:rpm", f"{KEY_PREFIX}:{model}:tpm"]
+            return float(r.eval(_LUA_TAKE, 2, *keys, rpm, rpm / 60, tpm, tpm / 60, tokens))
+        except Exception as e:
+            debug("Shared rate limiter unavailable, using local buckets", error=str(e))
+    return _local.take(model, tokens)
+
+
+def _attempt(model: str, tokens: int, start: float, timeout: float | None) -> float:
+    """Take quota (returns 0) or return seconds to wait; RateLimitTimeout if that overruns timeout."""
+    wait = _take(model, tokens)
+    if wait <= 0:
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            debug("Rate limited LLM call", model=model, waited_s=round(waited, 3))
+        return 0.0
+    if timeout is not None and time.monotonic() - start + wait > timeout:
+        raise RateLimitTimeout(f"LLM quota for {model} not available within {timeout}s")
+    return wait
+
+
+def acquire(model: str, tokens: int = 0, timeout: float | None = MAX_WAIT_SECONDS) -> float:
+    """
+    Block until model has quota for one request of ~tokens tokens. Returns seconds waited.
+    Raises RateLimitTimeout if that would take longer than timeout (None = wait indefinitely),
+    which is shortened to what is left of the heal deadline.
+    """
+    if DISABLED:
+        return 0.0
+    timeout = stage_timeout(timeout, "LLM quota")
+    start = time.monotonic()
+    while True:
+        wait = _attempt(model, tokens, start, timeout)
+        if not wait:
+            return time.monotonic() - start
+        time.sleep(wait)
+
+
+async def acquire_async(model: str, tokens: int = 0, timeout: float | None = MAX_WAIT_SECONDS) -> float:
+    """acquire() that waits on the event loop: no thread is held, and a cancelled caller takes no quota."""
+    if DISABLED:
+        return 0.0
+    timeout = stage_timeout(timeout, "LLM quota")
+    start = time.monotonic()
+    while True:
+        wait = await asyncio.to_thread(_attempt, model, tokens, start, timeout)
+        if not wait:
+            return time.monotonic() - start
+        await asyncio.sleep(wait)
@@ -0,0 +1,48 @@
+"""Shared Redis client: one lazily created, pooled client per process for cache, queue, blobs, locks and counters."""
+import os
+from threading import Lock
+
+MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "10"))  # wait for a free connection
+CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "5"))
+HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+_client = None
+_client_url: str | None = None
+_lock = Lock()
+
+
+def get_redis():
+    """Return the shared client, or None when REDIS_URL is unset or redis is not installed."""
+    global _client, _client_url
+    url = os.getenv("REDIS_URL")
+    if not url:
+        return None
+    if _client is not None and _client_url == url:
+        return _client
+    try:
+        import redis
+    except ImportError:
+        return None
+    with _lock:
+        if _client is None or _client_url != url:
+            pool = redis.BlockingConnectionPool.from_url(
+                url,
+                max_connections=MAX_CONNECTIONS,
+                timeout=POOL_TIMEOUT,
+                socket_connect_timeout=CONNECT_TIMEOUT,
+                health_check_interval=HEALTH_CHECK_INTERVAL,
+            )
+            if _client is not None:
+                _client.connection_pool.disconnect()
+            _client, _client_url = redis.Redis(connection_pool=pool), url
+    return _client
+
+
+def reset_redis() -> None:
+    """Drop the shared client (tests, config reload)."""
+    global _client, _client_url
+    with _lock:
+        if _client is not None:
+            _client.connection_pool.disconnect()
+        _client, _client_url = None, None
@@ -1,27 +1,50 @@
 """Graceful shutdown handling."""
 import signal
 import sys
+import threading
 
 _shutdown_requested = False
+_drain_only = False
+_shutdown_event = threading.Event()
 
 
 def _handler(signum, frame):
-    global _shutdown_requested
-    _shutdown_requested = True
+    request_shutdown()
     # Allow second SIGTERM to force exit
     signal.signal(signal.SIGTERM, signal.SIG_DFL)
     signal.signal(signal.SIGINT, signal.SIG_DFL)
 
 
-def setup_graceful_shutdown():
+def setup_graceful_shutdown(drain: bool = False):
+    """
+    Install SIGTERM/SIGINT handlers. With drain=True, check_shutdown() no longer exits so
+    in-flight work runs to completion; long-lived callers poll is_shutdown_requested() instead.
+    Signal handlers can only be installed from the main thread; elsewhere this is a no-op.
+    """
+    global _drain_only
+    if threading.current_thread() is not threading.main_thread():
+        return
+    _drain_only = drain
     signal.signal(signal.SIGTERM, _handler)
     signal.signal(signal.SIGINT, _handler)
 
 
+def request_shutdown() -> None:
+    """Flag shutdown programmatically (same effect as receiving SIGTERM)."""
+    global _shutdown_requested
+    _shutdown_requested = True
+    _shutdown_event.set()
+
+
 def is_shutdown_requested() -> bool:
     return _shutdown_requested
 
 
+def wait_for_shutdown(timeout: float | None = None) -> bool:
+    """Block until shutdown is requested or timeout elapses. Returns True if requested."""
+    return _shutdown_event.wait(timeout)
+
+
 def check_shutdown():
-    if _shutdown_requested:
+    if _shutdown_requested and not _drain_only:
         sys.exit(130)
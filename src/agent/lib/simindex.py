@@ -0,0 +1,157 @@
+"""Near-duplicate lookup over past failures: SimHash of the normalized log plus a banded LSH index on disk."""
+import hashlib
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from threading import Lock
+
+from .fingerprint import memoize_by_digest, normalize_log
+
+SIMINDEX_PATH = Path(os.getenv("SIMINDEX_PATH", "logs/simindex.txt"))
+MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "5"))
+HASH_BITS = 64
+
+# Bare numbers (line numbers, counts) are left out so they do not move the hash.
+_TOKEN = re.compile(r"<[A-Z]+>|[A-Za-z_][\w.\-/]*")
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8", errors="replace"), digest_size=8).digest(), "big")
+
+
+@memoize_by_digest(maxsize=8)
+def simhash(logs: str) -> int:
+    """64-bit SimHash of the failure-relevant tokens (and token pairs) of logs."""
+    tokens = _TOKEN.findall(normalize_log(logs).lower())
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    weights = [0] * HASH_BITS
+    for feature, weight in features.items():
+        h = _feature_hash(feature)
+        for bit in range(HASH_BITS):
+            weights[bit] += weight if h >> bit & 1 else -weight
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def _bands(count: int) -> list[tuple[int, int]]:
+    """Split HASH_BITS into count (shift, mask) bands of near-equal width."""
+    count = max(1, min(count, HASH_BITS))
+    bands, shift = [], 0
+    for i in range(count):
+        width = HASH_BITS // count + (1 if i < HASH_BITS % count else 0)
+        bands.append((shift, (1 << width) - 1))
+        shift += width
+    return bands
+
+
+class SimIndex:
+    """Banded SimHash index persisted to an append-only file."""
+
+    def __init__(self, path: Path, max_distance: int = MAX_DISTANCE):
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self._bands = _bands(max_distance + 1)
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in self._bands]  # band value -> hashes
+        self._keys: dict[int, list[str]] = {}  # hash -> keys
+        self._seen: set[str] = set()
+        self._offset = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _insert(self, key: str, h: int) -> None:
+        self._seen.add(key)
+        if h in self._keys:
+            self._keys[h].append(key)
+            return
+        self._keys[h] = [key]
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            buckets.setdefault(h >> shift & mask, []).append(h)
+
+    def _refresh(self) -> None:
+        """Load lines appended since the last read (by this or any other process). Caller holds lock."""
+        try:
+            if self.path.stat().st_size <= self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        end = chunk.rfind(b"\n") + 1  # a writer may be mid-line
+        for line in chunk[:end].splitlines():
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            key = parts[0].decode("ascii", errors="replace")
+            if key not in self._seen:
+                try:
+                    self._insert(key, int(parts[1], 16))
+                except ValueError:
+                    continue
+        self._offset += end
+
+    def add(self, key: str, h: int) -> None:
+        """Record key with hash h (no-op if key is already indexed)."""
+        with self._lock:
+            self._refresh()
+            if key in self._seen:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            line = f"{key} {h:016x}\n".encode("ascii")
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            self._insert(key, h)
+            if self.path.stat().st_size == self._offset + len(line):
+                self._offset += len(line)
+
+    def nearest(self, h: int, exclude: str | None = None) -> tuple[str, int] | None:
+        """(key, bit distance) of the closest entry within max_distance bits, else None."""
+        with self._lock:
+            self._refresh()
+            best: str | None = None
+            best_d = self.max_distance + 1
+            for buckets, (shift, mask) in zip(self._buckets, self._bands):
+                candidates = buckets.get(h >> shift & mask)
+                if not candidates:
+                    continue
+                # Distances in C (map) rather than a Python loop: buckets hold hundreds at 100k entries.
+                distances = list(map(int.bit_count, map(h.__xor__, candidates)))
+                if min(distances) >= best_d:
+                    continue
+                for candidate, d in zip(candidates, distances):
+                    if d < best_d:
+                        key = next((k for k in self._keys[candidate] if k != exclude), None)
+                        if key is not None:
+                            best, best_d = key, d
+            return (best, best_d) if best is not None else None
+
+
+_index = SimIndex(SIMINDEX_PATH)
+
+
+def _disabled() -> bool:
+    return os.getenv("CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+
+def add_failure(logs: str, key: str) -> None:
+    """Index a failure whose analysis is cached under key."""
+    if _disabled():
+        return
+    _index.add(key, simhash(logs))
+
+
+def find_similar(logs: str, exclude: str | None = None) -> tuple[str, float] | None:
+    """(cache key, similarity) of the most similar indexed failure, or None."""
+    if _disabled():
+        return None
+    h = simhash(logs)
+    hit = _index.nearest(h, exclude=exclude)
+    if hit is None:
+        return None
+    return hit[0], 1.0 - hit[1] / HASH_BITS
@@ -0,0 +1,168 @@
+"""Single-flight: coalesce concurrent identical calls, in-process and across workers via Redis."""
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Awaitable, Callable, TypeVar
+
+from .deadline import stage_timeout
+from .logger import debug
+from .redis_client import get_redis
+
+T = TypeVar("T")
+
+LOCK_TTL_SECONDS = float(os.getenv("SINGLEFLIGHT_LOCK_TTL", "300"))
+WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "300"))
+RESULT_TTL_SECONDS = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", "60"))
+KEY_PREFIX = "heal:sf"
+
+
+class LeaderFailed(RuntimeError):
+    """Raised in waiters when the cross-worker leader's call failed."""
+
+
+class _LeaderGone(Exception):
+    """Set on the shared future when the in-process leader was cancelled."""
+
+
+_inflight: dict[str, Future] = {}
+_lock = Lock()
+
+# Delete the lock only if we still own it.
+_LUA_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+async def run_once_async(
+    key: str,
+    fn: Callable[[], Awaitable[T]],
+    encode: Callable[[T], Any] = lambda v: v,
+    decode: Callable[[Any], T] = lambda v: v,
+) -> T:
+    """Run fn() once per key across concurrent callers (and workers) and share its result or error."""
+    while True:
+        with _lock:
+            fut = _inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = _inflight[key] = Future()
+        if leader:
+            break
+        debug("Single-flight: waiting on in-process leader", key=key)
+        try:
+            # shield: a waiter's own cancellation must not cancel the shared future.
+            return await asyncio.shield(asyncio.wrap_future(fut))
+        except _LeaderGone:
+            continue  # the leader was cancelled; one waiter takes over
+    try:
+        result = await _run_distributed_async(key, fn, encode, decode)
+    except Exception as e:
+        _settle(key, fut, error=e)
+        raise
+    except BaseException:
+        _settle(key, fut, error=_LeaderGone())
+        raise
+    _settle(key, fut, result=result)
+    return result
+
+
+def _settle(key: str, fut: Future, result: Any = None, error: BaseException | None = None) -> None:
+    # Unregister first, so waiters woken by a cancelled leader find the slot free.
+    with _lock:
+        _inflight.pop(key, None)
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
+
+
+async def _run_distributed_async(key: str, fn: Callable[[], Awaitable[T]], encode, decode) -> T:
+    r = get_redis()
+    if not r:
+        return await fn()
+    outcome, value = await asyncio.to_thread(_wait_or_lock, r, key, decode)
+    if outcome == "result":
+        return value
+    if outcome == "local":
+        return await fn()
+    try:
+        result = await fn()
+    except Exception as e:
+        await asyncio.to_thread(_finish, r, key, value, json.dumps({"error": str(e)}), False)
+        raise
+    except BaseException:
+        _release(r, f"{KEY_PREFIX}:lock:{key}", value)  # cancelled: let another worker lead
+        raise
+    await asyncio.to_thread(_finish, r, key, value, json.dumps({"ok": encode(result)}), True)
+    return result
+
+
+def _wait_or_lock(r, key: str, decode) -> tuple[str, Any]:
+    """Wait for another worker's result ("result"), the lock ("lead", token) or give up ("local")."""
+    lock_key, result_key, channel = f"{KEY_PREFIX}:lock:{key}", f"{KEY_PREFIX}:result:{key}", f"{KEY_PREFIX}:{key}"
+    token = str(uuid.uuid4())
+    wait = stage_timeout(WAIT_SECONDS, "single-flight wait")
+    try:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+    except Exception:
+        return "local", None
+    try:
+        deadline = time.time() + wait
+        while True:
+            raw = r.get(result_key)
+            if raw:
+                return "result", _unwrap(raw, decode)
+            if r.set(lock_key, token, nx=True, px=int(LOCK_TTL_SECONDS * 1000)):
+                return "lead", token
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                debug("Single-flight: leader too slow, running locally", key=key)
+                return "local", None
+            msg = pubsub.get_message(timeout=min(1.0, remaining))
+            if msg and msg.get("type") == "message":
+                return "result", _unwrap(msg["data"], decode)
+    except LeaderFailed:
+        raise
+    except Exception as e:
+        debug("Single-flight: Redis unavailable, running locally", error=str(e))
+        return "local", None
+    finally:
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+
+
+def _finish(r, key: str, token: str, payload: str, store: bool) -> None:
+    """Publish the leader's outcome (storing successes for late arrivals) and release the lock."""
+    _publish(r, f"{KEY_PREFIX}:{key}", f"{KEY_PREFIX}:result:{key}" if store else None, payload)
+    _release(r, f"{KEY_PREFIX}:lock:{key}", token)
+
+
+def _publish(r, channel: str, result_key: str | None, payload: str) -> None:
+    try:
+        if result_key:
+            r.setex(result_key, RESULT_TTL_SECONDS, payload)
+        r.publish(channel, payload)
+    except Exception:
+        pass
+
+
+def _release(r, lock_key: str, token: str) -> None:
+    try:
+        r.eval(_LUA_RELEASE, 1, lock_key, token)
+    except Exception:
+        pass
+
+
+def _unwrap(raw: bytes | str, decode):
+    data = json.loads(raw)
+    if "error" in data:
+        raise LeaderFailed(f"Single-flight leader failed: {data['error']}")
+    return decode(data["ok"])
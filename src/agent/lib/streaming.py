@@ -1,6 +1,6 @@
 """Streaming LLM responses for incremental output."""
 import json
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
@@ -17,6 +17,117 @@ def stream_analysis_chunks(prompt, llm, parser, inputs: dict) -> Iterator[str]:
             yield chunk
 
 
+async def astream_analysis_chunks(prompt, llm, inputs: dict, config: dict | None = None) -> AsyncIterator[str]:
+    """Async stream_analysis_chunks(). config is passed through (e.g. usage callbacks)."""
+    chain = prompt | llm
+    async for chunk in chain.astream(inputs, config=config):
+        if hasattr(chunk, "content") and chunk.content:
+            yield chunk.content
+        elif isinstance(chunk, str):
+            yield chunk
+
+
+class IncrementalJSONFields:
+    """
+    Incremental parser for a streamed JSON object: feed() text chunks as they arrive and get
+    back the top-level (key, value) pairs that became complete. Text before the first "{"
+    (e.g. a ```json fence) is skipped; nested objects/arrays are returned once closed.
+    """
+
+    def __init__(self):
+        self.fields: dict = {}
+        self._buf = ""
+        self._pos = 0
+        self._started = False
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self._buf += chunk
+        if not self._started:
+            start = self._buf.find("{")
+            if start < 0:
+                return []
+            self._pos, self._started = start + 1, True
+        found = []
+        while True:
+            pair = self._next_pair()
+            if pair is None:
+                return found
+            self.fields[pair[0]] = pair[1]
+            found.append(pair)
+
+    def _skip_ws(self, i: int) -> int:
+        while i < len(self._buf) and self._buf[i] in " \t\r\n,":
+            i += 1
+        return i
+
+    def _string_end(self, i: int) -> int:
+        """Index just past the string starting at buf[i] == '"', or -1 if incomplete."""
+        i += 1
+        while i < len(self._buf):
+            c = self._buf[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == '"':
+                return i + 1
+            i += 1
+        return -1
+
+    def _value_end(self, i: int) -> int:
+        """Index just past the value starting at buf[i], or -1 if it may still grow."""
+        c = self._buf[i]
+        if c == '"':
+            return self._string_end(i)
+        if c in "{[":
+            depth = 0
+            while i < len(self._buf):
+                c = self._buf[i]
+                if c == '"':
+                    i = self._string_end(i)
+                    if i < 0:
+                        return -1
+                    continue
+                if c in "{[":
+                    depth += 1
+                elif c in "}]":
+                    depth -= 1
+                    if depth == 0:
+                        return i + 1
+                i += 1
+            return -1
+        # number / true / false / null: complete once a delimiter follows
+        j = i
+        while j < len(self._buf) and self._buf[j] not in ",}] \t\r\n":
+            j += 1
+        return j if j < len(self._buf) else -1
+
+    def _next_pair(self) -> tuple[str, object] | None:
+        i = self._skip_ws(self._pos)
+        if i >= len(self._buf) or self._buf[i] != '"':
+            return None
+        key_end = self._string_end(i)
+        if key_end < 0:
+            return None
+        colon = self._skip_ws(key_end)
+        if colon >= len(self._buf) or self._buf[colon] != ":":
+            return None
+        value_start = colon + 1
+        while value_start < len(self._buf) and self._buf[value_start] in " \t\r\n":
+            value_start += 1
+        if value_start >= len(self._buf):
+            return None
+        value_end = self._value_end(value_start)
+        if value_end < 0:
+            return None
+        try:
+            key = json.loads(self._buf[i:key_end])
+            value = json.loads(self._buf[value_start:value_end])
+        except ValueError:
+            return None
+        self._pos = value_end
+        return key, value
+
+
 def parse_streamed_result(accumulated: str, parser: PydanticOutputParser, model: type) -> BaseModel | None:
     """Try to parse accumulated stream into Pydantic model."""
     try:
@@ -0,0 +1,83 @@
+"""Token accounting: provider-reported usage plus a per-model chars-per-token estimate calibrated against it."""
+import math
+import os
+from threading import Lock
+from typing import Callable
+
+from .metrics import set_gauge
+
+DEFAULT_CHARS_PER_TOKEN = float(os.getenv("TOKEN_CHARS_PER_TOKEN", "4.0"))
+CALIBRATION_ALPHA = 0.2
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "6000"))
+
+
+def _parse_budgets(spec: str) -> dict[str, int]:
+    budgets = {}
+    for item in spec.split(","):
+        model, sep, tokens = item.partition("=")
+        if sep and tokens.strip().isdigit():
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+MODEL_BUDGETS = _parse_budgets(os.getenv("LLM_PROMPT_TOKEN_BUDGETS", ""))
+
+_ratios: dict[str, float] = {}
+_lock = Lock()
+
+
+def prompt_budget(model: str) -> int:
+    """Max prompt tokens for model."""
+    return MODEL_BUDGETS.get(model, PROMPT_TOKEN_BUDGET)
+
+
+def chars_per_token(model: str) -> float:
+    with _lock:
+        return _ratios.get(model, DEFAULT_CHARS_PER_TOKEN)
+
+
+def estimate_tokens(text: str, model: str) -> int:
+    """Calibrated local token estimate for text under model's tokenizer."""
+    return math.ceil(len(text) / chars_per_token(model)) if text else 0
+
+
+def calibrate(model: str, chars: int, tokens: int) -> None:
+    """Fold one observed (chars, tokens) pair into model's ratio."""
+    if chars < 200 or tokens <= 0:
+        return  # tiny prompts are dominated by fixed overhead
+    observed = chars / tokens
+    with _lock:
+        prev = _ratios.get(model)
+        ratio = observed if prev is None else CALIBRATION_ALPHA * observed + (1 - CALIBRATION_ALPHA) * prev
+        _ratios[model] = ratio
+    set_gauge("heal_llm_chars_per_token", ratio, "Calibrated characters per token", {"model": model})
+
+
+def usage_for(usage_metadata: dict, model: str) -> tuple[int, int] | None:
+    """(input, output) tokens for model from a UsageMetadataCallbackHandler's usage_metadata."""
+    if not usage_metadata:
+        return None
+    entry = usage_metadata.get(model)
+    if entry is None:
+        # Providers may report a versioned name (e.g. "models/gemini-2.0-flash-001").
+        entry = next((v for k, v in usage_metadata.items() if model in k), None)
+    if entry is None and len(usage_metadata) == 1:
+        entry = next(iter(usage_metadata.values()))
+    if not entry:
+        return None
+    return int(entry.get("input_tokens", 0)), int(entry.get("output_tokens", 0))
+
+
+def fit_text(text: str, max_tokens: int, model: str, truncate: Callable[[str, int], str]) -> str:
+    """Shrink text with truncate(text, max_chars) until its estimate fits max_tokens."""
+    if max_tokens <= 0:
+        return ""
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+    chars = int(max_tokens * chars_per_token(model))
+    while chars > 0:
+        out = truncate(text, chars)
+        if estimate_tokens(out, model) <= max_tokens:
+            return out
+        chars = int(chars * 0.9)
+    return ""
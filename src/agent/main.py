@@ -2,47 +2,73 @@
 import os
 import sys
 import argparse
+import asyncio
 import json
 import time
 
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.exceptions import OutputParserException
 from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
 # Local imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from lib.providers import get_provider
-from lib.llm_utils import truncate_logs_smart, with_retry
+from lib.providers_async import fetch_logs_async
+from lib.llm_utils import with_retry_async
+from lib.log_select import select_log_chunks
 from lib.audit import log_audit
 from lib.file_resolver import find_file
-from lib.cache import get_cached_analysis, set_cached_analysis
+from lib.cache import (
+    get_cached_analysis, get_cached_analysis_by_key, set_cached_analysis, cache_key,
+    fix_cache_key, get_cached_fix, set_cached_fix,
+)
 from lib.circuit_breaker import get_llm_circuit
 from lib.logger import info, warn, error
 from lib.logger import correlation_id_var
 from lib.sanitize import sanitize_logs
+from lib.compact import compact_logs
 from lib.guardrails import is_path_allowed, validate_llm_output_corrected_code
 from lib.secret_detect import has_secret
 from lib.signals import setup_graceful_shutdown, is_shutdown_requested, check_shutdown
 from lib.token_tracker import log_token_usage, check_budget_alert
+from lib.tokens import calibrate, estimate_tokens, fit_text, prompt_budget, usage_for
 from lib.prompts import FEW_SHOT_EXAMPLES
-from lib.alert import alert_heal_failures
+from lib.alert import alert_heal_failures, send_slack
 from lib.rollback import rollback_last, rollback_n
 from lib.pre_verify import run_pre_verify
+from lib.singleflight import run_once_async
+from lib.blob_store import get_blob
+from lib.concurrency import record_llm_call
+from lib.rate_limit import acquire_async as acquire_llm_quota
+from lib.simindex import add_failure, find_similar
+from lib.hedge import hedged, record_latency as record_model_latency
+from lib.quorum import quorum_required, run_with_quorum_async
+from lib.streaming import IncrementalJSONFields, astream_analysis_chunks
+from lib.patching import PatchError, apply_edits
+from lib.feature_flags import STREAMING
+from lib.deadline import HEAL_TIMEOUT_SECONDS, DeadlineExceeded, check_deadline, stage_timeout, start_deadline
 
 load_dotenv()
 
 # --- Config ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 DASHBOARD_STATUS_FILE = Path(os.getenv("DASHBOARD_STATUS_FILE", "src/dashboard/public/status.json"))
-LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "16000"))
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "0"))  # optional hard cap on top of the token budget
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.8"))
 PRIMARY_MODEL = os.getenv("LLM_PRIMARY_MODEL", "gemini-2.0-flash")
 FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gemini-1.5-flash")
 MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))  # per call, capped by the heal deadline
 ALLOW_RESTRICTED = os.getenv("ALLOW_RESTRICTED_FILES", "").lower() in ("1", "true", "yes")
+FIX_OUTPUT_MODE = os.getenv("FIX_OUTPUT_MODE", "auto")  # auto | diff | full
+FIX_DIFF_MIN_CHARS = int(os.getenv("FIX_DIFF_MIN_CHARS", "1500"))
+NEAR_DUP_PENALTY = float(os.getenv("NEAR_DUP_CONFIDENCE_PENALTY", "0.1"))
 
 
 def validate_env() -> None:
@@ -65,6 +91,16 @@ class CodeFixResult(BaseModel):
     explanation: str = Field(description="Brief explanation of changes made")
 
 
+class CodeEdit(BaseModel):
+    search: str = Field(description="Exact lines copied from the current content, enough to be unique")
+    replace: str = Field(description="The lines that replace them")
+
+
+class CodeEditResult(BaseModel):
+    edits: list[CodeEdit] = Field(description="Search/replace edits, applied in order")
+    explanation: str = Field(description="Brief explanation of changes made")
+
+
 def update_dashboard(status: str, run_id: str, logs: str = "", analysis: dict | None = None,
                      action: str | None = None, provider_context: str = "",
                      correlation_id: str | None = None) -> None:
@@ -93,7 +129,9 @@ def update_dashboard(status: str, run_id: str, logs: str = "", analysis: dict |
         warn("Failed to update dashboard", error=str(e))
 
 
+@lru_cache(maxsize=8)
 def get_llm(model: str | None = None) -> ChatGoogleGenerativeAI:
+    """Return a per-process client for model, so long-lived workers reuse its HTTP session."""
     return ChatGoogleGenerativeAI(
         model=model or PRIMARY_MODEL,
         temperature=0,
@@ -101,11 +139,7 @@ def get_llm(model: str | None = None) -> ChatGoogleGenerativeAI:
     )
 
 
-def analyze_with_gemini(logs: str, context: str, correlation_id: str) -> LogAnalysisResult:
-    truncated = truncate_logs_smart(sanitize_logs(logs), LOG_MAX_CHARS)
-    parser = PydanticOutputParser(pydantic_object=LogAnalysisResult)
-    prompt = PromptTemplate(
-        template="""You are an expert DevOps AI Agent capable of diagnosing CI/CD failures.
+ANALYSIS_TEMPLATE = """You are an expert DevOps AI Agent capable of diagnosing CI/CD failures.
 
 {few_shot}
 
@@ -117,40 +151,24 @@ LOGS:
 {logs}
 
 {format_instructions}
-""",
-        input_variables=["logs", "context"],
-        partial_variables={
-            "format_instructions": parser.get_format_instructions(),
-            "few_shot": FEW_SHOT_EXAMPLES,
-        },
-    )
+"""
 
-    def _try(model: str) -> LogAnalysisResult:
-        circuit = get_llm_circuit()
-        result = circuit.execute(
-            lambda: with_retry(
-                lambda: (prompt | get_llm(model) | parser).invoke({"logs": truncated, "context": context}),
-                max_retries=MAX_RETRIES,
-            )
-        )
-        # Approximate token usage
-        inp, out = len(truncated) // 4, len(str(result)) // 4
-        log_token_usage("", model, inp, out, correlation_id)
-        if check_budget_alert(correlation_id):
-            warn("Token budget threshold exceeded", correlation_id=correlation_id)
-        return result
+FIX_TEMPLATE = """You are an expert Software Engineer. Return the COMPLETE corrected file content.
 
-    try:
-        return _try(PRIMARY_MODEL)
-    except Exception as e1:
-        info("Primary model failed, trying fallback", error=str(e1))
-        return _try(FALLBACK_MODEL)
+FILENAME: {filename}
+
+CURRENT CONTENT:
+{file_content}
+
+SUGGESTION:
+{suggestion}
 
+{format_instructions}
+"""
 
-def generate_code_fix(file_content: str, suggestion: str, filename: str, correlation_id: str) -> CodeFixResult:
-    parser = PydanticOutputParser(pydantic_object=CodeFixResult)
-    prompt = PromptTemplate(
-        template="""You are an expert Software Engineer. Return the COMPLETE corrected file content.
+FIX_DIFF_TEMPLATE = """You are an expert Software Engineer. Fix the file with minimal search/replace edits.
+Do NOT return the whole file. Each "search" must be copied verbatim from the current content
+and include enough surrounding lines to match exactly one place.
 
 FILENAME: {filename}
 
@@ -161,99 +179,384 @@ SUGGESTION:
 {suggestion}
 
 {format_instructions}
-""",
-        input_variables=["file_content", "suggestion", "filename"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
+"""
 
-    def _try(model: str) -> CodeFixResult:
-        result = (prompt | get_llm(model) | parser).invoke({
-            "file_content": file_content,
-            "suggestion": suggestion,
-            "filename": filename,
-        })
-        log_token_usage("", model, len(file_content) // 4, len(result.corrected_code) // 4, correlation_id)
-        return result
 
+@lru_cache(maxsize=3)
+def _prompt_and_parser(kind: str) -> tuple[PromptTemplate, PydanticOutputParser]:
+    if kind == "analysis":
+        parser = PydanticOutputParser(pydantic_object=LogAnalysisResult)
+        prompt = PromptTemplate(
+            template=ANALYSIS_TEMPLATE,
+            input_variables=["logs", "context", "few_shot"],
+            partial_variables={"format_instructions": parser.get_format_instructions()},
+        )
+    elif kind == "fix":
+        parser = PydanticOutputParser(pydantic_object=CodeFixResult)
+        prompt = PromptTemplate(
+            template=FIX_TEMPLATE,
+            input_variables=["file_content", "suggestion", "filename"],
+            partial_variables={"format_instructions": parser.get_format_instructions()},
+        )
+    elif kind == "fix_diff":
+        parser = PydanticOutputParser(pydantic_object=CodeEditResult)
+        prompt = PromptTemplate(
+            template=FIX_DIFF_TEMPLATE,
+            input_variables=["file_content", "suggestion", "filename"],
+            partial_variables={"format_instructions": parser.get_format_instructions()},
+        )
+    else:
+        raise ValueError(f"Unknown chain: {kind}")
+    return prompt, parser
+
+
+@lru_cache(maxsize=8)
+def get_chain(kind: str, model: str):
+    """Prebuilt prompt | llm | parser chain ("analysis", "fix" or "fix_diff") for model, built once per process."""
+    prompt, parser = _prompt_and_parser(kind)
+    return prompt | get_llm(model) | parser
+
+
+def reload_llm_config() -> None:
+    """Re-read API key and model settings and drop prebuilt clients and chains."""
+    global GOOGLE_API_KEY, PRIMARY_MODEL, FALLBACK_MODEL
+    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+    PRIMARY_MODEL = os.getenv("LLM_PRIMARY_MODEL", "gemini-2.0-flash")
+    FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gemini-1.5-flash")
+    get_chain.cache_clear()
+    get_llm.cache_clear()
+    info("LLM config reloaded", primary=PRIMARY_MODEL, fallback=FALLBACK_MODEL)
+
+
+def _record_usage(model: str, prompt_text: str, output_text: str, usage_metadata: dict) -> None:
+    """Log real token usage (estimated if the provider sent none) and recalibrate the estimator."""
+    usage = usage_for(usage_metadata, model)
+    if usage:
+        calibrate(model, len(prompt_text), usage[0])
+        inp, out = usage
+    else:
+        inp, out = estimate_tokens(prompt_text, model), estimate_tokens(output_text, model)
+    log_token_usage("", model, inp, out, correlation_id_var.get())
+
+
+def _raise_if_budget_cut(e: Exception, timeout: float) -> None:
+    """A call timed out only because the heal deadline shortened it: not the model's fault."""
+    if isinstance(e, asyncio.TimeoutError) and not isinstance(e, DeadlineExceeded) and timeout < LLM_REQUEST_TIMEOUT:
+        raise DeadlineExceeded("Heal deadline exceeded during LLM call") from e
+
+
+async def _timed_ainvoke(kind: str, inputs: dict, model: str):
+    """
+    Wait for model's request/token quota, then invoke the kind chain, record token usage and
+    report its latency and outcome to the adaptive concurrency limiter.
+    """
+    prompt_text = _prompt_and_parser(kind)[0].format(**inputs)
+    await acquire_llm_quota(model, estimate_tokens(prompt_text, model))
+    usage = UsageMetadataCallbackHandler()
+    timeout = stage_timeout(LLM_REQUEST_TIMEOUT, "LLM call")
+    start = time.monotonic()
     try:
-        return _try(PRIMARY_MODEL)
-    except Exception as e1:
-        info("Primary model failed, trying fallback", error=str(e1))
-        return _try(FALLBACK_MODEL)
+        result = await asyncio.wait_for(get_chain(kind, model).ainvoke(inputs, config={"callbacks": [usage]}),
+                                        timeout)
+    except Exception as e:
+        _raise_if_budget_cut(e, timeout)
+        record_llm_call(time.monotonic() - start, e)
+        raise
+    record_llm_call(time.monotonic() - start)
+    _record_usage(model, prompt_text, result.model_dump_json() if isinstance(result, BaseModel) else str(result),
+                  usage.usage_metadata)
+    return result
+
+
+async def _timed_astream_analysis(inputs: dict, model: str, on_field) -> LogAnalysisResult:
+    """
+    _timed_ainvoke() for the analysis chain, streamed: on_field(key, value) is called as each
+    top-level field of the JSON answer completes, before the rest has been generated.
+    """
+    prompt, parser = _prompt_and_parser("analysis")
+    prompt_text = prompt.format(**inputs)
+    await acquire_llm_quota(model, estimate_tokens(prompt_text, model))
+    usage = UsageMetadataCallbackHandler()
+    start = time.monotonic()
+    fields = IncrementalJSONFields()
+    parts: list[str] = []
+
+    async def _stream() -> None:
+        async for chunk in astream_analysis_chunks(prompt, get_llm(model), inputs, config={"callbacks": [usage]}):
+            parts.append(chunk)
+            for key, value in fields.feed(chunk):
+                on_field(key, value)
+
+    timeout = stage_timeout(LLM_REQUEST_TIMEOUT, "LLM call")
+    try:
+        await asyncio.wait_for(_stream(), timeout)
+        result = parser.parse("".join(parts))
+    except Exception as e:
+        _raise_if_budget_cut(e, timeout)
+        record_llm_call(time.monotonic() - start, e)
+        raise
+    record_llm_call(time.monotonic() - start)
+    _record_usage(model, prompt_text, "".join(parts), usage.usage_metadata)
+    return result
+
+
+def analysis_inputs(sanitized_logs: str, context: str, model: str) -> dict:
+    """
+    Assemble analysis prompt inputs within model's prompt token budget: instructions and
+    context always, few-shot examples if they leave at least half the budget, and as much
+    of the logs as still fits, most failure-relevant windows first.
+    """
+    prompt, _ = _prompt_and_parser("analysis")
+    budget = prompt_budget(model)
+    fixed = estimate_tokens(prompt.format(logs="", context=context, few_shot=""), model)
+    few_shot = FEW_SHOT_EXAMPLES
+    if fixed + estimate_tokens(few_shot, model) > budget // 2:
+        few_shot = ""
+    logs = fit_text(sanitized_logs, budget - fixed - estimate_tokens(few_shot, model), model, select_log_chunks)
+    if LOG_MAX_CHARS:
+        logs = select_log_chunks(logs, LOG_MAX_CHARS)
+    return {"logs": logs, "context": context, "few_shot": few_shot}
+
+
+async def async_analyze_with_gemini(logs: str, context: str, correlation_id: str,
+                                    on_field=None) -> LogAnalysisResult:
+    """Analyze logs. With on_field the answer is streamed and fields are reported as they complete."""
+    # Regex-heavy sanitization and compaction run off the event loop so other heals keep moving.
+    sanitized = await asyncio.to_thread(lambda: compact_logs(sanitize_logs(logs)))
+
+    async def _call(model: str) -> LogAnalysisResult:
+        inputs = analysis_inputs(sanitized, context, model)
+        if on_field is not None:
+            return await _timed_astream_analysis(inputs, model, on_field)
+        return await _timed_ainvoke("analysis", inputs, model)
+
+    async def _try(model: str) -> LogAnalysisResult:
+        # Per-model breaker: an outage of one model fails straight over to the other.
+        circuit = get_llm_circuit(model)
+        start = time.monotonic()
+        result = await circuit.execute_async(
+            lambda: with_retry_async(lambda: _call(model), max_retries=MAX_RETRIES)
+        )
+        record_model_latency(model, time.monotonic() - start)
+        if check_budget_alert(correlation_id):
+            warn("Token budget threshold exceeded", correlation_id=correlation_id)
+        return result
 
+    # A slow primary gets raced by the fallback instead of holding the heal for minutes.
+    return await hedged(lambda: _try(PRIMARY_MODEL), lambda: _try(FALLBACK_MODEL), PRIMARY_MODEL, FALLBACK_MODEL)
 
-def apply_fix_real(analysis: LogAnalysisResult, run_id: str, provider_name: str,
-                   correlation_id: str, dry_run: bool = False) -> str | None:
-    allowed, reason = is_path_allowed(analysis.file_path, allow_restricted=ALLOW_RESTRICTED)
-    if not allowed:
-        error("Guardrail blocked path", path=analysis.file_path, reason=reason)
-        return None
 
-    target_file = find_file(analysis.file_path)
-    if not target_file or not target_file.exists():
-        error("Could not locate file", path=analysis.file_path)
-        return None
+def analyze_with_gemini(logs: str, context: str, correlation_id: str) -> LogAnalysisResult:
+    return asyncio.run(async_analyze_with_gemini(logs, context, correlation_id))
 
-    info("Located target file", path=str(target_file))
-    try:
-        with open(target_file, "r", encoding="utf-8", errors="replace") as f:
-            content = f.read()
-    except Exception as e:
-        error("Error reading file", error=str(e))
-        return None
 
-    fix_result = generate_code_fix(content, analysis.suggested_fix, analysis.file_path, correlation_id)
-    ok, msg = validate_llm_output_corrected_code(fix_result.corrected_code)
+def check_fix_output(corrected_code: str) -> tuple[bool, str]:
+    """Output guardrails for a generated fix: (ok, reason)."""
+    ok, msg = validate_llm_output_corrected_code(corrected_code)
     if not ok:
-        error("Output validation failed", reason=msg)
-        return None
-    secret_ok, secret_msg = has_secret(fix_result.corrected_code)
-    if secret_ok:
-        error("Secret detection blocked output", reason=secret_msg)
-        return None
+        return False, f"Output validation failed: {msg}"
+    found, secret_msg = has_secret(corrected_code)
+    if found:
+        return False, f"Secret detection blocked output: {secret_msg}"
+    return True, ""
 
-    if dry_run:
-        info("Dry-run: would apply fix", path=str(target_file), explanation=fix_result.explanation)
-        return fix_result.explanation
 
-    passed, pv_msg = run_pre_verify(str(target_file))
-    if not passed:
-        error("Pre-verify failed", message=pv_msg)
+def _use_diff(file_content: str) -> bool:
+    if FIX_OUTPUT_MODE == "diff":
+        return True
+    return FIX_OUTPUT_MODE == "auto" and len(file_content) >= FIX_DIFF_MIN_CHARS
+
+
+async def _diff_fix(file_content: str, inputs: dict, model: str) -> tuple[CodeFixResult, bool, str] | None:
+    """
+    Ask for search/replace edits and apply them locally. Guardrails scan only the
+    replacement text. None if the edits are unusable, so the caller regenerates the file.
+    """
+    try:
+        edit = await _timed_ainvoke("fix_diff", inputs, model)
+        patched = await asyncio.to_thread(apply_edits, file_content, [(e.search, e.replace) for e in edit.edits])
+    except (PatchError, OutputParserException) as e:
+        warn("Diff fix unusable, regenerating full file", model=model, error=str(e))
         return None
+    ok, reason = await asyncio.to_thread(check_fix_output, "\n".join(e.replace for e in edit.edits))
+    return CodeFixResult(corrected_code=patched, explanation=edit.explanation), ok, reason
+
+
+async def async_generate_code_fix(file_content: str, suggestion: str, filename: str,
+                                  correlation_id: str) -> tuple[CodeFixResult, bool, str]:
+    """Return (fix, ok, reason) where ok/reason come from check_fix_output(); cached per file, suggestion and model."""
+    async def _try(model: str) -> tuple[CodeFixResult, bool, str]:
+        key = fix_cache_key(file_content, suggestion, filename, model)
+        cached = await asyncio.to_thread(get_cached_fix, key)
+        if cached:
+            info("Using cached code fix", file=filename, model=model)
+            return CodeFixResult(**cached["fix"]), cached["valid"], cached["reason"]
+        inputs = {"file_content": file_content, "suggestion": suggestion, "filename": filename}
+        outcome = await _diff_fix(file_content, inputs, model) if _use_diff(file_content) else None
+        if outcome is None:
+            result = await _timed_ainvoke("fix", inputs, model)
+            ok, reason = await asyncio.to_thread(check_fix_output, result.corrected_code)
+            outcome = result, ok, reason
+        result, ok, reason = outcome
+        await asyncio.to_thread(set_cached_fix, key, result.model_dump(), ok, reason)
+        return outcome
+
+    try:
+        return await _try(PRIMARY_MODEL)
+    except Exception as e1:
+        info("Primary model failed, trying fallback", error=str(e1))
+        return await _try(FALLBACK_MODEL)
 
-    # Backup before write
+
+def generate_code_fix(file_content: str, suggestion: str, filename: str,
+                      correlation_id: str) -> tuple[CodeFixResult, bool, str]:
+    return asyncio.run(async_generate_code_fix(file_content, suggestion, filename, correlation_id))
+
+
+def _read_text(path: Path) -> str:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def _write_fix(target_file: Path, content: str, corrected_code: str) -> Path:
+    """Back up the current content, then write the fix. Returns the backup path."""
     backup_dir = Path("logs/backups")
     backup_dir.mkdir(parents=True, exist_ok=True)
     backup_path = backup_dir / f"{target_file.name}_{int(time.time())}.bak"
     with open(backup_path, "w", encoding="utf-8") as f:
         f.write(content)
-
     with open(target_file, "w", encoding="utf-8") as f:
-        f.write(fix_result.corrected_code)
+        f.write(corrected_code)
+    return backup_path
 
+
+def _commit_fix(target_file: Path, content: str, fix_result: CodeFixResult, run_id: str,
+                provider_name: str) -> Path:
+    """_write_fix() plus its fix_applied audit entry, so one is never recorded without the other."""
+    backup_path = _write_fix(target_file, content, fix_result.corrected_code)
     log_audit("fix_applied", run_id, provider_name, {
         "file": str(target_file),
         "explanation": fix_result.explanation,
         "backup": str(backup_path),
     })
+    return backup_path
+
+
+async def resolve_target(file_path: str) -> tuple[Path | None, str | None, str]:
+    """Guardrail-check, locate and read the file an analysis points at: (path, content, error)."""
+    allowed, reason = is_path_allowed(file_path, allow_restricted=ALLOW_RESTRICTED)
+    if not allowed:
+        return None, None, f"Guardrail blocked path: {reason}"
+    try:
+        target_file = await asyncio.to_thread(find_file, file_path)
+    except Exception as e:
+        return None, None, f"Could not locate file: {e}"
+    if not target_file or not target_file.exists():
+        return None, None, "Could not locate file"
+    try:
+        content = await asyncio.to_thread(_read_text, target_file)
+    except Exception as e:
+        return target_file, None, f"Error reading file: {e}"
+    return target_file, content, ""
+
+
+async def async_apply_fix(analysis: LogAnalysisResult, run_id: str, provider_name: str,
+                          correlation_id: str, dry_run: bool = False,
+                          prefetched: dict[str, asyncio.Future] | None = None) -> str | None:
+    """prefetched maps file paths to resolve_target() tasks started while the analysis streamed."""
+    pending = (prefetched or {}).get(analysis.file_path)
+    target_file, content, err = await (pending if pending is not None else resolve_target(analysis.file_path))
+    if err:
+        error(err, path=analysis.file_path)
+        return None
+    info("Located target file", path=str(target_file))
+
+    fix_result, ok, reason = await async_generate_code_fix(content, analysis.suggested_fix, analysis.file_path,
+                                                           correlation_id)
+    if not ok:
+        error("Fix rejected", reason=reason)
+        return None
+
+    if dry_run:
+        info("Dry-run: would apply fix", path=str(target_file), explanation=fix_result.explanation)
+        return fix_result.explanation
+
+    passed, pv_msg = await asyncio.to_thread(run_pre_verify, str(target_file))
+    if not passed:
+        error("Pre-verify failed", message=pv_msg)
+        return None
+
+    # Last point to give up cleanly; once the write starts it finishes with its audit entry,
+    # even if the heal deadline cancels this coroutine meanwhile.
+    check_deadline("writing the fix")
+    await asyncio.shield(asyncio.to_thread(_commit_fix, target_file, content, fix_result, run_id, provider_name))
     info("Fix applied", path=str(target_file))
     return fix_result.explanation
 
 
-def run_heal(args: argparse.Namespace) -> int:
-    setup_graceful_shutdown()
+def apply_fix_real(analysis: LogAnalysisResult, run_id: str, provider_name: str,
+                   correlation_id: str, dry_run: bool = False) -> str | None:
+    return asyncio.run(async_apply_fix(analysis, run_id, provider_name, correlation_id, dry_run))
+
+
+async def async_run_heal(args: argparse.Namespace) -> int:
+    """
+    The heal pipeline, bounded by HEAL_TIMEOUT_SECONDS end to end: every stage takes its
+    timeout from the remaining budget, and the run is cancelled if it still overruns.
+    """
+    deadline = start_deadline(HEAL_TIMEOUT_SECONDS)
+    run_id, provider_name = _run_identity(args)
+    correlation_id_var.set(f"heal-{run_id}-{int(time.time())}")
+    try:
+        async with asyncio.timeout(deadline.remaining()) as budget:
+            return await _heal_exit_code(args)
+    except TimeoutError as e:
+        if not isinstance(e, DeadlineExceeded) and not budget.expired():
+            # One call timing out with budget to spare is an ordinary failure, not an overrun.
+            error("Heal failed", error=str(e) or "call timed out")
+            return 1
+        reason = str(e) or "cancelled at deadline"
+        error("Heal deadline exceeded", budget_s=deadline.total, error=reason)
+        await asyncio.to_thread(log_audit, "heal_deadline_exceeded", run_id, provider_name,
+                                {"correlation_id": correlation_id_var.get(), "budget_s": deadline.total,
+                                 "error": reason})
+        await asyncio.to_thread(send_slack, f"Heal run {run_id} exceeded its {deadline.total:g}s deadline: {reason}",
+                                "warning")
+        if provider_name == "local":
+            await asyncio.to_thread(update_dashboard, "error", run_id, f"Deadline exceeded: {reason}",
+                                    correlation_id=correlation_id_var.get())
+        return 1
+
+
+def _run_identity(args: argparse.Namespace) -> tuple[str, str]:
+    """(run_id, provider_name) for a heal request."""
+    run_id = args.run_id or "local-simulation"
+    return run_id, "github" if args.mode == "ci" else (args.provider or "local")
+
+
+async def _heal_exit_code(args: argparse.Namespace) -> int:
+    """_heal() with sys.exit() turned into its exit code, so it cannot escape a task and stop a shared loop."""
+    try:
+        return await _heal(args)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+
+
+async def _heal(args: argparse.Namespace) -> int:
+    """
+    Blocking steps (disk, sanitization, subprocess checks) run in the default executor and
+    LLM calls use ainvoke, so many heals can interleave on one loop.
+    """
     validate_env()
 
     if getattr(args, "rollback", False):
         n = getattr(args, "rollback_n", 1)
-        ok, msg = rollback_n(n) if n > 1 else rollback_last()
+        ok, msg = await asyncio.to_thread(rollback_n, n) if n > 1 else await asyncio.to_thread(rollback_last)
         info("Rollback", success=ok, message=msg)
         return 0 if ok else 1
 
-    run_id = args.run_id or "local-simulation"
-    provider_name = "github" if args.mode == "ci" else (args.provider or "local")
-    correlation_id = f"heal-{run_id}-{int(time.time())}"
-    correlation_id_var.set(correlation_id)
+    run_id, provider_name = _run_identity(args)
+    correlation_id = correlation_id_var.get()
     dry_run = getattr(args, "dry_run", False)
 
     provider = get_provider(provider_name)
@@ -266,40 +569,93 @@ def run_heal(args: argparse.Namespace) -> int:
     context = provider.get_context()
     info("Agent starting", provider=provider_name, correlation_id=correlation_id)
 
+    def audit(event: str, details: dict):
+        return asyncio.to_thread(log_audit, event, run_id, provider_name, details)
+
+    def dashboard(status: str, *a, **kw):
+        return asyncio.to_thread(update_dashboard, status, run_id, *a, provider_context=context,
+                                 correlation_id=correlation_id, **kw)
+
+    # With streaming on, the target file is located and read as soon as the model has
+    # emitted file_path, overlapping repo I/O with the rest of the generation.
+    prefetch: dict[str, asyncio.Future] = {}
+
+    def _on_field(key: str, value) -> None:
+        if key == "file_path" and isinstance(value, str) and value not in prefetch:
+            info("Resolving target file while analysis streams", path=value)
+            prefetch[value] = asyncio.ensure_future(resolve_target(value))
+
+    on_field = _on_field if STREAMING() else None
+
     if args.logs:
         logs = args.logs
+    elif getattr(args, "logs_ref", None):
+        try:
+            logs = await asyncio.to_thread(get_blob, args.logs_ref)
+        except (OSError, ValueError) as e:
+            error("Could not load logs from blob store", ref=args.logs_ref, error=str(e))
+            return 1
     elif getattr(args, "simulate_failure", False):
         from lib.simulate import get_simulated_logs
         logs = get_simulated_logs()
     else:
-        logs = provider.fetch_logs(run_id)
+        logs = await fetch_logs_async(provider_name, run_id)
 
     check_shutdown()
+    check_deadline("analysis")
 
-    # Cache lookup (idempotency for identical logs)
-    cached = get_cached_analysis(logs)
+    # Cache lookup (idempotency for reruns of the same failure)
+    fingerprint = await asyncio.to_thread(cache_key, logs)
+    cached = await asyncio.to_thread(get_cached_analysis, logs)
     if cached:
-        info("Using cached analysis")
-        from pydantic import BaseModel
+        info("Using cached analysis", fingerprint=fingerprint)
+        await audit("analysis_cached", {"correlation_id": correlation_id, "fingerprint": fingerprint})
         analysis = LogAnalysisResult(**cached)
     else:
         if provider_name == "local":
-            update_dashboard("analyzing", run_id, logs, provider_context=context, correlation_id=correlation_id)
-        log_audit("analysis_started", run_id, provider_name, {"correlation_id": correlation_id})
+            await dashboard("analyzing", logs)
+        await audit("analysis_started", {"correlation_id": correlation_id, "fingerprint": fingerprint})
+
+        async def _analyze() -> LogAnalysisResult:
+            # Re-check: a previous leader may have cached this while we queued for the lock.
+            hit = await asyncio.to_thread(get_cached_analysis, logs)
+            if hit:
+                return LogAnalysisResult(**hit)
+            near = await asyncio.to_thread(find_similar, logs, fingerprint)
+            prior = await asyncio.to_thread(get_cached_analysis_by_key, near[0]) if near else None
+            if prior:
+                # Same failure modulo a test name or line number: reuse, but trust it a bit less.
+                prior["confidence_score"] = max(0.0, prior["confidence_score"] - NEAR_DUP_PENALTY)
+                info("Reusing near-duplicate analysis", similar_to=near[0], similarity=round(near[1], 3))
+                await audit("analysis_near_duplicate", {"correlation_id": correlation_id, "fingerprint": fingerprint,
+                                                        "similar_to": near[0], "similarity": near[1]})
+                return LogAnalysisResult(**prior)
+            if quorum_required(os.getenv("GITHUB_REPOSITORY")):
+                result = await run_with_quorum_async(
+                    lambda: async_analyze_with_gemini(logs, context, correlation_id, on_field))
+                if result is None:
+                    raise RuntimeError("Quorum not reached: no two analysis runs agreed")
+            else:
+                result = await async_analyze_with_gemini(logs, context, correlation_id, on_field)
+            await asyncio.to_thread(set_cached_analysis, logs, result.model_dump())
+            await asyncio.to_thread(add_failure, logs, fingerprint)
+            return result
 
         try:
-            analysis = analyze_with_gemini(logs, context, correlation_id)
-            set_cached_analysis(logs, analysis.model_dump())
+            # The same failure arriving many times at once (e.g. one flaky test breaking many
+            # pipelines) shares a single LLM call, in-process and across workers.
+            analysis = await run_once_async(fingerprint, _analyze, encode=lambda a: a.model_dump(),
+                                            decode=lambda d: LogAnalysisResult(**d))
             if provider_name == "local":
-                update_dashboard("review_needed", run_id, logs, analysis.model_dump(),
-                                 provider_context=context, correlation_id=correlation_id)
+                await dashboard("review_needed", logs, analysis.model_dump())
         except Exception as e:
             error("Analysis failed", error=str(e))
-            log_audit("analysis_failed", run_id, provider_name, {"error": str(e)})
-            cb = get_llm_circuit()
-            alert_heal_failures(run_id, str(e), cb.failures)
+            await audit("analysis_failed", {"error": str(e), "fingerprint": fingerprint})
+            failures = await asyncio.to_thread(
+                lambda: sum(get_llm_circuit(m).failures for m in {PRIMARY_MODEL, FALLBACK_MODEL}))
+            await asyncio.to_thread(alert_heal_failures, run_id, str(e), failures)
             if provider_name == "local":
-                update_dashboard("error", run_id, str(e), provider_context=context, correlation_id=correlation_id)
+                await dashboard("error", str(e))
             return 1
 
     check_shutdown()
@@ -307,21 +663,34 @@ def run_heal(args: argparse.Namespace) -> int:
     info("Analysis complete", root_cause=analysis.root_cause[:100], confidence=analysis.confidence_score)
 
     if analysis.confidence_score > CONFIDENCE_THRESHOLD:
-        explanation = apply_fix_real(analysis, run_id, provider_name, correlation_id, dry_run)
+        try:
+            explanation = await async_apply_fix(analysis, run_id, provider_name, correlation_id, dry_run, prefetch)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            error("Fix generation failed", error=str(e))
+            await audit("fix_failed", {"correlation_id": correlation_id, "error": str(e)})
+            if provider_name == "local":
+                await dashboard("error", str(e))
+            return 1
         if provider_name == "local":
-            update_dashboard("healed", run_id, logs, analysis.model_dump(),
-                             f"Fix Applied: {explanation}" if explanation else "", provider_context=context,
-                             correlation_id=correlation_id)
+            await dashboard("healed", logs, analysis.model_dump(),
+                            f"Fix Applied: {explanation}" if explanation else "")
     else:
         info("Confidence too low for auto-fix")
-        log_audit("needs_human_review", run_id, provider_name, {"confidence": analysis.confidence_score})
+        await audit("needs_human_review", {"confidence": analysis.confidence_score})
         if provider_name == "local":
-            update_dashboard("needs_human_review", run_id, logs, analysis.model_dump(),
-                             provider_context=context, correlation_id=correlation_id)
+            await dashboard("needs_human_review", logs, analysis.model_dump())
 
     return 0
 
 
+def run_heal(args: argparse.Namespace) -> int:
+    """Synchronous entry point (CLI): runs async_run_heal on a fresh event loop."""
+    setup_graceful_shutdown()
+    return asyncio.run(async_run_heal(args))
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="AI CI/CD Healer Agent (Powered by Gemini)",
@@ -342,6 +711,7 @@ Examples:
     parser.add_argument("--mode", choices=["ci", "local"],
                         help="ci = use github provider in CI context")
     parser.add_argument("--logs", help="Raw build logs (overrides provider fetch)")
+    parser.add_argument("--logs-ref", help="Blob store reference (sha256:...) of the build logs")
     parser.add_argument("--dry-run", action="store_true",
                         help="Analyze and propose fix but do not apply")
     parser.add_argument("--rollback", action="store_true",
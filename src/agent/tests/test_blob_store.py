@@ -0,0 +1,31 @@
+"""Tests for the content-addressed blob store (local backend)."""
+import pytest
+
+from lib import blob_store
+
+
+@pytest.fixture(autouse=True)
+def local_store(tmp_path, monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+
+
+def test_roundtrip_and_dedup():
+    ref = blob_store.put_blob("Traceback: boom\n" * 1000)
+    assert ref.startswith("sha256:")
+    assert blob_store.put_blob("Traceback: boom\n" * 1000) == ref
+    assert len(list(blob_store.BLOB_DIR.glob("*/*.gz"))) == 1
+    with blob_store.open_blob(ref) as f:
+        assert f.readline() == "Traceback: boom\n"
+
+
+def test_missing_and_malformed_refs():
+    with pytest.raises(FileNotFoundError):
+        blob_store.get_blob("sha256:" + "0" * 64)
+    with pytest.raises(ValueError):
+        blob_store.get_blob("sha256:../../etc/passwd")
+
+
+def test_prune():
+    blob_store.put_blob("old logs")
+    assert blob_store.prune_blobs(max_age_seconds=-1) == 1
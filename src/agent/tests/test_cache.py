@@ -2,12 +2,18 @@
 import os
 
 import pytest
-from lib.cache import get_cached_analysis, set_cached_analysis
+from lib import cache
+from lib.cache import (
+    LRUCache, TieredCache, fix_cache_key, get_cached_analysis, get_cached_fix, set_cached_analysis, set_cached_fix,
+)
 
 
 @pytest.fixture(autouse=True)
-def disable_cache(monkeypatch):
+def disable_cache(monkeypatch, tmp_path):
     monkeypatch.delenv("CACHE_DISABLED", raising=False)
+    # The module-level caches point at logs/; keep test entries out of the real directories.
+    monkeypatch.setattr(cache, "_analysis_cache", TieredCache(tmp_path / "cache"))
+    monkeypatch.setattr(cache, "_fix_cache", TieredCache(tmp_path / "fix_cache"))
 
 
 def test_cache_miss():
@@ -21,3 +27,53 @@ def test_cache_roundtrip():
     result = get_cached_analysis(content)
     assert result is not None
     assert result["root_cause"] == "test"
+
+
+def test_lru_evicts_least_recent():
+    lru = LRUCache(max_entries=2, ttl_seconds=60)
+    lru.set("a", {"v": 1})
+    lru.set("b", {"v": 2})
+    lru.get("a")
+    lru.set("c", {"v": 3})
+    assert lru.get("b") is None
+    assert lru.get("a") == {"v": 1}
+
+
+def test_lru_ttl_expiry():
+    lru = LRUCache(max_entries=2, ttl_seconds=-1)
+    lru.set("a", {"v": 1})
+    assert lru.get("a") is None
+
+
+def test_tiered_disk_eviction_and_expiry(tmp_path):
+    cache = TieredCache(tmp_path, ttl_seconds=60, memory_entries=1, max_entries=5, max_bytes=10**6)
+    for i in range(8):
+        cache.set(f"k{i}", {"i": i})
+    assert len(list(tmp_path.glob("*.json"))) <= 5
+    assert cache.get("k7") == {"i": 7}
+    expired = TieredCache(tmp_path, ttl_seconds=-1)
+    assert expired.get("k7") is None
+
+
+def test_tiered_warm_load(tmp_path):
+    TieredCache(tmp_path).set("k", {"root_cause": "x"})
+    fresh = TieredCache(tmp_path, warm=True)
+    assert fresh.get("k") == {"root_cause": "x"}
+    assert len(fresh.memory) == 1
+
+
+def test_fix_cache_roundtrip_keeps_validation():
+    key = fix_cache_key("print('hi')\n", "add a newline", "app.py", "model-a")
+    set_cached_fix(key, {"corrected_code": "print('hi')\n\n", "explanation": "x"}, False, "too short")
+    hit = get_cached_fix(key)
+    assert hit["fix"]["explanation"] == "x"
+    assert hit["valid"] is False and hit["reason"] == "too short"
+
+
+def test_fix_cache_key_covers_every_input():
+    base = fix_cache_key("content", "suggestion", "a.py", "m")
+    assert base == fix_cache_key("content", "suggestion", "a.py", "m")
+    assert base != fix_cache_key("content2", "suggestion", "a.py", "m")
+    assert base != fix_cache_key("content", "suggestion2", "a.py", "m")
+    assert base != fix_cache_key("content", "suggestion", "b.py", "m")
+    assert base != fix_cache_key("content", "suggestion", "a.py", "m2")
@@ -4,7 +4,7 @@ from unittest.mock import patch, MagicMock
 
 
 @patch.dict("os.environ", {"GOOGLE_API_KEY": "x", "CACHE_DISABLED": "1"})
-@patch("main.analyze_with_gemini")
+@patch("main.async_analyze_with_gemini")
 def test_chaos_llm_failure_recovery(mock_analyze):
     """When LLM fails, agent should exit with error."""
     mock_analyze.side_effect = RuntimeError("API rate limit")
@@ -0,0 +1,152 @@
+"""Tests for the per-model sliding-window circuit breaker."""
+import asyncio
+import time
+
+import pytest
+
+from lib import circuit_breaker
+from lib.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "get_redis", lambda: None)
+    monkeypatch.setattr(circuit_breaker, "_circuits", {})  # keep opened breakers out of other tests
+
+
+def _fail():
+    raise ValueError("llm down")
+
+
+def _breaker(**kw):
+    opts = {"window": 60, "min_calls": 4, "failure_rate": 0.5, "reset_timeout": 0.05, "half_open_probes": 2}
+    opts.update(kw)
+    return CircuitBreaker("test-model", **opts)
+
+
+def test_opens_on_failure_rate_not_single_failures():
+    cb = _breaker()
+    for fn in (lambda: 1, _fail, lambda: 1):
+        try:
+            cb.execute(fn)
+        except ValueError:
+            pass
+    assert cb.state == "closed"  # below min_calls
+    with pytest.raises(ValueError):
+        cb.execute(_fail)
+    assert cb.state == "open"  # 2 of 4 failed
+    with pytest.raises(CircuitOpenError):
+        cb.execute(lambda: 1)
+
+
+def test_opens_on_slow_calls():
+    cb = _breaker(slow_call_seconds=0.01, slow_call_rate=0.75)
+    for _ in range(4):
+        cb.execute(lambda: time.sleep(0.015))
+    assert cb.is_open
+
+
+def test_half_open_probes_close_or_reopen():
+    cb = _breaker(min_calls=1)
+    with pytest.raises(ValueError):
+        cb.execute(_fail)
+    time.sleep(0.06)
+    assert cb.state == "half_open"
+    assert cb.allow() == "probe" and cb.allow() == "probe"
+    with pytest.raises(CircuitOpenError):
+        cb.allow()  # probe slots taken
+    cb.record(True, probe=True)
+    cb.record(False, probe=True)
+    assert cb.state == "open"
+    time.sleep(0.06)
+    cb.execute(lambda: 1)
+    cb.execute(lambda: 1)
+    assert cb.state == "closed"
+
+
+def test_cancelled_probe_frees_its_slot():
+    cb = _breaker(min_calls=1, half_open_probes=1)
+    with pytest.raises(ValueError):
+        cb.execute(_fail)
+    time.sleep(0.06)
+
+    async def run():
+        task = asyncio.ensure_future(cb.execute_async(lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert cb.allow() == "probe"
+
+
+def test_deadline_exceeded_is_not_a_model_failure():
+    from lib.deadline import DeadlineExceeded
+
+    def _out_of_time():
+        raise DeadlineExceeded("Heal deadline exceeded before retry")
+
+    cb = _breaker(min_calls=1)
+    with pytest.raises(DeadlineExceeded):
+        cb.execute(_out_of_time)
+    assert cb.state == "closed" and cb.failures == 0
+
+
+def test_async_state_updates_run_off_the_event_loop(monkeypatch):
+    import threading
+
+    cb = _breaker()
+    threads = []
+    update = cb._update
+
+    def tracking_update(fn):
+        threads.append(threading.current_thread())
+        return update(fn)
+
+    monkeypatch.setattr(cb, "_update", tracking_update)
+
+    async def ok():
+        return "ok"
+
+    assert asyncio.run(cb.execute_async(ok)) == "ok"
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+
+def test_breakers_are_per_model():
+    primary, fallback = circuit_breaker.get_llm_circuit("cb-primary"), circuit_breaker.get_llm_circuit("cb-fallback")
+    assert circuit_breaker.get_llm_circuit("cb-primary") is primary
+    for _ in range(primary.min_calls):
+        with pytest.raises(ValueError):
+            primary.execute(_fail)
+    assert primary.is_open
+    assert fallback.execute(lambda: "ok") == "ok"
+
+
+def test_state_is_shared_through_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(circuit_breaker, "get_redis", lambda: server)
+    replica_a, replica_b = _breaker(min_calls=2, reset_timeout=60), _breaker(min_calls=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            replica_a.execute(_fail)
+    assert replica_b.is_open
+    with pytest.raises(CircuitOpenError):
+        replica_b.execute(lambda: 1)
+
+
+def test_any_circuit_open_does_no_io(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(circuit_breaker, "get_redis", lambda: server)
+    cb = circuit_breaker.get_llm_circuit("cb-seen")
+    assert circuit_breaker.any_circuit_open() is False
+    for _ in range(cb.min_calls):
+        with pytest.raises(ValueError):
+            cb.execute(_fail)
+
+    def no_redis():
+        raise AssertionError("any_circuit_open() touched Redis")
+
+    monkeypatch.setattr(circuit_breaker, "get_redis", no_redis)
+    assert circuit_breaker.any_circuit_open() is True
@@ -0,0 +1,60 @@
+"""Tests for log compaction."""
+from lib.compact import compact_lines, compact_logs
+
+
+def _compact(lines):
+    return list(compact_lines(lines))
+
+
+def test_identical_runs_collapse():
+    assert _compact(["start"] + ["retrying..."] * 412 + ["done"]) == [
+        "start", "retrying...", "[previous line repeated 411 times]", "done"]
+
+
+def test_ansi_and_timestamps_are_stripped():
+    assert _compact(["2024-05-01T12:00:00.1234567Z \x1b[31mError: boom\x1b[0m", "[12:00:01] ok"]) == ["Error: boom", "ok"]
+
+
+def test_progress_bars_keep_final_state():
+    lines = [f"Downloading model.bin {i}% |{'#' * (i // 10)}" for i in range(0, 101, 5)]
+    lines.append("Receiving objects:  50% (5/10)\rReceiving objects: 100% (10/10), done.")
+    assert _compact(lines) == ["Receiving objects: 100% (10/10), done."]
+
+
+def test_similar_lines_keep_ends_but_errors_stay_distinct():
+    fetched = [f"Fetched chunk {i}/400" for i in range(400)]
+    assert _compact(fetched) == ["Fetched chunk 0/400", "[... 398 similar lines ...]", "Fetched chunk 399/400"]
+    errors = [f"src/app.py:{i}: error: undefined name" for i in (3, 9, 27)]
+    assert _compact(errors) == errors
+
+
+def test_repeated_warnings_are_dropped_once_seen():
+    out = _compact(["npm WARN deprecated a@1", "step 1", "npm WARN deprecated a@1", "Error: x"])
+    assert out == ["npm WARN deprecated a@1", "step 1", "Error: x", "[1 repeated warning lines removed]"]
+
+
+def test_compact_logs_shrinks_noisy_log():
+    logs = "\n".join(["2024-05-01T12:00:00Z install"] * 500 + ["Error: Cannot find module 'x'"])
+    out = compact_logs(logs)
+    assert "Error: Cannot find module 'x'" in out
+    assert len(out) < len(logs) / 20
+
+
+def test_pytest_verbose_failures_survive_progress_squashing():
+    lines = [
+        "tests/test_a.py::test_one PASSED [ 20%]",
+        "tests/test_a.py::test_two FAILED [ 40%]",
+        "tests/test_a.py::test_three PASSED [ 60%]",
+        "tests/test_a.py::test_four PASSED [ 80%]",
+        "tests/test_a.py::test_five PASSED [100%]",
+    ]
+    out = _compact(lines)
+    assert "tests/test_a.py::test_two FAILED [ 40%]" in out
+    assert out[-1] == "tests/test_a.py::test_five PASSED [100%]"
+
+
+def test_npm_error_with_percentage_is_kept():
+    lines = ["Downloading left-pad 20%", "Downloading left-pad 60%",
+             "npm ERR! code E404 fetching left-pad failed at 100%", "Downloading right-pad 100%"]
+    out = _compact(lines)
+    assert "npm ERR! code E404 fetching left-pad failed at 100%" in out
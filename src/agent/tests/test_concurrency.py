@@ -0,0 +1,49 @@
+"""Tests for the adaptive concurrency limiter."""
+from lib.concurrency import AdaptiveLimiter
+from lib.metrics import get_gauge
+
+
+def _saturate(limiter):
+    while limiter.acquire(timeout=0):
+        pass
+
+
+def test_grows_when_saturated_with_backlog():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=4)
+    limiter.set_backlog(10)
+    _saturate(limiter)
+    limiter.record(1.0)
+    assert int(limiter.limit) == 3
+    assert limiter.available() == 1
+    assert get_gauge("heal_worker_concurrency_limit") == 3
+
+
+def test_no_growth_without_backlog():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=4)
+    _saturate(limiter)
+    limiter.record(1.0)
+    assert int(limiter.limit) == 2
+
+
+def test_throttling_backs_off_to_floor():
+    limiter = AdaptiveLimiter(initial=8, min_limit=2, max_limit=8)
+    for _ in range(10):
+        limiter.record(1.0, ok=False, throttled=True)
+    assert limiter.limit == 2
+
+
+def test_latency_spike_shrinks_limit():
+    limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=8)
+    for _ in range(5):
+        limiter.record(1.0)
+    for _ in range(5):
+        limiter.record(10.0)
+    assert limiter.limit < 8
+
+
+def test_acquire_times_out_at_limit():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1)
+    assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+    limiter.release()
+    assert limiter.acquire(timeout=0)
@@ -0,0 +1,77 @@
+"""Tests for the end-to-end heal deadline."""
+import asyncio
+import contextvars
+import time
+
+import pytest
+
+from lib import deadline as dl
+from lib.llm_utils import with_retry, with_retry_async
+from lib.rate_limit import RateLimitTimeout, acquire
+
+
+def _in_deadline(seconds, fn):
+    """Run fn in a fresh context with a deadline seconds from now."""
+    def run():
+        dl.start_deadline(seconds)
+        return fn()
+    return contextvars.copy_context().run(run)
+
+
+def test_stage_timeout_is_capped_by_remaining_budget():
+    assert dl.stage_timeout(30, "x") == 30  # no deadline set
+    assert _in_deadline(2, lambda: dl.stage_timeout(30, "x")) <= 2
+    assert _in_deadline(60, lambda: dl.stage_timeout(5, "x")) == 5
+
+
+def test_exhausted_budget_fails_fast_unless_minimum_given():
+    def late():
+        time.sleep(0.02)
+        assert dl.stage_timeout(5, "alert", minimum=1.0) == 1.0
+        return dl.stage_timeout(5, "fetch")
+    with pytest.raises(dl.DeadlineExceeded):
+        _in_deadline(0.01, late)
+
+
+def test_inner_deadline_never_extends_outer():
+    def nested():
+        outer = dl.deadline_var.get()
+        assert dl.start_deadline(100) is outer
+        return dl.remaining()
+    assert _in_deadline(1, nested) <= 1
+
+
+def test_retry_honours_retry_after_and_gives_up_when_it_would_overrun():
+    class Throttled(Exception):
+        retry_after = 0.05
+
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise Throttled()
+        return "ok"
+
+    assert with_retry(flaky, delay=0.001) == "ok"
+    assert calls[1] - calls[0] >= 0.05
+
+    class SlowDown(Exception):
+        retry_after = 30
+
+    async def always():
+        raise SlowDown()
+
+    start = time.monotonic()
+    with pytest.raises(SlowDown):
+        _in_deadline(5, lambda: asyncio.run(with_retry_async(always)))
+    assert time.monotonic() - start < 1  # did not sleep 30s past a 5s budget
+
+
+def test_rate_limit_wait_is_bounded_by_deadline(monkeypatch):
+    import lib.rate_limit as rl
+    monkeypatch.setattr(rl, "_take", lambda model, tokens: 10.0)
+    start = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        _in_deadline(2, lambda: acquire("m", 1, timeout=60))
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,57 @@
+"""Tests for failure fingerprinting."""
+import sys
+
+from lib.fingerprint import failure_fingerprint, normalize_log
+
+RUN_1 = """\x1b[32m2024-05-01T10:00:01.123Z\x1b[0m Runner: fv-az123-456 run 8812345
+Downloading deps... done in 12.3s
+/tmp/tmp.aB3dE/build/test.js:42
+\x1b[31mError: Environment variable 'FIX_APPLIED' is missing.\x1b[0m
+    at check (/home/runner/work/app/app/src/test.js:42:11)
+npm ERR! Test failed. commit 3f9a2c1d
+"""
+
+RUN_2 = """2024-06-17T23:59:59Z Runner: fv-az999-001 run 9900001
+Downloading deps... done in 4.1s
+/tmp/tmp.Zz9yY/build/test.js:42
+Error: Environment variable 'FIX_APPLIED' is missing.
+    at check (/home/runner/work/app/app/src/test.js:42:11)
+npm ERR! Test failed. commit 77b0e4aa
+"""
+
+
+def test_reruns_share_fingerprint():
+    assert failure_fingerprint(RUN_1) == failure_fingerprint(RUN_2)
+
+
+def test_different_failures_differ():
+    other = RUN_2.replace("FIX_APPLIED", "DATABASE_URL")
+    assert failure_fingerprint(RUN_1) != failure_fingerprint(other)
+
+
+def test_normalize_keeps_failure_lines_only():
+    text = normalize_log("\n".join(f"step {i} ok" for i in range(50)) + "\nFATAL: disk full\n")
+    assert "FATAL: disk full" in text
+    assert "step 10 ok" not in text
+
+
+def test_no_markers_falls_back_to_tail():
+    assert normalize_log("a\nb\nc") == "a\nb\nc"
+
+
+def test_memoize_by_digest_does_not_keep_the_input():
+    from lib.fingerprint import memoize_by_digest
+
+    calls = []
+
+    @memoize_by_digest(maxsize=2)
+    def length(text):
+        calls.append(text)
+        return len(text)
+
+    big = "x" * 100_000
+    refs = sys.getrefcount(big)
+    assert length(big) == length("x" * 100_000) == 100_000
+    assert len(calls) == 1
+    calls.clear()
+    assert sys.getrefcount(big) == refs  # the cache holds a digest, not the string
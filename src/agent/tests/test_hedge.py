@@ -0,0 +1,54 @@
+"""Tests for hedged LLM requests."""
+import asyncio
+
+import pytest
+from lib import hedge
+
+
+async def _answer(value, delay, fail=False):
+    await asyncio.sleep(delay)
+    if fail:
+        raise RuntimeError(value)
+    return value
+
+
+def _race(primary, fallback):
+    return asyncio.run(hedge.hedged(primary, fallback, "p-model", "f-model"))
+
+
+def test_fast_primary_is_not_hedged(monkeypatch):
+    monkeypatch.setattr(hedge, "HEDGE_AFTER_SECONDS", 0.2)
+    before = hedge.hedge_stats("p-model")["hedged"]
+    assert _race(lambda: _answer("p", 0.01), lambda: _answer("f", 0)) == "p"
+    assert hedge.hedge_stats("p-model")["hedged"] == before
+
+
+def test_slow_primary_loses_to_fallback(monkeypatch):
+    monkeypatch.setattr(hedge, "HEDGE_AFTER_SECONDS", 0.05)
+    cancelled = []
+
+    async def slow():
+        try:
+            return await _answer("p", 5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    wins = hedge.hedge_stats("f-model")["wins"]
+    assert _race(slow, lambda: _answer("f", 0.01)) == "f"
+    assert cancelled == [True]
+    assert hedge.hedge_stats("f-model")["wins"] == wins + 1
+
+
+def test_failed_hedge_waits_for_primary(monkeypatch):
+    monkeypatch.setattr(hedge, "HEDGE_AFTER_SECONDS", 0.05)
+    assert _race(lambda: _answer("p", 0.2), lambda: _answer("f", 0.01, fail=True)) == "p"
+    with pytest.raises(RuntimeError):
+        _race(lambda: _answer("p", 0.1, fail=True), lambda: _answer("f", 0.01, fail=True))
+
+
+def test_delay_follows_observed_p95(monkeypatch):
+    monkeypatch.setattr(hedge, "HEDGE_AFTER_SECONDS", 0)
+    for i in range(100):
+        hedge.record_latency("p95-model", (i + 1) / 100)
+    assert hedge.hedge_delay("p95-model") == pytest.approx(0.95)
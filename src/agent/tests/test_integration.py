@@ -8,7 +8,7 @@ pytest.importorskip("langchain")
 
 
 @patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1"})
-@patch("main.analyze_with_gemini")
+@patch("main.async_analyze_with_gemini")
 def test_heal_flow_dry_run(mock_analyze):
     """Test full flow in dry-run mode with mocked LLM."""
     from main import run_heal, LogAnalysisResult
@@ -34,3 +34,140 @@ def test_heal_flow_dry_run(mock_analyze):
     code = run_heal(args)
     assert code == 0
     mock_analyze.assert_called_once()
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"})
+def test_chains_are_built_once_and_rebuilt_on_reload():
+    import main
+    main.reload_llm_config()
+    chain = main.get_chain("fix", "gemini-2.0-flash")
+    assert main.get_chain("fix", "gemini-2.0-flash") is chain
+    assert main.get_chain("analysis", "gemini-2.0-flash") is not chain
+    main.reload_llm_config()
+    assert main.get_chain("fix", "gemini-2.0-flash") is not chain
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1", "SKIP_PRE_VERIFY": "1"})
+def test_async_heals_interleave_on_one_loop():
+    import argparse
+    import asyncio
+    import time
+    import main
+
+    class SlowChain:
+        async def ainvoke(self, inputs, config=None):
+            await asyncio.sleep(0.3)
+            return main.LogAnalysisResult(root_cause="r", suggested_fix="f", file_path="x", confidence_score=0.1)
+
+    def args(i):
+        return argparse.Namespace(run_id=f"async-{i}", provider="github", mode=None, logs=f"Error: failure number {i}\n" * 3,
+                                  dry_run=True, rollback=False, rollback_n=1, simulate_failure=False)
+
+    async def heal_many():
+        return await asyncio.gather(*(main.async_run_heal(args(i)) for i in range(10)))
+
+    with patch("main.get_chain", return_value=SlowChain()):
+        start = time.monotonic()
+        codes = asyncio.run(heal_many())
+    assert codes == [0] * 10
+    assert time.monotonic() - start < 2.0  # 10 x 0.3s sequentially would be 3s
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1", "FEATURE_STREAMING": "1"})
+def test_streamed_analysis_resolves_target_before_answer_completes():
+    import asyncio
+    import json
+    import main
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+    answer = json.dumps({"root_cause": "r", "file_path": "Dockerfile", "suggested_fix": "f", "confidence_score": 0.5})
+    fake = GenericFakeChatModel(messages=iter([answer]))
+    order = []
+
+    def on_field(key, value):
+        order.append(key)
+
+    with patch("main.get_llm", return_value=fake):
+        result = asyncio.run(main.async_analyze_with_gemini("Error: boom", "", "c", on_field))
+    assert result.file_path == "Dockerfile"
+    assert order.index("file_path") < order.index("confidence_score")
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1"})
+def test_diff_fix_applies_edits_and_falls_back_to_full_file():
+    import json
+    import main
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+    content = "FROM python:3.11\nRUN pip install -r requirements.txt\nCMD [\"python\", \"app.py\"]\n"
+    edit = json.dumps({"edits": [{"search": "FROM python:3.11\n", "replace": "FROM python:3.11\nENV FIX_APPLIED=true\n"}],
+                       "explanation": "set env"})
+    main.get_chain.cache_clear()  # chains capture the (patched) client when built
+    with patch("main.FIX_OUTPUT_MODE", "diff"), patch("main.get_llm", return_value=GenericFakeChatModel(messages=iter([edit]))):
+        fix, ok, _ = main.generate_code_fix(content, "set FIX_APPLIED", "Dockerfile", "c")
+    assert ok and fix.corrected_code == content.replace("3.11\n", "3.11\nENV FIX_APPLIED=true\n", 1)
+
+    bad_edit = json.dumps({"edits": [{"search": "FROM node:20\n", "replace": "x"}], "explanation": "wrong"})
+    full = json.dumps({"corrected_code": "FROM python:3.12\n", "explanation": "full"})
+    fake = GenericFakeChatModel(messages=iter([bad_edit, full]))
+    main.get_chain.cache_clear()
+    with patch("main.FIX_OUTPUT_MODE", "diff"), patch("main.get_llm", return_value=fake):
+        fix, ok, _ = main.generate_code_fix(content, "bump python", "Dockerfile", "c")
+    main.get_chain.cache_clear()
+    assert fix.explanation == "full" and fix.corrected_code == "FROM python:3.12\n"
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1"})
+def test_heal_is_bounded_by_deadline():
+    import argparse
+    import asyncio
+    import time
+    import main
+
+    class HungChain:
+        async def ainvoke(self, inputs, config=None):
+            await asyncio.sleep(30)
+
+    args = argparse.Namespace(run_id="deadline", provider="github", mode=None, logs="Error: hung model\n",
+                              dry_run=True, rollback=False, rollback_n=1, simulate_failure=False)
+    with patch("main.get_chain", return_value=HungChain()), patch("main.HEAL_TIMEOUT_SECONDS", 0.5), \
+            patch("main.log_audit") as audit:
+        start = time.monotonic()
+        assert asyncio.run(main.async_run_heal(args)) == 1
+    assert time.monotonic() - start < 2.0
+    assert [c.args[0] for c in audit.call_args_list][-1] == "heal_deadline_exceeded"
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1"})
+def test_heal_returns_1_when_fix_generation_fails():
+    import argparse
+    import asyncio
+    import main
+    from unittest.mock import AsyncMock
+
+    analysis = main.LogAnalysisResult(root_cause="boom", suggested_fix="fix it", file_path="Dockerfile",
+                                      confidence_score=0.99)
+    args = argparse.Namespace(run_id="fixfail", provider="github", mode=None, logs="Error: fix fails\n",
+                              dry_run=True, rollback=False, rollback_n=1, simulate_failure=False)
+    with patch("main.async_analyze_with_gemini", AsyncMock(return_value=analysis)), \
+            patch("main.quorum_required", return_value=False), \
+            patch("main.async_apply_fix", AsyncMock(side_effect=RuntimeError("both models 500"))), \
+            patch("main.log_audit") as audit:
+        assert asyncio.run(main.async_run_heal(args)) == 1
+    assert [c.args[0] for c in audit.call_args_list][-1] == "fix_failed"
+
+
+@patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key", "CACHE_DISABLED": "1"})
+def test_call_timeout_within_budget_is_not_a_deadline_overrun():
+    import argparse
+    import asyncio
+    import main
+    from unittest.mock import AsyncMock
+
+    args = argparse.Namespace(run_id="slowfetch", provider="github", mode=None, logs=None, logs_ref=None,
+                              dry_run=True, rollback=False, rollback_n=1, simulate_failure=False)
+    with patch("main.fetch_logs_async", AsyncMock(side_effect=TimeoutError("read timed out"))), \
+            patch("main.log_audit") as audit, patch("main.send_slack") as slack:
+        assert asyncio.run(main.async_run_heal(args)) == 1
+    assert "heal_deadline_exceeded" not in [c.args[0] for c in audit.call_args_list]
+    slack.assert_not_called()
@@ -15,6 +15,12 @@ def test_truncate_logs_long():
     assert "[TRUNCATED" in out
 
 
+def test_truncate_logs_stays_within_small_budgets():
+    logs = "x" * 1000
+    for max_chars in range(0, 300):
+        assert len(truncate_logs_smart(logs, max_chars=max_chars)) <= max_chars
+
+
 def test_extract_error_region():
     logs = "a" * 500 + "error: something went wrong" + "b" * 500
     region = extract_error_region(logs, window=100)
@@ -0,0 +1,39 @@
+"""Tests for relevance-ranked log chunk selection."""
+from hypothesis import given, settings, strategies as st
+
+from lib.log_select import select_log_chunks
+
+
+def _noise(n, tag="step"):
+    return "".join(f"[{tag}] compiling module_{i}.ts ok\n" for i in range(n))
+
+
+def test_short_logs_unchanged():
+    assert select_log_chunks("all good\n", 1000) == "all good\n"
+
+
+def test_error_in_the_middle_is_kept():
+    logs = _noise(3000, "a") + "TypeError: x is undefined\n    at run (src/app.ts:10:3)\n" + _noise(3000, "b")
+    out = select_log_chunks(logs, 8000)
+    assert len(out) <= 8000
+    assert "TypeError: x is undefined" in out
+    assert "lines omitted" in out
+
+
+def test_step_failure_beats_repeated_errors():
+    spam = "warning: error budget nearly spent\n" * 2000
+    logs = spam + _noise(2000) + "##[error]Process completed with exit code 2.\n" + _noise(2000) + spam
+    out = select_log_chunks(logs, 4000)
+    assert "exit code 2" in out
+
+
+def test_output_keeps_log_order():
+    logs = _noise(2000, "a") + "FATAL first\n" + _noise(2000, "b") + "FATAL second\n" + _noise(2000, "c")
+    out = select_log_chunks(logs, 10000)
+    assert out.index("FATAL first") < out.index("FATAL second")
+
+
+@settings(max_examples=50, deadline=None)
+@given(st.text(alphabet="abc error\n", min_size=0, max_size=20000), st.integers(min_value=0, max_value=5000))
+def test_never_exceeds_budget(logs, max_chars):
+    assert len(select_log_chunks(logs, max_chars)) <= max_chars
@@ -0,0 +1,26 @@
+"""Tests for the in-process metrics registry and the health server binding."""
+from lib import metrics
+
+
+def test_labelled_series_share_one_metric(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", {})
+    metrics.set_gauge("heal_test_state", 1, "State per model", labels={"model": "gemini-2.0-flash"})
+    metrics.set_gauge("heal_test_state", 0, labels={"model": 'odd"name'})
+    metrics.set_counter("heal_test_runs_total", 3, "Runs")
+    out = metrics.render_prometheus()
+    assert out.count("# TYPE heal_test_state gauge") == 1
+    assert 'heal_test_state{model="gemini-2.0-flash"} 1' in out
+    assert 'heal_test_state{model="odd\\"name"} 0' in out
+    assert "# TYPE heal_test_runs_total counter\nheal_test_runs_total 3" in out
+    assert metrics.get_gauge("heal_test_state", {"model": "gemini-2.0-flash"}) == 1
+
+
+def test_background_server_binds_loopback_by_default():
+    from health_server import serve_in_background
+
+    httpd = serve_in_background(0)
+    try:
+        assert httpd.server_address[0] == "127.0.0.1"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,40 @@
+"""Tests for applying LLM search/replace edits."""
+import pytest
+from lib.patching import PatchError, apply_edits
+
+SOURCE = """def load(path):
+    with open(path) as f:
+        data = f.read()
+    return data
+
+
+def save(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+"""
+
+
+def test_exact_edit():
+    out = apply_edits(SOURCE, [("        data = f.read()\n", "        data = f.read().strip()\n")])
+    assert "f.read().strip()" in out
+    assert out.count("\n") == SOURCE.count("\n")
+
+
+def test_whitespace_insensitive_match_keeps_file_indentation():
+    out = apply_edits(SOURCE, [("with open(path) as f:\n    data = f.read()", "with open(path, encoding='utf-8') as f:\n    data = f.read()")])
+    assert "    with open(path, encoding='utf-8') as f:\n        data = f.read()\n" in out
+
+
+def test_fuzzy_match_tolerates_small_drift():
+    edit = ('def save(path, data):\n    with open(path, "wb") as f:\n        f.write(data)', 'def save(path, data):\n    with open(path, "w", encoding="utf-8") as f:\n        f.write(data)')
+    out = apply_edits(SOURCE, [edit])
+    assert 'encoding="utf-8"' in out and 'open(path, "w") as f' not in out
+
+
+def test_ambiguous_missing_and_noop_edits_fail():
+    with pytest.raises(PatchError):
+        apply_edits(SOURCE, [("    with open(", "    with  open(")])  # two exact matches
+    with pytest.raises(PatchError):
+        apply_edits(SOURCE, [("import yaml", "import json")])
+    with pytest.raises(PatchError):
+        apply_edits(SOURCE, [("return data", "return data")])
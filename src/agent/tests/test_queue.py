@@ -0,0 +1,208 @@
+"""Tests for the heal job queue (file backend)."""
+import threading
+import time
+
+import pytest
+
+from lib import blob_store, fswatch, queue
+
+
+@pytest.fixture(autouse=True)
+def file_queue(tmp_path, monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(queue, "QUEUE_DIR", tmp_path / "queue")
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+
+
+def test_dequeue_empty():
+    assert queue.dequeue() is None
+    assert queue.queue_depth() == 0
+
+
+def test_fifo_within_priority():
+    ids = [queue.enqueue("local", f"run-{i}") for i in range(3)]
+    assert queue.queue_depth() == 3
+    assert [queue.dequeue()["id"] for _ in range(3)] == ids
+    assert queue.dequeue() is None
+
+
+def test_higher_priority_first():
+    low = queue.enqueue("github", "pr-1", priority=0)
+    high = queue.enqueue("github", "main-1", priority=queue.priority_for_branch("refs/heads/main"))
+    assert queue.dequeue()["id"] == high
+    assert queue.dequeue()["id"] == low
+
+
+def test_priority_for_branch():
+    assert queue.priority_for_branch("main") > queue.priority_for_branch("feature/x")
+    assert queue.priority_for_branch(None) == queue.PRIORITY_DEFAULT
+
+
+def test_segments_roll_over_and_are_deleted(monkeypatch):
+    monkeypatch.setattr(queue, "SEGMENT_MAX_BYTES", 1)
+    ids = [queue.enqueue("local", f"run-{i}") for i in range(5)]
+    log_dir = queue.QUEUE_DIR / "p0"
+    assert len(list(log_dir.glob("*.seg"))) == 5
+    assert [queue.dequeue()["id"] for _ in range(3)] == ids[:3]
+    assert len(list(log_dir.glob("*.seg"))) == 2
+    assert queue.queue_depth() == 2
+    assert [queue.dequeue()["id"] for _ in range(2)] == ids[3:]
+    assert list(log_dir.glob("*.seg")) == []
+    assert queue.dequeue() is None
+
+
+def test_enqueue_leaves_the_cursor_alone(monkeypatch):
+    monkeypatch.setattr(queue, "SEGMENT_MAX_BYTES", 1)
+    ids = [queue.enqueue("local", f"run-{i}") for i in range(3)]
+    log_dir = queue.QUEUE_DIR / "p0"
+    assert not (log_dir / "cursor.json").exists()
+    assert queue.queue_depth() == 3
+    assert queue.dequeue()["id"] == ids[0]
+    cursor = (log_dir / "cursor.json").stat().st_mtime_ns
+    ids.append(queue.enqueue("local", "run-3"))
+    assert (log_dir / "cursor.json").stat().st_mtime_ns == cursor
+    assert [queue.dequeue()["id"] for _ in range(3)] == ids[1:]
+
+
+def test_queue_depth_counts_incrementally():
+    for i in range(3):
+        queue.enqueue("local", f"run-{i}")
+    assert queue.queue_depth() == 3
+    queue.dequeue()
+    assert queue.queue_depth() == 2
+    queue.enqueue("local", "run-3")
+    queue.enqueue("local", "run-4")
+    assert queue.queue_depth() == 4
+    seg = queue._segment_path(queue.QUEUE_DIR / "p0", 0)
+    assert queue._tallies[seg][1] == seg.stat().st_size  # next count starts where this one ended
+    while queue.dequeue():
+        pass
+    assert queue.queue_depth() == 0
+    queue.enqueue("local", "run-5")  # drained log continues in a fresh segment
+    assert queue.queue_depth() == 1
+    assert seg not in queue._tallies
+
+
+def test_claim_batch_and_ack():
+    ids = [queue.enqueue("local", f"run-{i}") for i in range(3)]
+    jobs = queue.claim(2)
+    assert [j["id"] for j in jobs] == ids[:2]
+    assert queue.queue_depth() == 1
+    assert queue.ack(ids[0]) is True
+    assert queue.ack(ids[0]) is False
+
+
+def test_nack_requeues():
+    job_id = queue.enqueue("local", "run-1", priority=5)
+    assert queue.claim(1)[0]["id"] == job_id
+    assert queue.claim(1) == []
+    assert queue.nack(job_id) is True
+    assert queue.claim(1)[0]["id"] == job_id
+
+
+def test_nack_dead_letters_after_max_attempts(monkeypatch):
+    import json
+
+    monkeypatch.setattr(queue, "MAX_ATTEMPTS", 2)
+    job_id = queue.enqueue("local", "run-1")
+    queue.claim(1)
+    assert queue.nack(job_id) is True
+    job = queue.claim(1)[0]
+    assert job["attempts"] == 1
+    assert queue.nack(job_id) is True
+    assert queue.claim(1) == []
+    dead = [json.loads(line) for line in (queue.QUEUE_DIR / queue.DEAD_FILE).read_text().splitlines()]
+    assert [(j["id"], j["attempts"]) for j in dead] == [(job_id, 2)]
+
+
+def test_redis_nack_dead_letters_after_max_attempts(monkeypatch):
+    import json
+
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(queue, "get_redis", lambda: r)
+    monkeypatch.setattr(queue, "_legacy_redis_drained", True)
+    monkeypatch.setattr(queue, "MAX_ATTEMPTS", 2)
+    job_id = queue.enqueue("local", "run-1", priority=3)
+    queue.claim(1)
+    assert queue.nack(job_id) is True
+    job = queue.claim(1)[0]
+    assert (job["id"], job["attempts"], job["priority"]) == (job_id, 1, 3)
+    assert queue.nack(job_id) is True
+    assert queue.claim(1) == []
+    assert json.loads(r.lindex(queue.REDIS_DEAD_KEY, 0))["id"] == job_id
+    assert queue.nack(job_id) is False
+
+
+def test_expired_lease_is_reaped():
+    job_id = queue.enqueue("local", "run-1")
+    assert queue.claim(1, lease_seconds=-1)[0]["id"] == job_id
+    assert queue.reap_expired() == 1
+    assert queue.ack(job_id) is False
+    assert queue.claim(1)[0]["id"] == job_id
+
+
+def test_logs_travel_by_reference():
+    logs = "npm ERR! " + "x" * 100_000
+    queue.enqueue("local", "run-1", logs=logs)
+    job = queue.dequeue()
+    assert "logs" not in job
+    assert blob_store.get_blob(job["logs_ref"]) == logs
+
+
+def test_queue_age():
+    assert queue.queue_age() == 0.0
+    queue.enqueue("local", "run-1")
+    assert 0.0 <= queue.queue_age() < 5.0
+
+
+@pytest.mark.skipif(not fswatch.HAS_INOTIFY, reason="inotify not available")
+def test_enqueue_wakes_waiter():
+    queue.wait_for_jobs(0)  # arm the watcher
+    threading.Timer(0.05, lambda: queue.enqueue("local", "run-1")).start()
+    start = time.monotonic()
+    assert queue.wait_for_jobs(5) is True
+    assert time.monotonic() - start < 2
+
+
+def test_legacy_redis_list_is_drained(monkeypatch):
+    import json
+
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(queue, "get_redis", lambda: r)
+    monkeypatch.setattr(queue, "_legacy_redis_drained", False)
+    old = [{"id": f"{i:08d}-0000-0000-0000-000000000000", "provider": "local", "run_id": f"old-{i}",
+            "logs": "boom", "priority": i, "ts": 1000.0 + i} for i in range(2)]
+    for job in old:
+        r.lpush(queue.REDIS_LEGACY_KEY, json.dumps(job))
+    new_id = queue.enqueue("local", "new", priority=5)
+    jobs = queue.claim(3)
+    assert [j["id"] for j in jobs] == [new_id, old[1]["id"], old[0]["id"]]
+    assert jobs[1]["logs"] == "boom"
+    assert r.llen(queue.REDIS_LEGACY_KEY) == 0
+
+
+def test_legacy_job_files_are_drained():
+    import json
+
+    queue.QUEUE_DIR.mkdir(parents=True)
+    for i in range(2):
+        job = {"id": f"old-{i}", "provider": "local", "run_id": f"old-{i}", "logs": "boom", "priority": 0,
+               "ts": time.time()}
+        (queue.QUEUE_DIR / f"old-{i}.json").write_text(json.dumps(job))
+        time.sleep(0.01)  # legacy order is by mtime
+    new_id = queue.enqueue("local", "new")
+    assert [queue.dequeue()["id"] for _ in range(3)] == ["old-0", "old-1", new_id]
+    assert list(queue.QUEUE_DIR.glob("old-*.json")) == []
+
+
+def test_redis_wake_tokens_do_not_pile_up(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(queue, "get_redis", lambda: r)
+    for i in range(5):
+        queue.enqueue("local", f"run-{i}")
+    assert r.llen(queue.REDIS_WAKE_KEY) == 1
+    assert queue.wait_for_jobs(0.1) is True
+    assert queue.wait_for_jobs(0.1) is False
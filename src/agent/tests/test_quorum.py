@@ -0,0 +1,90 @@
+"""Tests for concurrent quorum execution."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from lib import quorum
+
+
+def _result(path, confidence=0.9, cause="missing env var"):
+    return SimpleNamespace(file_path=path, confidence_score=confidence, root_cause=cause)
+
+
+def test_async_quorum_returns_on_first_agreement_and_cancels_rest():
+    delays = iter([0.01, 0.02, 5.0])
+    cancelled = []
+
+    async def run():
+        delay = next(delays)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return _result("Dockerfile")
+
+    start = time.monotonic()
+    result = asyncio.run(quorum.run_with_quorum_async(run, n=3))
+    assert result.file_path == "Dockerfile"
+    assert time.monotonic() - start < 1.0
+    assert cancelled == [5.0]
+
+
+def test_async_quorum_disagreement_returns_none():
+    paths = iter(["a.py", "b.py"])
+
+    async def run():
+        return _result(next(paths))
+
+    assert asyncio.run(quorum.run_with_quorum_async(run, n=2)) is None
+
+
+def test_quorum_with_no_successful_run_raises_last_error():
+    async def run():
+        raise ConnectionError("provider down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(quorum.run_with_quorum_async(run, n=2))
+
+    def run_sync():
+        raise ConnectionError("provider down")
+
+    with pytest.raises(ConnectionError):
+        quorum.run_with_quorum(run_sync, n=2)
+
+
+def test_sync_quorum_runs_concurrently():
+    def run():
+        time.sleep(0.2)
+        return _result("app.py")
+
+    start = time.monotonic()
+    assert quorum.run_with_quorum(run, n=3).file_path == "app.py"
+    assert time.monotonic() - start < 0.5
+
+
+def test_sync_quorum_abandons_slow_runs():
+    delays = iter([0.01, 0.02, 2.0])
+    lock = threading.Lock()
+
+    def run():
+        with lock:
+            delay = next(delays)
+        time.sleep(delay)
+        return _result("app.py")
+
+    start = time.monotonic()
+    assert quorum.run_with_quorum(run, n=3).file_path == "app.py"
+    assert time.monotonic() - start < 1.0
+
+
+def test_agreement_criteria():
+    a = _result("x.py", 0.9, "npm peer dependency conflict on react")
+    b = _result("x.py", 0.5, "react peer dependency conflict in npm install")
+    assert quorum.agree(a, b, ["file_path"])
+    assert not quorum.agree(a, b, ["file_path", "confidence"])
+    assert quorum.agree(a, b, ["root_cause"])
+    assert not quorum.agree(a, _result("x.py", cause="disk full"), ["root_cause"])
@@ -0,0 +1,75 @@
+"""Tests for the LLM token-bucket rate limiter (local buckets)."""
+import pytest
+
+from lib import rate_limit
+
+
+@pytest.fixture(autouse=True)
+def local_buckets(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(rate_limit, "DISABLED", False)
+    monkeypatch.setattr(rate_limit, "_local", rate_limit._LocalBuckets())
+    monkeypatch.setattr(rate_limit, "MODEL_LIMITS", {"m": (2.0, 1000.0)})
+
+
+def test_parse_limits():
+    limits = rate_limit._parse_limits("a=10:5000, b=20")
+    assert limits["a"] == (10.0, 5000.0)
+    assert limits["b"][0] == 20.0
+
+
+def test_burst_up_to_rpm_then_times_out():
+    assert rate_limit.acquire("m", 10, timeout=0) < 0.5
+    assert rate_limit.acquire("m", 10, timeout=0) < 0.5
+    with pytest.raises(rate_limit.RateLimitTimeout):
+        rate_limit.acquire("m", 10, timeout=1)
+
+
+def test_token_quota_enforced():
+    rate_limit.acquire("m", 900, timeout=0)
+    with pytest.raises(rate_limit.RateLimitTimeout):
+        rate_limit.acquire("m", 900, timeout=1)
+
+
+def test_models_have_separate_buckets():
+    rate_limit.acquire("m", 10, timeout=0)
+    rate_limit.acquire("m", 10, timeout=0)
+    assert rate_limit.acquire("other", 10, timeout=0) < 0.5
+
+
+def test_quota_timeout_is_not_retried_or_held_against_the_model():
+    from lib.circuit_breaker import CircuitBreaker
+    from lib.llm_utils import with_retry
+
+    calls = []
+
+    def call():
+        calls.append(1)
+        return rate_limit.acquire("m", 10, timeout=0)
+
+    rate_limit.acquire("m", 10, timeout=0)
+    rate_limit.acquire("m", 10, timeout=0)
+    cb = CircuitBreaker("rate-limited", min_calls=1)
+    with pytest.raises(rate_limit.RateLimitTimeout):
+        cb.execute(lambda: with_retry(call, max_retries=3, delay=0))
+    assert len(calls) == 1
+    assert cb.failures == 0
+
+
+def test_cancelled_async_wait_takes_no_quota(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(rate_limit, "MODEL_LIMITS", {"m": (600.0, 1000.0)})  # one request per 0.1s
+    for _ in range(600):
+        rate_limit.acquire("m", 0, timeout=0)
+
+    async def scenario():
+        waiter = asyncio.create_task(rate_limit.acquire_async("m", 0, timeout=5))
+        await asyncio.sleep(0.02)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0.15)
+
+    asyncio.run(scenario())
+    assert rate_limit.acquire("m", 0, timeout=0) < 0.05  # the refilled slot is still there
@@ -0,0 +1,23 @@
+"""Tests for the shared Redis client."""
+from lib import redis_client
+
+
+def test_no_url_returns_none(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    redis_client.reset_redis()
+    assert redis_client.get_redis() is None
+
+
+def test_client_is_shared_per_url(monkeypatch):
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6399/0")
+    redis_client.reset_redis()
+    try:
+        first = redis_client.get_redis()
+        if first is None:
+            return  # redis package not installed
+        assert redis_client.get_redis() is first
+        assert first.connection_pool.max_connections == redis_client.MAX_CONNECTIONS
+        monkeypatch.setenv("REDIS_URL", "redis://localhost:6399/1")
+        assert redis_client.get_redis() is not first
+    finally:
+        redis_client.reset_redis()
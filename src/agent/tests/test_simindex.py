@@ -0,0 +1,49 @@
+"""Tests for the near-duplicate failure index."""
+from lib import simindex
+from lib.simindex import SimIndex, simhash
+
+PYTEST_LOG = """Run pytest
+FAILED tests/test_api.py::test_create_user - AssertionError: assert 404 == 201
+  File "app/api.py", line 42, in create_user
+E   KeyError: 'email'
+Error: Process completed with exit code 1."""
+
+NPM_LOG = """npm ERR! code ERESOLVE
+npm ERR! Could not resolve dependency: peer react@"^17" from react-dom@17.0.2
+Error: Process completed with exit code 1."""
+
+
+def test_near_duplicate_found_and_unrelated_not(tmp_path):
+    index = SimIndex(tmp_path / "simindex.txt")
+    index.add("pytest", simhash(PYTEST_LOG))
+    rerun = PYTEST_LOG.replace("test_create_user", "test_update_user").replace("line 42", "line 57")
+    hit = index.nearest(simhash(rerun))
+    assert hit is not None and hit[0] == "pytest"
+    assert index.nearest(simhash(NPM_LOG)) is None
+
+
+def test_exclude_skips_own_entry(tmp_path):
+    index = SimIndex(tmp_path / "simindex.txt")
+    index.add("self", simhash(PYTEST_LOG))
+    assert index.nearest(simhash(PYTEST_LOG), exclude="self") is None
+
+
+def test_index_persists_and_picks_up_other_writers(tmp_path):
+    path = tmp_path / "simindex.txt"
+    writer, reader = SimIndex(path), SimIndex(path)
+    writer.add("a", simhash(PYTEST_LOG))
+    assert reader.nearest(simhash(PYTEST_LOG)) == ("a", 0)
+    writer.add("a", simhash(PYTEST_LOG))  # already indexed: not appended again
+    fresh = SimIndex(path)
+    fresh.nearest(0)
+    assert len(fresh) == 1
+
+
+def test_add_failure_honours_cache_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(simindex, "_index", SimIndex(tmp_path / "simindex.txt"))
+    monkeypatch.setenv("CACHE_DISABLED", "1")
+    simindex.add_failure(PYTEST_LOG, "fp-disabled")
+    assert not (tmp_path / "simindex.txt").exists()
+    monkeypatch.delenv("CACHE_DISABLED")
+    simindex.add_failure(PYTEST_LOG, "fp-enabled")
+    assert simindex.find_similar(PYTEST_LOG) == ("fp-enabled", 1.0)
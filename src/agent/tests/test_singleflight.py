@@ -0,0 +1,58 @@
+"""Tests for single-flight call coalescing."""
+import asyncio
+
+import pytest
+
+from lib.singleflight import run_once_async
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"root_cause": "flaky"}
+
+    async def many():
+        return await asyncio.gather(*(run_once_async("k1", slow) for _ in range(5)))
+
+    assert asyncio.run(many()) == [{"root_cause": "flaky"}] * 5
+    assert len(calls) == 1
+
+
+def test_leader_error_propagates_and_key_is_released():
+    async def boom():
+        raise ValueError("llm down")
+
+    async def answer():
+        return 42
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_once_async("k2", boom))
+    assert asyncio.run(run_once_async("k2", answer)) == 42
+
+
+def test_cancelled_leader_hands_over_instead_of_cancelling_waiters():
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def scenario():
+        leader = asyncio.ensure_future(asyncio.wait_for(run_once_async("k3", slow), 0.02))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(run_once_async("k3", slow))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(scenario()) == "done"
+    assert len(calls) == 2
@@ -0,0 +1,42 @@
+"""Tests for incremental parsing of streamed analyses."""
+import json
+
+from lib.streaming import IncrementalJSONFields
+
+ANSWER = {
+    "root_cause": 'Missing "FIX_APPLIED" env var',
+    "suggested_fix": "Add ENV FIX_APPLIED=true",
+    "file_path": "Dockerfile",
+    "confidence_score": 0.95,
+}
+
+
+def _feed_in_chunks(text, size):
+    parser = IncrementalJSONFields()
+    seen = []
+    for i in range(0, len(text), size):
+        seen.extend(parser.feed(text[i:i + size]))
+    return parser, seen
+
+
+def test_fields_emitted_in_order_as_they_complete():
+    text = "```json\n" + json.dumps(ANSWER) + "\n```"
+    for size in (1, 3, 17, len(text)):
+        parser, seen = _feed_in_chunks(text, size)
+        assert [k for k, _ in seen] == list(ANSWER)
+        assert parser.fields == ANSWER
+
+
+def test_field_available_before_stream_ends():
+    text = json.dumps(ANSWER)
+    cut = text.index('"confidence_score"')
+    parser = IncrementalJSONFields()
+    parser.feed(text[:cut])
+    assert parser.fields["file_path"] == "Dockerfile"
+    assert "confidence_score" not in parser.fields
+
+
+def test_nested_values_and_trailing_numbers_wait_for_delimiter():
+    parser = IncrementalJSONFields()
+    assert parser.feed('{"a": {"b": ["}", 1]}, "n": 12') == [("a", {"b": ["}", 1]})]
+    assert parser.feed("3}") == [("n", 123)]
@@ -0,0 +1,31 @@
+"""Tests for token estimation, calibration and budget fitting."""
+from lib import tokens
+
+
+def test_calibration_moves_estimate_toward_reported_usage():
+    model = "calib-model"
+    before = tokens.estimate_tokens("x" * 3000, model)
+    for _ in range(30):
+        tokens.calibrate(model, 3000, 1000)  # 3 chars per token
+    assert before == 750
+    assert abs(tokens.estimate_tokens("x" * 3000, model) - 1000) <= 5
+
+
+def test_tiny_prompts_do_not_calibrate():
+    tokens.calibrate("tiny-model", 50, 40)
+    assert tokens.chars_per_token("tiny-model") == tokens.DEFAULT_CHARS_PER_TOKEN
+
+
+def test_usage_for_matches_versioned_model_names():
+    meta = {"models/gemini-x-001": {"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}}
+    assert tokens.usage_for(meta, "gemini-x") == (120, 30)
+    assert tokens.usage_for({}, "gemini-x") is None
+
+
+def test_fit_text_respects_budget():
+    text = "\n".join(f"line {i} " + "y" * 40 for i in range(500))
+    out = tokens.fit_text(text, 1000, "fit-model", lambda t, n: t[:n])
+    assert tokens.estimate_tokens(out, "fit-model") <= 1000
+    assert len(out) > 3000
+    assert tokens.fit_text("short", 1000, "fit-model", lambda t, n: t[:n]) == "short"
+    assert tokens.fit_text(text, 0, "fit-model", lambda t, n: t[:n]) == ""
@@ -0,0 +1,123 @@
+"""Tests for the pooled heal worker."""
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+import worker
+from lib import signals
+
+
+@pytest.fixture(autouse=True)
+def reset_shutdown(monkeypatch):
+    monkeypatch.setattr(signals, "_shutdown_requested", False)
+    monkeypatch.setattr(signals, "_shutdown_event", threading.Event())
+    monkeypatch.setattr(worker, "setup_graceful_shutdown", lambda drain=False: None)
+    monkeypatch.setattr(worker, "_refresh_queue_stats", lambda limiter: None)
+    monkeypatch.setattr(worker, "wait_for_jobs", lambda timeout: False)
+
+
+def test_job_args_defaults():
+    args = worker._job_args({"run_id": "r1", "provider": "jenkins", "logs": "boom"})
+    assert args.run_id == "r1"
+    assert args.provider == "jenkins"
+    assert args.logs == "boom"
+    assert args.dry_run is False and args.rollback is False
+
+
+def test_pool_runs_jobs_concurrently_and_drains(monkeypatch):
+    jobs = [{"id": str(i), "run_id": str(i)} for i in range(4)]
+    active, peak, done = [0], [0], []
+    lock = threading.Lock()
+
+    acked = []
+
+    def fake_claim(n):
+        with lock:
+            batch, jobs[:] = jobs[:n], jobs[n:]
+        if not batch:
+            signals.request_shutdown()
+        return batch
+
+    def fake_run(job):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+            done.append(job["id"])
+        return 0
+
+    monkeypatch.setattr(worker, "claim", fake_claim)
+    monkeypatch.setattr(worker, "ack", acked.append)
+    monkeypatch.setattr(worker, "run_job", fake_run)
+    worker.run_pool(concurrency=2, poll_interval=0.01, adaptive=False)
+    assert sorted(done) == ["0", "1", "2", "3"]
+    assert sorted(acked) == ["0", "1", "2", "3"]
+    assert peak[0] == 2
+
+
+@pytest.mark.parametrize("exc", [RuntimeError("worker bug"), KeyboardInterrupt()])
+def test_pool_nacks_crashed_job(monkeypatch, exc):
+    jobs = [{"id": "boom"}]
+    nacked = []
+
+    def fake_claim(n):
+        if jobs:
+            return [jobs.pop()]
+        signals.request_shutdown()
+        return []
+
+    def crash(job):
+        raise exc
+
+    monkeypatch.setattr(worker, "claim", fake_claim)
+    monkeypatch.setattr(worker, "nack", nacked.append)
+    monkeypatch.setattr(worker, "run_job", crash)
+    worker.run_pool(concurrency=2, poll_interval=0.01)
+    assert nacked == ["boom"]
+
+
+def test_in_process_jobs_share_one_event_loop(monkeypatch):
+    import main
+
+    loops = []
+
+    class _Provider:
+        def validate_env(self):
+            return False, "not configured"
+
+    def fake_get_provider(name):
+        # Runs inside _heal, under the real async_run_heal.
+        loops.append(asyncio.get_running_loop())
+        if name == "exit":
+            sys.exit(3)
+        return _Provider()
+
+    monkeypatch.setattr(main, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(main, "get_provider", fake_get_provider)
+    loop = worker.start_event_loop()
+
+    def run(provider):
+        result = []
+        t = threading.Thread(target=lambda: result.append(worker.run_job({"run_id": "r", "provider": provider})),
+                             daemon=True)
+        t.start()
+        t.join(timeout=10)
+        assert result, "job never finished"
+        return result[0]
+
+    try:
+        assert run("jenkins") == 1
+        assert run("exit") == 3
+        assert loop.is_running()  # SystemExit did not stop the loop
+        assert run("jenkins") == 1
+    finally:
+        if loop.is_running():
+            worker.stop_event_loop()
+        else:
+            worker._loop = None
+    assert len(loops) == 3 and len(set(map(id, loops))) == 1
@@ -1,25 +1,188 @@
-"""Background worker for heal jobs. Run: python worker.py"""
+"""Background worker for heal jobs. Run: python worker.py [--concurrency N] [--isolate]"""
+import argparse
+import asyncio
 import os
+import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from lib.queue import dequeue
+from lib.queue import claim, ack, nack, queue_depth, queue_age, wait_for_jobs
+from lib.blob_store import prune_blobs
+from lib.logger import info, warn, error
+from lib.signals import setup_graceful_shutdown, is_shutdown_requested
+from lib.concurrency import configure_limiter
+from lib.metrics import set_gauge
+from lib.config_reload import watch_config
+
+AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))  # max idle wait; enqueue wakes us sooner
+MIN_CONCURRENCY = int(os.getenv("WORKER_MIN_CONCURRENCY", "1"))
+ADAPTIVE = os.getenv("WORKER_ADAPTIVE", "1").lower() in ("1", "true", "yes")
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+QUEUE_STATS_INTERVAL = float(os.getenv("WORKER_QUEUE_STATS_INTERVAL", "5"))
+
+
+def _job_args(job: dict) -> argparse.Namespace:
+    """Build the run_heal namespace for a dequeued job (mirrors main.py CLI defaults)."""
+    return argparse.Namespace(
+        run_id=job.get("run_id", "unknown"),
+        provider=job.get("provider", "local"),
+        mode=None,
+        logs=job.get("logs") or None,  # jobs enqueued before logs moved to the blob store
+        logs_ref=job.get("logs_ref"),
+        dry_run=bool(job.get("dry_run", False)),
+        rollback=False,
+        rollback_n=1,
+        simulate_failure=False,
+    )
+
+
+def run_job_subprocess(job: dict) -> int:
+    """Legacy isolation mode: one interpreter per job."""
+    run_id = job.get("run_id", "unknown")
+    provider = job.get("provider", "local")
+    args = ["--run-id", run_id, "--provider", provider]
+    if job.get("logs_ref"):
+        args.extend(["--logs-ref", job["logs_ref"]])
+    elif job.get("logs"):
+        args.extend(["--logs", job["logs"][:50000]])
+    return subprocess.run([sys.executable, "main.py"] + args, cwd=AGENT_DIR).returncode
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def start_event_loop() -> asyncio.AbstractEventLoop:
+    """Start the event loop all in-process heal jobs share, in a daemon thread."""
+    global _loop
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="heal-loop", daemon=True).start()
+    _loop = loop
+    return loop
+
+
+def stop_event_loop() -> None:
+    """Wait for the loop's executor threads, then stop and close it."""
+    global _loop
+    loop, _loop = _loop, None
+    if loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    while loop.is_running():
+        time.sleep(0.01)
+    loop.close()
+
+
+def run_job(job: dict) -> int:
+    """Run a heal job in-process on the shared event loop, reusing the agent and its LLM clients."""
+    import main
+    if _loop is None:
+        return asyncio.run(main.async_run_heal(_job_args(job)))
+    return asyncio.run_coroutine_threadsafe(main.async_run_heal(_job_args(job)), _loop).result()
+
+
+def _refresh_queue_stats(limiter) -> None:
+    try:
+        depth, age = queue_depth(), queue_age()
+    except Exception as e:
+        warn("Queue stats failed", error=str(e))
+        return
+    limiter.set_backlog(depth)
+    set_gauge("heal_queue_depth", depth, "Heal jobs waiting in the queue")
+    set_gauge("heal_queue_oldest_age_seconds", age, "Wait time of the next job to be served")
+
+
+def _reload_config(main_module):
+    def _reload() -> None:
+        from dotenv import load_dotenv
+        load_dotenv(override=True)
+        main_module.reload_llm_config()
+    return _reload
+
+
+def run_pool(concurrency: int = WORKER_CONCURRENCY, isolate: bool = False,
+             poll_interval: float = POLL_INTERVAL, adaptive: bool = ADAPTIVE) -> None:
+    """
+    Lease jobs and run them on up to `concurrency` slots (adaptively limited with `adaptive`).
+    On SIGTERM/SIGINT stop taking new jobs and wait for in-flight ones; a second signal forces exit.
+    """
+    setup_graceful_shutdown(drain=True)
+    runner = run_job_subprocess if isolate else run_job
+    if not isolate:
+        import main  # pay import cost once, before the first job
+        threading.Thread(target=watch_config, args=(_reload_config(main),), daemon=True).start()
+        start_event_loop()
+    if adaptive:
+        floor = min(MIN_CONCURRENCY, concurrency)
+        limiter = configure_limiter(max(floor, concurrency // 2), floor, concurrency)
+    else:
+        limiter = configure_limiter(concurrency, concurrency, concurrency)
+    if METRICS_PORT:
+        from health_server import serve_in_background
+        serve_in_background(METRICS_PORT)
+    try:
+        prune_blobs()
+    except OSError as e:
+        warn("Blob prune failed", error=str(e))
+
+    def _run(job: dict) -> None:
+        job_id = job.get("id")
+        start = time.time()
+        try:
+            code = runner(job)
+            ack(job_id)
+            info("Job finished", job_id=job_id, exit_code=code, duration_s=round(time.time() - start, 3))
+        except Exception as e:
+            error("Job crashed", job_id=job_id, error=str(e))
+            nack(job_id)
+        except BaseException:
+            nack(job_id)  # hand the job back before unwinding
+            raise
+        finally:
+            limiter.release()
+
+    info("Worker started", concurrency=concurrency, isolate=isolate, adaptive=adaptive)
+    last_stats = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="heal") as pool:
+        while not is_shutdown_requested():
+            if time.monotonic() - last_stats >= QUEUE_STATS_INTERVAL:
+                _refresh_queue_stats(limiter)
+                last_stats = time.monotonic()
+            if not limiter.acquire(timeout=poll_interval):
+                continue
+            free = 1 + limiter.available()
+            try:
+                jobs = claim(free)
+            except Exception as e:
+                warn("Claim failed", error=str(e))
+                jobs = []
+            if not jobs:
+                limiter.release()
+                wait_for_jobs(poll_interval)
+                continue
+            for i, job in enumerate(jobs):
+                if i > 0:
+                    limiter.acquire()
+                pool.submit(_run, job)
+        info("Shutdown requested, draining in-flight jobs")
+    stop_event_loop()
+    info("Worker stopped")
+
 
 def main():
-    while True:
-        job = dequeue()
-        if job:
-            run_id = job.get("run_id", "unknown")
-            provider = job.get("provider", "local")
-            logs = job.get("logs") or ""
-            args = ["--run-id", run_id, "--provider", provider]
-            if logs:
-                args.extend(["--logs", logs[:50000]])
-            import subprocess
-            subprocess.run([sys.executable, "main.py"] + args, cwd=os.path.dirname(os.path.abspath(__file__)))
-        else:
-            time.sleep(2)
+    parser = argparse.ArgumentParser(description="Heal job worker")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help=f"Max concurrent heal jobs (default: {WORKER_CONCURRENCY}, env WORKER_CONCURRENCY)")
+    parser.add_argument("--isolate", action="store_true",
+                        help="Run each job in a fresh interpreter (legacy mode)")
+    args = parser.parse_args()
+    run_pool(max(1, args.concurrency), isolate=args.isolate)
+
 
 if __name__ == "__main__":
     main()